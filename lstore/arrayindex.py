@@ -0,0 +1,117 @@
+from heapq import merge
+from itertools import groupby
+import numpy as np
+from sortedcontainers import SortedDict
+from lstore.postings import PostingList
+
+# ARRAY INDEX CLASS
+# An index loaded from a compact snapshot (lstore.indexlog): three int64 arrays instead of a SortedDict
+# of Python ints and lists.
+#   keys     every distinct key, sorted
+#   offsets  the RIDs of keys[i] are rids[offsets[i]:offsets[i + 1]] (len(keys) + 1 entries)
+#   rids     the RIDs of every key, in key order
+# Lookups binary search keys. The arrays can be memory mapped straight from the snapshot file, so they
+# are never changed: changes made after loading are kept next to them until the next snapshot.
+class ArrayIndex:
+
+    def __init__(self, keys, offsets, rids):
+        self.keys = keys
+        self.offsets = offsets
+        self.rids = rids
+        # key -> PostingList of RIDs added since the snapshot (sorted by key, for range lookups), and
+        # key -> set of snapshot RIDs removed since
+        self.added = SortedDict()
+        self.removed = {}
+
+    # build the arrays from (key, list of RIDs) pairs sorted by key
+    @classmethod
+    def from_items(cls, items):
+        keys, rid_lists = [], []
+        for key, rids in items:
+            if rids:
+                keys.append(key)
+                rid_lists.append(rids)
+        counts = np.fromiter((len(rids) for rids in rid_lists), dtype=np.int64, count=len(rid_lists))
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        rids = np.fromiter((rid for rids in rid_lists for rid in rids), dtype=np.int64, count=int(offsets[-1]))
+        return cls(np.array(keys, dtype=np.int64), offsets, rids)
+
+    # the RIDs of key in the snapshot arrays
+    def snapshot_rids(self, key):
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            return []
+        rids = self.rids[self.offsets[i]:self.offsets[i + 1]].tolist()
+        removed = self.removed.get(key)
+        return [rid for rid in rids if rid not in removed] if removed else rids
+
+    '''
+    the mapping interface of the in-memory indices: key -> list of RIDs
+    '''
+    def get(self, key, default=None):
+        rids = self.snapshot_rids(key)
+        rids.extend(self.added.get(key, ()))
+        return rids if rids else default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        rids = self.get(key)
+        if rids is None:
+            raise KeyError(key)
+        return rids
+
+    # number of distinct keys, keys added since the snapshot may be counted twice
+    def __len__(self):
+        return len(self.keys) + len(self.added)
+
+    # the keys in [begin, end] in order, like SortedDict.irange
+    # the snapshot's keys and the added keys are both sorted, so they are merged instead of sorted again
+    def irange(self, begin, end):
+        first = int(np.searchsorted(self.keys, begin, "left"))
+        last = int(np.searchsorted(self.keys, end, "right"))
+        keys = merge(self.keys[first:last].tolist(), self.added.irange(begin, end))
+        return (key for key, _ in groupby(keys) if key in self)
+
+    def items(self):
+        for key, _ in groupby(merge(self.keys.tolist(), self.added)):
+            rids = self.get(key)
+            if rids is not None:
+                yield key, rids
+
+    def values(self):
+        return (rids for _, rids in self.items())
+
+    '''
+    changes since the snapshot
+    '''
+    def add(self, key, rid):
+        removed = self.removed.get(key)
+        if removed and rid in removed:
+            removed.discard(rid)
+        else:
+            self.added.setdefault(key, PostingList()).append(rid)
+
+    def remove(self, key, rid):
+        added = self.added.get(key)
+        if added and rid in added:
+            added.remove(rid)
+            if not added:
+                del self.added[key]
+        else:
+            self.removed.setdefault(key, set()).add(rid)
+
+    # (key, list of RIDs) pairs, as SortedDict.update
+    def update(self, entries):
+        for key, rids in entries:
+            for rid in rids:
+                self.add(key, rid)
+
+    # memory mapped arrays are copied, so the pickle doesn't depend on the snapshot file
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for name in ("keys", "offsets", "rids"):
+            state[name] = np.array(state[name])
+        return state
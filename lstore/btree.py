@@ -0,0 +1,291 @@
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+from lstore import config
+from lstore.page import Page
+
+# DISK-RESIDENT B+TREE INDEX
+# One file per indexed column: {table path}/{column}.btree, stored as a Segment with one page per slot,
+# so node n is slot n. Nodes are read, cached, pinned and written back by the bufferpool like any other
+# page, with page id (table name, 0, node number, config.INDEX_PAGE, column), so the index only takes
+# the frames the bufferpool gives it.
+#
+# node 0 holds the tree's metadata: | root node | number of nodes | number of entries |
+# every other node is the int64 slots of one page:
+#   | is leaf | number of keys | next leaf (0 if last) | keys (ORDER slots) | rids or children (ORDER + 1 slots) |
+# a leaf holds (key, rid) entries sorted by key, duplicate keys in insertion order
+# an internal node with n keys has n + 1 children, keys[i] is the smallest key of children[i + 1]
+#
+# removing an entry never merges nodes: leaves may run empty and lookups step over them
+IS_LEAF = 0
+COUNT = 1
+NEXT = 2
+KEYS = 3
+ORDER = (config.ARRAY_SIZE // config.VALUE_SIZE - KEYS - 1) // 2
+POINTERS = KEYS + ORDER
+
+ROOT = 0
+NODES = 1
+ENTRIES = 2
+
+class BTreeIndex:
+
+    """
+    :param table: Table     #Table of the indexed column, for the file path and the bufferpool
+    :param column: int      #Physical column number
+    """
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+        self.segment = table.index_segment(column)
+        # one writer or reader at a time, so no one sees half a split
+        self.lock = threading.RLock()
+        if not os.path.exists(self.segment.path):
+            self.reset()
+
+    # write an empty tree: the metadata node and an empty root leaf
+    def reset(self):
+        meta, root = Page(), Page()
+        meta.values[[ROOT, NODES, ENTRIES]] = (1, 2, 0)
+        root.values[IS_LEAF] = 1
+        self.segment.write_groups([], [[meta], [root]])
+
+    def page_id(self, node):
+        return (self.table.name, 0, node, config.INDEX_PAGE, self.column)
+
+    # the int64 slots of a node, pinned for the duration of the with block
+    @contextmanager
+    def node(self, node, write=False):
+        with self.table.bufferpool.pin(self.page_id(node), write) as page:
+            yield page.values
+
+    def meta(self):
+        with self.node(0) as meta:
+            return int(meta[ROOT]), int(meta[NODES]), int(meta[ENTRIES])
+
+    def __len__(self):
+        return self.meta()[2]
+
+    # append count empty nodes to the file with one write, returns the first node number
+    def allocate(self, count=1):
+        with self.node(0, write=True) as meta:
+            first = int(meta[NODES])
+            meta[NODES] = first + count
+        self.segment.write_pages([(first + i, Page()) for i in range(count)])
+        return first
+
+    # the leftmost leaf that may hold key (side "left"), or the rightmost (side "right", where key is inserted)
+    def find_leaf(self, key, side="left"):
+        node = self.meta()[0]
+        path = []
+        while True:
+            with self.node(node) as values:
+                if values[IS_LEAF]:
+                    return node, path
+                i = int(np.searchsorted(values[KEYS:KEYS + values[COUNT]], key, side))
+                path.append((node, i))
+                node = int(values[POINTERS + i])
+
+    '''
+    lookups
+    '''
+    # (key, rid) entries with begin <= key <= end in key order, at most limit of them
+    def items(self, begin, end, limit=None):
+        entries = []
+        with self.lock:
+            node, _ = self.find_leaf(begin)
+            while node and (limit is None or len(entries) < limit):
+                # leaves are read in order, so the read-ahead can load the next ones while this one is searched
+                self.table.bufferpool.read_ahead.access(self.table, 0, node, [self.column], page_type=config.INDEX_PAGE)
+                with self.node(node) as values:
+                    keys = values[KEYS:KEYS + values[COUNT]]
+                    first = int(np.searchsorted(keys, begin, "left"))
+                    last = int(np.searchsorted(keys, end, "right"))
+                    entries.extend(zip(keys[first:last].tolist(), values[POINTERS + first:POINTERS + last].tolist()))
+                    node = int(values[NEXT]) if last == len(keys) else 0
+        return entries if limit is None else entries[:limit]
+
+    def locate(self, key):
+        return [rid for _, rid in self.items(key, key)]
+
+    def locate_range(self, begin, end):
+        return [rid for _, rid in self.items(begin, end)]
+
+    # the distinct keys in [begin, end], like SortedDict.irange
+    def irange(self, begin, end):
+        last = None
+        for key, _ in self.items(begin, end):
+            if key != last:
+                last = key
+                yield key
+
+    # the mapping interface of the in-memory indices: key -> list of RIDs
+    def __contains__(self, key):
+        return len(self.items(key, key, limit=1)) > 0
+
+    def __getitem__(self, key):
+        rids = self.locate(key)
+        if not rids:
+            raise KeyError(key)
+        return rids
+
+    def get(self, key, default=None):
+        rids = self.locate(key)
+        return rids if rids else default
+
+    '''
+    insert
+    '''
+    def add(self, key, rid):
+        with self.lock:
+            node, path = self.find_leaf(key, "right")
+            split = self.insert_leaf(node, key, rid)
+            # push the separators of split nodes up the path
+            while split is not None and path:
+                parent, i = path.pop()
+                split = self.insert_internal(parent, i, *split)
+            if split is not None:
+                separator, right = split
+                root = self.allocate()
+                with self.node(root, write=True) as values:
+                    values[[IS_LEAF, COUNT, KEYS, POINTERS, POINTERS + 1]] = (0, 1, separator, self.meta()[0], right)
+                with self.node(0, write=True) as meta:
+                    meta[ROOT] = root
+            with self.node(0, write=True) as meta:
+                meta[ENTRIES] += 1
+
+    # insert the entry into the leaf. returns (separator, new right node) if the leaf split
+    def insert_leaf(self, node, key, rid):
+        with self.node(node, write=True) as values:
+            count = int(values[COUNT])
+            i = int(np.searchsorted(values[KEYS:KEYS + count], key, "right"))
+            if count < ORDER:
+                values[KEYS + i + 1:KEYS + count + 1] = values[KEYS + i:KEYS + count].copy()
+                values[POINTERS + i + 1:POINTERS + count + 1] = values[POINTERS + i:POINTERS + count].copy()
+                values[KEYS + i] = key
+                values[POINTERS + i] = rid
+                values[COUNT] = count + 1
+                return None
+            keys = np.insert(values[KEYS:KEYS + count], i, key)
+            rids = np.insert(values[POINTERS:POINTERS + count], i, rid)
+            middle = len(keys) // 2
+            right = self.allocate()
+            self.write_node(right, True, keys[middle:], rids[middle:], values[NEXT])
+            self.write_node_values(values, True, keys[:middle], rids[:middle], right)
+            return int(keys[middle]), right
+
+    # insert the separator and right child of a split child i. returns (separator, new right node) if the node split
+    def insert_internal(self, node, i, separator, right):
+        with self.node(node, write=True) as values:
+            count = int(values[COUNT])
+            keys = np.insert(values[KEYS:KEYS + count], i, separator)
+            children = np.insert(values[POINTERS:POINTERS + count + 1], i + 1, right)
+            if count < ORDER:
+                self.write_node_values(values, False, keys, children)
+                return None
+            middle = len(keys) // 2
+            new_node = self.allocate()
+            self.write_node(new_node, False, keys[middle + 1:], children[middle + 1:])
+            self.write_node_values(values, False, keys[:middle], children[:middle + 1])
+            return int(keys[middle]), new_node
+
+    def write_node(self, node, leaf, keys, pointers, next_leaf=0):
+        with self.node(node, write=True) as values:
+            self.write_node_values(values, leaf, keys, pointers, next_leaf)
+
+    def write_node_values(self, values, leaf, keys, pointers, next_leaf=0):
+        values[IS_LEAF] = 1 if leaf else 0
+        values[COUNT] = len(keys)
+        values[NEXT] = next_leaf
+        values[KEYS:KEYS + len(keys)] = keys
+        values[POINTERS:POINTERS + len(pointers)] = pointers
+
+    '''
+    remove
+    returns False if the entry is not in the index
+    '''
+    def remove(self, key, rid):
+        with self.lock:
+            node, _ = self.find_leaf(key)
+            while node:
+                with self.node(node) as values:
+                    keys = values[KEYS:KEYS + values[COUNT]]
+                    first = int(np.searchsorted(keys, key, "left"))
+                    last = int(np.searchsorted(keys, key, "right"))
+                    matches = np.flatnonzero(values[POINTERS + first:POINTERS + last] == rid)
+                    next_leaf = int(values[NEXT]) if last == len(keys) else 0
+                if len(matches):
+                    self.delete_entry(node, first + int(matches[0]))
+                    with self.node(0, write=True) as meta:
+                        meta[ENTRIES] -= 1
+                    return True
+                node = next_leaf
+            return False
+
+    def delete_entry(self, node, i):
+        with self.node(node, write=True) as values:
+            count = int(values[COUNT])
+            values[KEYS + i:KEYS + count - 1] = values[KEYS + i + 1:KEYS + count].copy()
+            values[POINTERS + i:POINTERS + count - 1] = values[POINTERS + i + 1:POINTERS + count].copy()
+            values[COUNT] = count - 1
+
+    '''
+    bulk load
+    an empty tree is built bottom up from the sorted entries, leaves filled to config.BTREE_FILL_FACTOR
+    so later inserts don't split every leaf. entries for a tree that isn't empty are inserted one by one
+    '''
+    def bulk_load(self, keys, rids):
+        keys = np.asarray(keys, dtype=np.int64)
+        rids = np.asarray(rids, dtype=np.int64)
+        if len(keys) == 0:
+            return
+        with self.lock:
+            root, _, entries = self.meta()
+            with self.node(root) as values:
+                empty_leaf = bool(values[IS_LEAF]) and entries == 0
+            if not empty_leaf:
+                for key, rid in zip(keys.tolist(), rids.tolist()):
+                    self.add(key, rid)
+                return
+
+            order = np.argsort(keys, kind="stable")
+            keys, rids = keys[order], rids[order]
+            fill = max(1, int(ORDER * config.BTREE_FILL_FACTOR))
+            num_leaves = -(-len(keys) // fill)
+            # the empty root is reused as the first leaf
+            leaves = [root]
+            if num_leaves > 1:
+                first = self.allocate(num_leaves - 1)
+                leaves += range(first, first + num_leaves - 1)
+            level = []
+            for i, leaf in enumerate(leaves):
+                start = i * fill
+                next_leaf = leaves[i + 1] if i + 1 < num_leaves else 0
+                self.write_node(leaf, True, keys[start:start + fill], rids[start:start + fill], next_leaf)
+                level.append((int(keys[start]), leaf))
+
+            # one internal level at a time until a single node is left
+            while len(level) > 1:
+                groups = [level[i:i + fill + 1] for i in range(0, len(level), fill + 1)]
+                first = self.allocate(len(groups))
+                next_level = []
+                for j, group in enumerate(groups):
+                    self.write_node(first + j, False, [key for key, _ in group[1:]], [child for _, child in group])
+                    next_level.append((group[0][0], first + j))
+                level = next_level
+
+            with self.node(0, write=True) as meta:
+                meta[ROOT] = level[0][1]
+                meta[ENTRIES] = len(keys)
+
+    '''
+    drop the index: its cached nodes are discarded without writing them back and the file is deleted
+    '''
+    def destroy(self):
+        with self.lock:
+            _, nodes, _ = self.meta()
+            for node in range(nodes):
+                self.table.bufferpool.discard(self.page_id(node))
+            self.table.close_index_segment(self.column)
+            os.remove(self.segment.path)
@@ -1,182 +1,656 @@
+from collections import deque, defaultdict, ChainMap
+from contextlib import contextmanager
+import itertools
+import os
+import threading
+import time
 from lstore import config
 from lstore.page import Page
+from lstore.eviction import make_policy
+from lstore.readahead import ReadAhead
+from lstore.stats import BufferpoolStats
+# raised when a page has to be loaded but every frame is pinned. a RuntimeError, queries turn it into False
+class PoolFullError(RuntimeError):
+    pass
+
 # FRAME CLASS
 class Frame:
-    def __init__(self):
+    def __init__(self, partition=None):
+        self.partition = partition
+        self.bytes = 0
         self.empty = True
         self.page = None
-        self.path = None
-        self.column_number = None
+        self.page_id = None
+        self.segment = None
+        self.slot = None
         self.curr_pins = 0
         self.total_pins = 0
         self.dirty = False
+        # time.monotonic() when the page was loaded, for the average residency, and when it was last fixed
+        self.loaded_at = None
+        self.last_access = None
+
+# BUFFER PARTITION CLASS
+# One hash partition of the bufferpool: a contiguous block of its frames with their own page table,
+# free-frame list, replacement policy, byte budget and latch. Pages hash to a partition by page id,
+# so threads working on different pages rarely wait on the same latch.
+class BufferPartition:
+
+    def __init__(self, first_frame, num_frames, max_bytes, eviction_policy=None):
+        self.first_frame = first_frame
+        self.frames = [Frame(self) for i in range(num_frames)]
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.size = 0
+        self.page_table = {}
+        self.free_frames = deque(range(first_frame, first_frame + num_frames))
+        # the policy works on frame numbers local to the partition
+        self.policy = make_policy(eviction_policy, num_frames)
+        # reentrant since fix can purge and evict
+        self.lock = threading.RLock()
+
+    # room for a page of page_bytes. a page bigger than the whole budget still fits in an empty partition
+    def hasCapacity(self, page_bytes):
+        if not self.free_frames:
+            return False
+        return self.bytes_used + page_bytes <= self.max_bytes or self.size == 0
 
 # BUFFERPOOL CLASS
+# the pool is sized by a byte budget (max_bytes) and split into hash partitions, see BufferPartition
+# frames are numbered across the whole pool, partition i owns one contiguous block of frame numbers
+#
+# page_table maps a page id to the index of the frame holding it, so a hit is one dict lookup
+# a page id is (table name, page range number, page group number, config.BASE_PAGE/TAIL_PAGE, column)
+# free_frames holds the indices of empty frames, so add never scans the pool
+# the replacement policy (lstore.eviction) picks the frame to evict when the pool is full
+#
+# pages are used through pin, which keeps the frame from being evicted until the block exits:
+#   with bufferpool.pin(page_id, write=True) as page:
+#       page.write_column(record_num, value)
+# a frame holds the same Page object as its table's page group, so a pinned page and the page
+# group always agree. write=True marks the frame dirty so eviction and close write it back
+#
+# base and tail pages stay resident in their table's page ranges, so for them the pool is bookkeeping
+# only: pins, dirty tracking and write-back. evicting one of them frees no memory. the only pages a
+# frame owns are the ones readFromDisk really loads from a segment, the nodes of B+tree indices
+#
+# the write-behind flusher (start_flusher) writes unpinned dirty pages in the background once more than
+# config.DIRTY_HIGH_WATERMARK of the frames are dirty, so evictions usually find clean victims
+#
+# every hit, miss, eviction, write-back and latch wait is counted per pool and per table, see stats()
 class Bufferpool:
 
-    def __init__(self, max_size):
-        # We need to keep track of the size since the data is stored in a bytearray
-        self.size = 0
+    """
+    :param max_size: int        #Number of frames. Defaults to max_bytes / config.ARRAY_SIZE
+    :param eviction_policy: str #Replacement policy of every partition, see lstore.eviction
+    :param max_bytes: int       #Memory budget for the cached pages. Defaults to max_size * config.ARRAY_SIZE
+    :param partitions: int      #Number of hash partitions, each with its own latch
+    """
+    def __init__(self, max_size=None, eviction_policy=None, max_bytes=None, partitions=1):
+        if max_bytes is None:
+            max_bytes = config.BUFFERPOOL_MAX_BYTES if max_size is None else max_size * config.ARRAY_SIZE
+        if max_size is None:
+            max_size = max(1, max_bytes // config.ARRAY_SIZE)
         self.max_size = max_size
-        # Each bufferpool has a list of base and tail pages (initially empty)
-        self.frames = []
-        for i in range(max_size):
-            self.frames.append(Frame())
+        self.max_bytes = max_bytes
+        # split the frames and the byte budget evenly over the partitions
+        num_partitions = max(1, min(partitions, max_size))
+        self.partitions = []
+        first_frame = 0
+        for i in range(num_partitions):
+            num_frames = max_size // num_partitions + (1 if i < max_size % num_partitions else 0)
+            self.partitions.append(BufferPartition(first_frame, num_frames, max_bytes * num_frames // max_size, eviction_policy))
+            first_frame += num_frames
+        # every frame of the pool, indexed by frame number
+        self.frames = [frame for partition in self.partitions for frame in partition.frames]
+        # read-only view over the page tables of every partition
+        self.page_table = ChainMap(*[partition.page_table for partition in self.partitions])
+        # table name -> Table, used to load the pages of a page id
+        self.tables = {}
+        self.flusher = None
+        self.stop_flushing = threading.Event()
+        self.read_ahead = ReadAhead(self)
+        self.statistics = BufferpoolStats()
+
+    def register_table(self, table):
+        self.tables[table.name] = table
+
+    @property
+    def size(self):
+        return sum(partition.size for partition in self.partitions)
+
+    @property
+    def bytes_used(self):
+        return sum(partition.bytes_used for partition in self.partitions)
+
+    @property
+    def free_frames(self):
+        return [frame_index for partition in self.partitions for frame_index in partition.free_frames]
 
     def hasCapacity(self):
         if self.size<self.max_size:
             return True
         else: return False
 
+    def partition(self, page_id):
+        return self.partitions[hash(page_id) % len(self.partitions)]
+
+    # the page id of the page holding the latest version of the column for this record
+    def page_id(self, RID, column_number, table):
+        # get page group number and basePage number from page directory
+        page_range_num, base_page_num, record_num = table.page_directory[RID]
+        base_page = table.page_ranges[page_range_num].base_pages[base_page_num]
+
+        # get the tailpage number from the base page indirection column
+        tail_page_rid = base_page.pages[config.INDIRECTION_COLUMN].read(record_num) 
+
+        if tail_page_rid == 0:
+            # if there is no tail page, then the base page is the tail page
+            return (table.name, page_range_num, base_page_num, config.BASE_PAGE, column_number)
+        # if there is a tail page, then the page directory knows which tail page holds it
+        _, tail_page_num, _ = table.page_directory[tail_page_rid]
+        return (table.name, page_range_num, tail_page_num, config.TAIL_PAGE, column_number)
+
     # if we use this function, then we need to know the RID and record num from the page dir
     def getBufferpoolPage(self, RID, column_number, table):
+        return self.get_page(self.page_id(RID, column_number, table), table)
+
+    # returns the page without keeping it pinned
+    def get_page(self, page_id, table=None):
+        frame_index = self.fix(page_id, table)
+        if frame_index is None:
+            return False
+        self.unpin(frame_index)
+        return self.frames[frame_index].page
+
+    # load the page if it is not in the bufferpool and pin its frame
+    # returns the frame index, or None if every frame is pinned
+    def fix(self, page_id, table=None):
+        partition = self.partition(page_id)
+        # take the partition's latch, counting a pin wait if another thread holds it
+        lock = partition.lock
+        if not lock.acquire(blocking=False):
+            self.statistics.record(page_id[0], "pin_waits")
+            lock.acquire()
+        try:
+            return self.fix_unlocked(page_id, table, partition)
+        finally:
+            lock.release()
+
+    # the caller holds the latch of the page's partition
+    def fix_unlocked(self, page_id, table, partition):
+        # return the page if it is already in bufferpool
+        frame_index = partition.page_table.get(page_id)
+        if frame_index is not None:
+            partition.policy.access(frame_index - partition.first_frame)
+            self.statistics.record_hit(page_id[0])
+        else:
+            #
+            # if you make it this far, then the page is not in bufferpool
+            #
+            table = self.tables[page_id[0]] if table is None else table
+            self.statistics.record_miss(page_id[0])
+
+            # check if the partition is full
+            if self.make_room(partition, self.page_bytes(page_id, table))==False:
+                return None
 
-        # check if the page is already in bufferpool:
-        for frame in self.frames: # ensure that frame is not empty
-            if frame.empty:
+            # read the page from disk
+            page, segment, slot = self.readFromDisk(page_id, table)
+            if self.add(page, segment, slot, page_id)==False:
+                print("error, buffer pool has no space despite capacity check passing")
+                return None
+            frame_index = partition.page_table[page_id]
+
+        frame = self.frames[frame_index]
+        frame.curr_pins+=1
+        frame.total_pins+=1
+        frame.last_access = time.monotonic()
+        return frame_index
+
+    # bytes a frame holding the page takes: B+tree nodes are ARRAY_SIZE, table pages the table's page size
+    def page_bytes(self, page_id, table=None):
+        if page_id[3] == config.INDEX_PAGE:
+            return config.ARRAY_SIZE
+        return (self.tables[page_id[0]] if table is None else table).page_size
+
+    # load pages without pinning them, used by the read-ahead threads
+    # the pages are read outside the lock so queries keep running while the I/O is in flight
+    # with a ring the pages are loaded into the ring's frames
+    # pages loaded in the table's page ranges need no I/O and are skipped
+    def prefetch(self, page_ids, table, ring=None):
+        for page_id in page_ids:
+            if page_id in self.page_table or table.resident_page(page_id) is not None:
                 continue
+            page, segment, slot = self.readFromDisk(page_id, table)
+            if page is None:
+                continue
+            partition = self.partition(page_id)
+            if ring is not None:
+                ring.recycle(partition, page.capacity * config.VALUE_SIZE)
+            with partition.lock:
+                if page_id in partition.page_table:
+                    continue
+                if self.make_room(partition, page.capacity * config.VALUE_SIZE)==False:
+                    return False
+                self.add(page, segment, slot, page_id)
+                if ring is not None:
+                    ring.pages[partition].append(page_id)
+        return True
 
-            # return the page if it is already in bufferpool
-            for i in range (0,frame.page.num_records): # loop through records in the page
-                #read each record in the page
-                record = page.read(i)
-                # do the col and RID match
-                if RID == table.index.indices[column_number][record]: #TODO: check if this is corrects
-                # if RID == frame.page.read(column_number): # Check to make sure that this is correct
-                    # frame.curr_pins+=1
-                    frame.total_pins+=1
-                    return frame.page
-        
-        #
-        # if you make it this far, then the page is not in bufferpool
-        #
-
-        # check if bufferpool is full
-        if self.hasCapacity==False:
-            self.purge()
-
-        # read the page from disk
-        page = self.readFromDisk(RID, column_number, table)
-        if self.add(page, table.path, column_number)==False:
-            print("error, buffer pool has no space despite capacity check passing")
-            return False
-        # Should we unpin the page here??
-        return page
+    def unpin(self, frame_index, dirty=False):
+        frame = self.frames[frame_index]
+        with frame.partition.lock:
+            frame.curr_pins-=1
+            if dirty:
+                frame.dirty = True
+
+    # fix every page id with the given fix function (the pool's own by default)
+    def fix_all(self, page_ids, fix=None):
+        fix = self.fix if fix is None else fix
+        frame_indices = []
+        for page_id in page_ids:
+            frame_index = fix(page_id)
+            if frame_index is None:
+                # release what was already pinned
+                for pinned in frame_indices:
+                    self.unpin(pinned)
+                raise PoolFullError(f"Bufferpool: every frame is pinned, could not load {page_id}")
+            frame_indices.append(frame_index)
+        return frame_indices
+
+    # pin one page for the duration of a with block, marking it dirty on exit if write is True
+    @contextmanager
+    def pin(self, page_id, write=False, fix=None):
+        frame_index, = self.fix_all([page_id], fix)
+        try:
+            yield self.frames[frame_index].page
+        finally:
+            self.unpin(frame_index, write)
+
+    # pin several pages at once, e.g. every column of a page group. yields the pages in order
+    @contextmanager
+    def pin_many(self, page_ids, write=False, fix=None):
+        frame_indices = self.fix_all(page_ids, fix)
+        try:
+            yield [self.frames[frame_index].page for frame_index in frame_indices]
+        finally:
+            for frame_index in frame_indices:
+                self.unpin(frame_index, write)
 
-    # Make space for a new page in the bufferpool
+    # a private ring of frames for a large scan, see BufferRing
+    @contextmanager
+    def ring(self, size=None):
+        yield BufferRing(self, config.SCAN_RING_SIZE if size is None else size)
+
+    # Make space for a new page in the bufferpool, evicting from the first partition that has an unpinned page
     def purge(self):
-        # Iterate through the bufferpool to find the page with the least number of pins
-        # this function *could* run into problems if every single frame is pinned, but this is exceedingly unlikely so i will not write code to handle it.
-        leastPinnedI = 0
-        leastPinnedPins = self.frames[0].total_pins
-        for i in range(0, self.frames):
-            if self.frames[i].curr_pins==0:
-                # if a frame was accessed 0 or 1 times, evict it rather than checking the rest of the frames.
-                if self.frames[i].total_pins<=1:
-                    self.evict(i)
-                    return True
-                if leastPinnedPins > self.frames[i].total_pins:
-                    leastPinnedI = i
-
-        # Evict the page with the least number of pins
-        self.evict(leastPinnedI)
+        for partition in self.partitions:
+            if partition.size and self.purge_partition(partition, report=False):
+                return True
+        print("error: every page in the bufferpool is pinned")
+        return False
+
+    def purge_partition(self, partition, report=True):
+        with partition.lock:
+            # the replacement policy only hands out unpinned frames
+            victim = partition.policy.victim(partition.frames)
+            if victim is None:
+                if report:
+                    print("error: every page in the bufferpool is pinned")
+                return False
+            return self.evict(partition.first_frame + victim)
+
+    # evict until the partition has room for a page of page_bytes
+    def make_room(self, partition, page_bytes):
+        while not partition.hasCapacity(page_bytes):
+            if self.purge_partition(partition)==False:
+                return False
         return True
     
     # Evict a page from the bufferpool
     def evict(self, i):
-        # return false if the frame is pinned
-        if self.frames[i].curr_pins != 0:
-            return False
+        with self.frames[i].partition.lock:
+            # return false if the frame is pinned
+            if self.frames[i].curr_pins != 0:
+                return False
 
-        #Write the page to disk if it is dirty
-        if self.frames[i].dirty:
-            self.writeToDisk(i) # might be bufferpool[i]
+            #Write the page to disk if it is dirty
+            if self.frames[i].dirty:
+                self.writeToDisk(i) # might be bufferpool[i]
         
-        self.remove(i)
-
-    # Add a pageGroup to the bufferpool
-    def add(self, page, path, column_number):
-        if self.hasCapacity:
-            # Find and open spot in the bufferpool and add the page
-            for frame in self.frames:
-                if frame.empty:
-                    frame.empty = False
-                    frame.page = page
-                    frame.path = path
-                    frame.column_number = column_number
-                    self.size += 1
-                    return True
-                # else: continue
-        else: return False
+            if self.frames[i].empty:
+                return False
+            self.statistics.record(self.frames[i].page_id[0], "evictions")
+            return self.remove(i)
+
+    # drop a page without writing it back, e.g. a node of a dropped index. False if it is pinned
+    def discard(self, page_id):
+        partition = self.partition(page_id)
+        with partition.lock:
+            frame_index = partition.page_table.get(page_id)
+            if frame_index is None:
+                return True
+            if self.frames[frame_index].curr_pins != 0:
+                return False
+            return self.remove(frame_index)
+
+    # forget the dirty state of every page of a page range that is about to be written whole
+    # (Table.flush_page_range), so write-back doesn't write the pages again. a write that lands
+    # meanwhile dirties its frame again
+    def mark_range_clean(self, table_name, page_range_number):
+        for partition in self.partitions:
+            with partition.lock:
+                for frame in partition.frames:
+                    if not frame.empty and frame.page_id[:2] == (table_name, page_range_number) and frame.page_id[3] != config.INDEX_PAGE:
+                        frame.dirty = False
+                        frame.page.take_dirty()
+
+    # the segment and slot holding a page
+    def locate(self, page_id, table):
+        _, page_range_num, page_group_num, page_type, column_number = page_id
+        if page_type == config.INDEX_PAGE:
+            # B+tree nodes: slot n of the column's index file is node n
+            return table.index_segment(column_number), page_group_num
+        segment = table.segment(page_range_num)
+        if page_type == config.BASE_PAGE:
+            return segment, segment.base_slot(page_group_num, column_number)
+        return segment, segment.tail_slot(page_group_num, column_number)
+
+    # with config.MMAP_PAGES, have the OS read the mapped table pages ahead of a scan (see Segment.will_need)
+    # returns the number of bytes advised
+    def will_need(self, page_ids, table):
+        slots = defaultdict(list)
+        for page_id in page_ids:
+            segment, slot = self.locate(page_id, table)
+            slots[segment].append(slot)
+        return sum(segment.will_need(segment_slots) for segment, segment_slots in slots.items())
+
+    # Add a page to the bufferpool
+    def add(self, page, segment, slot, page_id):
+        partition = self.partition(page_id)
+        if not partition.free_frames:
+            return False
+        # take an open spot in the bufferpool and add the page
+        frame_index = partition.free_frames.popleft()
+        frame = self.frames[frame_index]
+        frame.empty = False
+        frame.page = page
+        frame.page_id = page_id
+        frame.segment = segment
+        frame.slot = slot
+        frame.bytes = page.capacity * config.VALUE_SIZE
+        frame.loaded_at = frame.last_access = time.monotonic()
+        partition.page_table[page_id] = frame_index
+        partition.policy.admit(frame_index - partition.first_frame, page_id)
+        partition.size += 1
+        partition.bytes_used += frame.bytes
+        return True
     
     # Remove a page from the bufferpool
     def remove(self, index):
+        partition = self.frames[index].partition
+        if self.frames[index].empty:
+            return False
+        del partition.page_table[self.frames[index].page_id]
+        self.statistics.record_residency(self.frames[index].page_id[0], time.monotonic() - self.frames[index].loaded_at)
+        partition.policy.remove(index - partition.first_frame)
+        partition.bytes_used -= self.frames[index].bytes
+        self.frames[index].bytes = 0
+        self.frames[index].loaded_at = None
+        self.frames[index].last_access = None
         self.frames[index].page = None
-        self.frames[index].path = None
-        self.frames[index].column_number = None
+        self.frames[index].page_id = None
+        self.frames[index].segment = None
+        self.frames[index].slot = None
         self.frames[index].curr_pins = 0
         self.frames[index].total_pins = 0
         self.frames[index].dirty = False
         self.frames[index].empty = True
-        self.size -= 1
+        partition.free_frames.append(index)
+        partition.size -= 1
         return True
     
-    def readFromDisk(self, RID, column_number, table):
-        # get page group number and basePage number from page directory
-        page_range_num, base_page_num, record_num = self.table.page_directory[RID]
-
-        # get the tailpage number from the base page indirection column
-        tail_page_rid = base_page_num.pages[config.INDIRECTION_COLUMN].read(record_num) 
+    # returns the page along with the segment and slot it was read from
+    def readFromDisk(self, page_id, table):
+        segment, slot = self.locate(page_id, table)
 
-        # TODO: get tail page number (is the tail page RID the same as the tail page number? I don't think so) 
+        # pages of loaded page groups are shared with the table instead of read a second time
+        page = table.resident_page(page_id)
+        if page is not None:
+            return page, segment, slot
 
-        if tail_page_rid == 0:
-            # if there is no tail page, then the base page is the tail page
-            full_path = f"{table.path}/{page_range_num}/b{base_page_num}/col{column_number}.bin"
-            met_path = f"{table.path}/{page_range_num}/b{base_page_num}/col{column_number}.json"
+        # read the page (and its num_records header) from the segment file
+        # with mmap pages this is a view into the mapping and the OS faults the data in on first access
+        if config.MMAP_PAGES:
+            page = segment.page_view(slot)
         else:
-            # if there is a tail page, then we need to find the tail page
-            full_path = f"{table.path}/{page_range_num}/t{tail_page_rid}/col{column_number}.bin"
-            met_path = f"{table.path}/{page_range_num}/t{tail_page_rid}/col{column_number}.json"
-
-        # read the page from disk
-        with open(full_path, 'rb') as data_file:
-            page_data = bytearray(data_file.read())
-            # data_file.close()
-
-        # read the metadata from disk
-        with open(met_path, 'rb') as metadata_file:
-            num_records = int(metadata_file.read())
-            # data_file.close()
-
-        page = Page(page_data, num_records)    
-
-        # update the index for this record
-        for i in range(page.num_records):
-            #read each record in the page
-            record = page.read(i)
-            # add to index
-            table.index.indices[column_number][record] = RID
-        return page
+            page = segment.read_page(slot)
+        self.statistics.record(page_id[0], "bytes_read", page.capacity * config.VALUE_SIZE)
+        return page, segment, slot
         
     
     def writeToDisk(self, bufferpoolIndex):
         # get bufferpool page
         frame = self.frames[bufferpoolIndex]
 
-        full_path = f"{frame.path}/col{frame.column_number}.bin"
-        met_path = f"{frame.path}/col{frame.column_number}.json"
+        # write the changed slots of the page and its num_records header back into its segment slot
+        dirty = frame.page.take_dirty()
+        if config.MMAP_PAGES:
+            # the data is already in the mapping, msync it
+            frame.segment.sync_page(frame.slot, frame.page)
+            bytes_written = frame.bytes
+        else:
+            bytes_written = self.write_dirty(frame.segment, [(frame.slot, frame.page, dirty)], frame.page_id)
+        frame.dirty = False
+        self.statistics.record(frame.page_id[0], "writebacks")
+        self.statistics.record(frame.page_id[0], "bytes_written", bytes_written)
+
+    '''
+    write-behind flushing
+    '''
+    def dirty_ratio(self):
+        return sum(1 for frame in self.frames if frame.dirty) / self.max_size
+
+    # write up to max_pages unpinned dirty pages (all of them by default)
+    # the pages of one segment are written together, only their changed slots, with adjacent writes joined
+    # returns the number of pages written
+    def flush(self, max_pages=None):
+        by_segment = defaultdict(list)
+        page_ids = {}
+        count = 0
+        for partition in self.partitions:
+            with partition.lock:
+                for frame in partition.frames:
+                    if max_pages is not None and count >= max_pages:
+                        break
+                    if frame.dirty and frame.curr_pins == 0:
+                        # cleared before the write, so a write that lands meanwhile dirties the frame again
+                        frame.dirty = False
+                        by_segment[frame.segment].append((frame.slot, frame.page, frame.page.take_dirty()))
+                        page_ids[frame.segment] = frame.page_id
+                        self.statistics.record(frame.page_id[0], "writebacks")
+                        count += 1
+        for segment, slot_pages in by_segment.items():
+            if config.MMAP_PAGES:
+                segment.sync_pages([(slot, page) for slot, page, _ in slot_pages])
+                bytes_written = len(slot_pages) * segment.page_size
+            else:
+                bytes_written = self.write_dirty(segment, slot_pages, page_ids[segment])
+            self.statistics.record(page_ids[segment][0], "bytes_written", bytes_written)
+        return count
+
+    # write the changed slots of pages of one segment (see Segment.write_dirty). page_id is one of the pages
+    # a packed segment (a cold page range, see Table.flush_page_range) would be unpacked and rewritten whole
+    # for that, so the page range is packed again from its pages instead, in one write
+    # returns the number of bytes written
+    def write_dirty(self, segment, slot_pages, page_id):
+        table_name, page_range_num, _, page_type, _ = page_id
+        if page_type != config.INDEX_PAGE and table_name in self.tables and segment.is_packed():
+            self.tables[table_name].flush_page_range(page_range_num)
+            return os.path.getsize(segment.path)
+        return segment.write_dirty(slot_pages)
+
+    def start_flusher(self):
+        if self.flusher is not None and self.flusher.is_alive():
+            return False
+        self.stop_flushing.clear()
+        self.flusher = threading.Thread(target=self.run_flusher, daemon=True)
+        self.flusher.start()
+        return True
+
+    def stop_flusher(self):
+        if self.flusher is None:
+            return False
+        self.stop_flushing.set()
+        self.flusher.join()
+        self.flusher = None
+        return True
+
+    # once the dirty ratio passes the high watermark, flush down to the low watermark
+    def run_flusher(self):
+        while not self.stop_flushing.wait(config.FLUSH_INTERVAL):
+            if self.dirty_ratio() >= config.DIRTY_HIGH_WATERMARK:
+                excess = self.dirty_ratio() - config.DIRTY_LOW_WATERMARK
+                self.flush(max(1, int(excess * self.max_size)))
+
+    '''
+    warm start
+    '''
+    # page ids of the resident pages, most recently used first
+    def resident_page_ids(self):
+        frames = [frame for frame in self.frames if not frame.empty]
+        frames.sort(key=lambda frame: frame.last_access, reverse=True)
+        return [frame.page_id for frame in frames]
+
+    # whether warm start can load page_id ahead: a node of a B+tree index file that still exists, or with
+    # config.MMAP_PAGES a table page, which is a view of its mapped segment the OS faults in on first access.
+    # without MMAP_PAGES table pages are loaded with their page ranges and need no warm start
+    def warmable(self, page_id):
+        table_name, page_range_num, page_group_num, page_type, column = page_id
+        if table_name not in self.tables:
+            return False
+        table = self.tables[table_name]
+        if page_type == config.INDEX_PAGE:
+            segment = table.index_segments.get(column)
+            return segment is not None and page_group_num < segment.num_slots()
+        return config.MMAP_PAGES and table.resident_page(page_id) is not None
+
+    # the resident page ids warm start can use, most recent first (what Database.close saves)
+    def warm_page_ids(self):
+        return [page_id for page_id in self.resident_page_ids() if self.warmable(page_id)]
+
+    # request page ids saved by warm_page_ids ahead, see ReadAhead.submit: B+tree nodes are loaded on the
+    # read-ahead threads, mapped table pages are advised to the OS. pages that are no longer warmable are
+    # skipped, and only as many as fit are loaded, least recent first so the replacement policy ends up
+    # with the same recency order
+    # returns the number of pages scheduled
+    def warm_start(self, page_ids):
+        page_ids = [page_id for page_id in page_ids if self.warmable(page_id)]
+        page_ids = page_ids[:self.max_size][::-1]
+        batch = config.WARM_START_BATCH
+        for table_name, table_page_ids in itertools.groupby(page_ids, key=lambda page_id: page_id[0]):
+            table_page_ids = list(table_page_ids)
+            for i in range(0, len(table_page_ids), batch):
+                self.read_ahead.submit(table_page_ids[i:i + batch], self.tables[table_name])
+        return len(page_ids)
+
+    '''
+    statistics
+    '''
+    # the pool and per table counters (see lstore.stats) plus the pool's current occupancy
+    def stats(self):
+        snapshot = self.statistics.snapshot()
+        snapshot["pool"].update({
+            "size": self.size,
+            "max_size": self.max_size,
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "dirty_ratio": self.dirty_ratio(),
+        })
+        return snapshot
+
+    # write stats() to a JSON file every interval seconds (config.STATS_DUMP_INTERVAL by default)
+    def start_stats_dump(self, path, interval=None):
+        return self.statistics.start_dumper(path, self.stats, interval)
+
+    def stop_stats_dump(self):
+        return self.statistics.stop_dumper()
+
+
+# BUFFER RING CLASS
+# Large scans (sum_version, merge, index builds) pin their pages through a ring:
+#   with bufferpool.ring() as ring:
+#       with ring.pin(page_id) as page:
+# pages already in the bufferpool are used as they are. pages the scan has to load take at most `size`
+# frames, an even share of them in every partition: a page goes to the partition its page id hashes to,
+# and once the ring holds its share of that partition, or the partition is full, the ring's own oldest
+# page there is evicted to make room instead of asking the partition's replacement policy.
+# so a scan never pushes the working set of point queries out of the pool
+class BufferRing:
+
+    def __init__(self, bufferpool, size):
+        self.bufferpool = bufferpool
+        self.size = size
+        self.partition_size = max(1, -(-size // len(bufferpool.partitions)))
+        # partition -> page ids this ring loaded into it, oldest first
+        self.pages = defaultdict(deque)
+
+    def fix(self, page_id, table=None):
+        bufferpool = self.bufferpool
+        partition = bufferpool.partition(page_id)
+        if page_id in partition.page_table:
+            return bufferpool.fix(page_id, table)
+        self.recycle(partition, bufferpool.page_bytes(page_id, table))
+        frame_index = bufferpool.fix(page_id, table)
+        if frame_index is not None:
+            self.pages[partition].append(page_id)
+        return frame_index
+
+    # make room for a page of page_bytes in the partition by evicting the ring's oldest unpinned page there,
+    # if the ring already holds its share of the partition or the partition is full
+    # pinned pages (in use by this scan, e.g. the other pages of a pin_many, or by a query) go to the back of the ring
+    def recycle(self, partition, page_bytes):
+        bufferpool = self.bufferpool
+        pages = self.pages[partition]
+        if len(pages) < self.partition_size and partition.hasCapacity(page_bytes):
+            return
+        for _ in range(len(pages)):
+            page_id = pages.popleft()
+            with partition.lock:
+                frame_index = partition.page_table.get(page_id)
+                if frame_index is None:
+                    return  # already evicted by the bufferpool
+                if bufferpool.frames[frame_index].curr_pins == 0:
+                    bufferpool.evict(frame_index)
+                    return
+            pages.append(page_id)
+
+    def pin(self, page_id, write=False):
+        return self.bufferpool.pin(page_id, write, self.fix)
+
+    def pin_many(self, page_ids, write=False):
+        return self.bufferpool.pin_many(page_ids, write, self.fix)
+
 
-        # write the page to disk
-        with open(full_path, 'wb+') as data_file:
-            data_file.write(frame.page.data)
-            # data_file.close()
+# RESIDENT PAGES CLASS
+# Stands in for the bufferpool of a table that has none (a standalone Table that never attached one):
+# pin, pin_many and ring hand out the table's own pages, loaded in its page ranges, with no frames,
+# pins or dirty tracking. The page ranges are written back by flush_page_range as usual.
+class ResidentPages:
 
-        # write the metadata to disk
-        with open(met_path, 'w+') as metadata_file:
-            metadata_file.write(frame.page.num_records)
-            # metadata_file.close()
+    def __init__(self, table):
+        self.table = table
 
+    @contextmanager
+    def pin(self, page_id, write=False):
+        yield self.table.resident_page(page_id)
 
+    @contextmanager
+    def pin_many(self, page_ids, write=False):
+        yield [self.table.resident_page(page_id) for page_id in page_ids]
 
-    
\ No newline at end of file
+    # a scan has no frames to recycle, so its ring is just the pages again
+    @contextmanager
+    def ring(self, size=None):
+        yield self
@@ -0,0 +1,101 @@
+import struct
+import numpy as np
+from lstore import config
+
+# PAGE CODECS
+# Every codec turns the full array of a page's int64 slots into bytes and back.
+# encode_page tries each codec and keeps the smallest, so a page never grows past RAW.
+RAW = 0
+FRAME_OF_REFERENCE = 1  # min value + every value's offset from it, bit packed
+DELTA = 2               # first value + frame of reference over the differences
+RLE = 3                 # (value, run length) pairs
+
+FOR_HEADER_FORMAT = "<qB"
+FOR_HEADER_SIZE = struct.calcsize(FOR_HEADER_FORMAT)
+RUN_LENGTH_DTYPE = "<u4"
+
+def bit_width(value):
+    return int(value).bit_length()
+
+'''
+frame of reference / bit packing
+'''
+def encode_for(values):
+    base = int(values.min())
+    offsets = (values - base).astype(np.uint64)
+    width = bit_width(offsets.max())
+    header = struct.pack(FOR_HEADER_FORMAT, base, width)
+    if width == 0:
+        return header
+    # one row of bits per value, least significant bit first
+    bits = ((offsets[:, None] >> np.arange(width, dtype=np.uint64)) & np.uint64(1)).astype(np.uint8)
+    return header + np.packbits(bits, bitorder="little").tobytes()
+
+def decode_for(buffer, count):
+    base, width = struct.unpack_from(FOR_HEADER_FORMAT, buffer, 0)
+    if width == 0:
+        return np.full(count, base, dtype=np.int64)
+    packed = np.frombuffer(buffer, dtype=np.uint8, offset=FOR_HEADER_SIZE)
+    bits = np.unpackbits(packed, count=count * width, bitorder="little").reshape(count, width).astype(np.uint64)
+    offsets = (bits << np.arange(width, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+    return (offsets.astype(np.int64) + base).astype(np.int64)
+
+'''
+delta
+'''
+def encode_delta(values):
+    return struct.pack("<q", int(values[0])) + encode_for(np.diff(values))
+
+def decode_delta(buffer, count):
+    first, = struct.unpack_from("<q", buffer, 0)
+    differences = decode_for(buffer[8:], count - 1)
+    return np.concatenate(([first], first + np.cumsum(differences))).astype(np.int64)
+
+'''
+run length encoding
+'''
+def encode_rle(values):
+    # start of every run, plus the end of the array
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    lengths = np.diff(np.append(starts, len(values)))
+    return struct.pack("<I", len(starts)) + values[starts].astype(config.VALUE_DTYPE).tobytes() + lengths.astype(RUN_LENGTH_DTYPE).tobytes()
+
+def decode_rle(buffer, count):
+    num_runs, = struct.unpack_from("<I", buffer, 0)
+    run_values = np.frombuffer(buffer, dtype=config.VALUE_DTYPE, count=num_runs, offset=4)
+    lengths = np.frombuffer(buffer, dtype=RUN_LENGTH_DTYPE, count=num_runs, offset=4 + num_runs * config.VALUE_SIZE)
+    return np.repeat(run_values, lengths).astype(np.int64)
+
+ENCODERS = {
+    FRAME_OF_REFERENCE: encode_for,
+    DELTA: encode_delta,
+    RLE: encode_rle,
+}
+
+DECODERS = {
+    FRAME_OF_REFERENCE: decode_for,
+    DELTA: decode_delta,
+    RLE: decode_rle,
+}
+
+'''
+Encode a page's raw data with whichever codec produces the fewest bytes
+Returns (codec, payload)
+'''
+def encode_page(data):
+    values = np.frombuffer(data, dtype=config.VALUE_DTYPE)
+    codec, payload = RAW, bytes(data)
+    for candidate, encoder in ENCODERS.items():
+        encoded = encoder(values)
+        if len(encoded) < len(payload):
+            codec, payload = candidate, encoded
+    return codec, payload
+
+'''
+Decode a payload back into a full page buffer
+'''
+def decode_page(codec, payload, page_size=config.ARRAY_SIZE):
+    if codec == RAW:
+        return bytearray(payload)
+    values = DECODERS[codec](payload, int(page_size/config.VALUE_SIZE))
+    return bytearray(values.astype(config.VALUE_DTYPE).tobytes())
@@ -7,12 +7,67 @@ PRIMARY_KEY_COLUMN = 5
 
 BASE_PAGE = 0
 TAIL_PAGE = 1
+# node pages of disk-resident B+tree indices (lstore.btree), cached by the bufferpool like base and tail pages
+INDEX_PAGE = 2
 PAGE_RANGE_SIZE = 16
 
 # page range size is array/value
 ARRAY_SIZE = 4096
 VALUE_SIZE = 8
+# numpy dtype matching VALUE_SIZE and the little-endian byte order used by Page
+VALUE_DTYPE = '<i8'
+
+# memory map segment files and use zero-copy page views instead of reading pages into bytearrays
+MMAP_PAGES = False
+# segment files are mapped in chunks of this many bytes (rounded down to whole slots), so a growing file only
+# remaps its last, partial chunk
+MMAP_CHUNK_BYTES = 16 * 1024 * 1024
+# compress the pages of page ranges that are no longer taking inserts when they are flushed (ignored with MMAP_PAGES)
+COMPRESS_COLD_PAGES = False
+
+# new tables only write the updated columns of a tail record (saved per table in its metadata)
+SPARSE_TAIL_RECORDS = False
 
 # experiment with these
-BUFFERPOOL_MAX_LENGTH = 1024 #increase later
+# bufferpool memory budget in bytes (1024 pages of ARRAY_SIZE), split over BUFFERPOOL_PARTITIONS hash partitions
+BUFFERPOOL_MAX_BYTES = 1024 * ARRAY_SIZE #increase later
+BUFFERPOOL_PARTITIONS = 8
+# bufferpool replacement policy: "lru", "clock", "2q" or "lru-k" (Database.open can pick one per database)
+EVICTION_POLICY = "lru"
+# write-behind flusher: start writing dirty pages once this fraction of the frames is dirty, stop at the low watermark
+DIRTY_HIGH_WATERMARK = 0.25
+DIRTY_LOW_WATERMARK = 0.10
+# seconds between dirty ratio checks
+FLUSH_INTERVAL = 0.1
+# read-ahead: after READ_AHEAD_TRIGGER sequential page groups (base pages with MMAP_PAGES, B+tree leaves), request
+# the next READ_AHEAD_PAGES groups, see lstore.readahead
+READ_AHEAD_TRIGGER = 2
+READ_AHEAD_PAGES = 4
+READ_AHEAD_WORKERS = 2
+# frames a large scan (sum_version, merge, index builds) may load into the bufferpool, see BufferRing
+SCAN_RING_SIZE = 32
+# index the primary key with a hash index (lstore.index.HashIndex) instead of a SortedDict
+PRIMARY_HASH_INDEX = True
+# the index log (lstore.indexlog) is compacted into a snapshot once it holds more than
+# INDEX_LOG_COMPACT_RATIO records per indexed key, and at least INDEX_LOG_MIN_RECORDS records
+INDEX_LOG_COMPACT_RATIO = 1.0
+INDEX_LOG_MIN_RECORDS = 65536
+# memory map the arrays of index snapshots instead of reading them (np.fromfile)
+INDEX_SNAPSHOT_MMAP = True
+# fraction of each leaf a B+tree bulk load fills, the rest is room for later inserts
+BTREE_FILL_FACTOR = 0.9
+# dirty slot ranges a page tracks before they are joined into one, see Page.mark_dirty
+MAX_DIRTY_RANGES = 16
+# count bufferpool hits, misses, evictions and write-backs per pool and table (lstore.stats)
+STATS_ENABLED = True
+# Database.open dumps the bufferpool stats to this file in the database directory every STATS_DUMP_INTERVAL
+# seconds (None turns the dump off)
+STATS_DUMP_FILE = None
+STATS_DUMP_INTERVAL = 10.0
+# Database.close saves the resident page ids that can be loaded ahead (most recent first) to this file in the
+# database directory and Database.open requests them in batches of WARM_START_BATCH pages, see
+# Bufferpool.warm_start: B+tree nodes, and with MMAP_PAGES table pages. no file is written if there are none
+WARM_START = True
+WARM_START_FILE = "bufferpool.warm"
+WARM_START_BATCH = 16
 UPDATES_BEFORE_MERGE = 512
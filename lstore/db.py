@@ -1,12 +1,14 @@
 from lstore.table import Table
 from lstore.bufferpool import Bufferpool
+from lstore.eviction import POLICIES
+from lstore.index import Index
+from lstore.indexlog import IndexLog
 from lstore import config
 import os
 import json
 import shutil
 import threading
 import time 
-import pickle
 
 class Database():
 
@@ -18,12 +20,17 @@ class Database():
         
 
     # Not required for milestone1
-    def open(self, path):
+    # eviction_policy picks the bufferpool replacement policy, see lstore.eviction (config.EVICTION_POLICY by default)
+    def open(self, path, eviction_policy=None):
         # check if database is already open
         if self.isOpen:
             print("error: Database is already open")
             return False
         
+        if eviction_policy is not None and eviction_policy not in POLICIES:
+            print(f"error: unknown eviction policy \"{eviction_policy}\", expected one of {list(POLICIES)}")
+            return False
+
         # create directory for database or if it already exists, open it
         if not os.path.exists(path):
             os.mkdir(path)
@@ -32,14 +39,21 @@ class Database():
         self.path = path
         self.isOpen = True
 
+        # create bufferpool (before the tables, which keep a reference to it)
+        self.bufferpool = Bufferpool(eviction_policy=eviction_policy, max_bytes=config.BUFFERPOOL_MAX_BYTES, partitions=config.BUFFERPOOL_PARTITIONS)
+        self.bufferpool.start_flusher()
+        if config.STATS_DUMP_FILE is not None:
+            self.bufferpool.start_stats_dump(os.path.join(path, config.STATS_DUMP_FILE))
+
         # initialize tables into memory
         for table in os.listdir(path):
             full_table_path = os.path.join(path, table) 
             if os.path.isdir(full_table_path):
                 self.get_table(table)
 
-        # create bufferpool
-        self.bufferpool = Bufferpool(config.BUFFERPOOL_MAX_LENGTH) 
+        # prefetch the pages that were resident when the database was closed
+        if config.WARM_START:
+            self.warm_start()
 
         # Start background merge process
         self.merge_thread = threading.Thread(target=self.run_merge, daemon=True)
@@ -54,11 +68,15 @@ class Database():
             return True
 
         
-        # loop through bufferpool and write dirty pages to disk
+        # remember the resident pages for the next open
+        if config.WARM_START:
+            self.save_warm_start()
 
-        for frameNum in range(len(self.bufferpool.frames)):
-            if self.bufferpool.frames[frameNum] and self.bufferpool.frames[frameNum].dirty: 
-                self.bufferpool.writeToDisk(frameNum) # TODO: idk if this syntax is correct.
+        # stop the write-behind flusher and write the remaining dirty pages to disk
+        self.bufferpool.read_ahead.shutdown()
+        self.bufferpool.stop_flusher()
+        self.bufferpool.flush()
+        self.bufferpool.stop_stats_dump()
         
         # Close all tables (write metadata to disk)
         for table in self.tables:
@@ -72,6 +90,30 @@ class Database():
             self.merge_thread.join()  # Stop merge thread before closing
         return True
 
+    """
+    # Warm start: the resident page ids that can be loaded ahead (B+tree nodes, and table pages with
+    # MMAP_PAGES, see Bufferpool.warmable) are saved on close and requested on the next open
+    """
+    def save_warm_start(self):
+        warm_start_path = os.path.join(self.path, config.WARM_START_FILE)
+        page_ids = self.bufferpool.warm_page_ids()
+        if not page_ids:
+            # nothing to warm: no file, and none left over from an earlier close
+            if os.path.exists(warm_start_path):
+                os.remove(warm_start_path)
+            return False
+        with open(warm_start_path, 'w') as warm_start_file:
+            json.dump(page_ids, warm_start_file)
+        return True
+
+    def warm_start(self):
+        warm_start_path = os.path.join(self.path, config.WARM_START_FILE)
+        if not os.path.exists(warm_start_path):
+            return 0
+        with open(warm_start_path, 'r') as warm_start_file:
+            page_ids = [tuple(page_id) for page_id in json.load(warm_start_file)]
+        return self.bufferpool.warm_start(page_ids)
+
     def start_merge_thread(self):
         """Starts the background merge thread."""
         if not self.merge_thread:
@@ -90,13 +132,27 @@ class Database():
     :param path: string         #Path of directory
     :param num_columns: int     #Number of Columns: all columns are integer
     :param key: int             #Index of table key in columns
+    :param dictionary_columns: list #Indices of low-cardinality columns to store dictionary encoded
+    :param page_size: int       #Bytes per physical page, e.g. 65536 for scan heavy tables. Defaults to config.ARRAY_SIZE
+    :param page_range_size: int #Base page groups per page range. Defaults to config.PAGE_RANGE_SIZE
+    :param merge_threshold: int #Updates before a merge is started. Defaults to config.UPDATES_BEFORE_MERGE
     """
-    def create_table(self, name, num_columns, key_index):
+    def create_table(self, name, num_columns, key_index, dictionary_columns=None, page_size=None, page_range_size=None, merge_threshold=None):
         # check if database is open
         if not self.isOpen:
             print("error: Database is not open")
             return None
         
+        # the primary key index has to hold the raw keys
+        if dictionary_columns and key_index in dictionary_columns:
+            print("error: The key column can't be dictionary encoded")
+            return None
+
+        # pages hold whole values
+        if page_size is not None and (page_size <= 0 or page_size % config.VALUE_SIZE != 0):
+            print(f"error: Page size must be a positive multiple of {config.VALUE_SIZE} bytes")
+            return None
+
         # define path
         newpath = f"{self.path}/{name}" 
         
@@ -109,8 +165,8 @@ class Database():
         os.mkdir(newpath)
 
         # create table object
-        newTable = Table(name=name, path=newpath, num_columns=num_columns, key=key_index,page_directory={}, latest_page_range=None)
-        newTable.bufferpool = self.bufferpool
+        newTable = Table(name=name, path=newpath, num_columns=num_columns, key=key_index,page_directory={}, latest_page_range=None, dictionaries={column: [] for column in dictionary_columns or []}, page_size=page_size, page_range_size=page_range_size, merge_threshold=merge_threshold, bufferpool=self.bufferpool)
+        self.attach_index_log(newTable)
         for table in self.tables:
             if table.name == newTable.name:
                 print(f"error: A table with the name \"{table.name}\" already exists")
@@ -168,11 +224,16 @@ class Database():
         num_columns = data["num_columns"]
         json_page_dir = data["page_directory"] 
         latest_page_range = data["latest_page_range"] 
+        dictionaries = {int(column): values for column, values in data.get("dictionaries", {}).items()}
+        sparse_tails = data.get("sparse_tails", False)
+        page_size = data.get("page_size", config.ARRAY_SIZE)
+        page_range_size = data.get("page_range_size", config.PAGE_RANGE_SIZE)
+        merge_threshold = data.get("merge_threshold", config.UPDATES_BEFORE_MERGE)
 
         # properly format the page_dir using the json data
         page_directory = {}
         for i in json_page_dir:
-            page_directory[i] = (json_page_dir[i]['page_range'], json_page_dir[i]['base_page'], json_page_dir[i]['record_number'])
+            page_directory[int(i)] = (json_page_dir[i]['page_range'], json_page_dir[i]['base_page'], json_page_dir[i]['record_number'])
         
 
         # get index from disk
@@ -180,12 +241,13 @@ class Database():
 
         if new_index!=None:
             # create the table with the data from disk, and add it to memory
-            new_table = Table(name=name, path=path, key=key, num_columns=num_columns, page_directory=page_directory, latest_page_range=latest_page_range, index=new_index)
+            new_table = Table(name=name, path=path, key=key, num_columns=num_columns, page_directory=page_directory, latest_page_range=latest_page_range, index=new_index, dictionaries=dictionaries, sparse_tails=sparse_tails, page_size=page_size, page_range_size=page_range_size, merge_threshold=merge_threshold, bufferpool=self.bufferpool)
         else: 
             # if there was no index found, just create a new one by falling back to the default value which creates a new index for this table
-            new_table = Table(name=name, path=path, key=key, num_columns=num_columns, page_directory=page_directory, latest_page_range=latest_page_range)
-        new_table.bufferpool = self.bufferpool  # Attach bufferpool to table
+            new_table = Table(name=name, path=path, key=key, num_columns=num_columns, page_directory=page_directory, latest_page_range=latest_page_range, dictionaries=dictionaries, sparse_tails=sparse_tails, page_size=page_size, page_range_size=page_range_size, merge_threshold=merge_threshold, bufferpool=self.bufferpool)
+        self.attach_index_log(new_table)
         new_table.open_page_ranges() # goes through everything inside and reads to memory
+        new_table.open_disk_indices() # B+tree indices are read node by node through the bufferpool
         self.tables.append(new_table)
         return new_table
     
@@ -221,7 +283,12 @@ class Database():
             "key" : table.key,
             "num_columns" : table.num_columns,
             "page_directory" : json_page_dir,
-            "latest_page_range" : table.latest_page_range
+            "latest_page_range" : table.latest_page_range,
+            "dictionaries" : {column - 5: dictionary.values for column, dictionary in table.dictionaries.items()},
+            "sparse_tails" : table.sparse_tails,
+            "page_size" : table.page_size,
+            "page_range_size" : table.page_range_size,
+            "merge_threshold" : table.merge_threshold
         }
         table_metadata_path = f'{self.path}/{table.name}.json'
 
@@ -241,61 +308,54 @@ class Database():
             page_range_metadata = {
                 "latest_base_page": page_range.latest_base_page,  
                 "latest_tail_page": page_range.latest_tail_page,
-                "num_columns": page_range.num_columns
+                "num_columns": page_range.num_columns,
+                "base_records": [base_page.latest_record_number for base_page in page_range.base_pages],
+                "tail_records": [tail_page.latest_record_number for tail_page in page_range.tail_pages]
             }       
             page_range_path = f'{self.path}/{table.name}/{i}.json'
+            saved_metadata = None
+            if os.path.exists(page_range_path):
+                with open(page_range_path, 'r') as page_range_input_file:
+                    saved_metadata = json.load(page_range_input_file)
 
-            # save the page range's metadata first
-            with open(page_range_path, 'w') as page_range_output_file:
-                json.dump(page_range_metadata, page_range_output_file, indent=4)
-            
-            # if 0 bytes are written then it failed
-            if os.path.getsize(page_range_path) == 0:
-                print(f"error: Failed to write page range metadata for {table.name}, range {i}")
-                return False
-                
-            # then save all the page groups inside the page range
-            # base pages
-            for j, base_page in enumerate(page_range.base_pages):
-                base_page_metadata = {"latest_record_number": base_page.latest_record_number}
-                base_page_path = f'{self.path}/{table.name}/{i}/b{j}.json'
-
-                with open(base_page_path, 'w') as base_page_output_file:
-                    json.dump(base_page_metadata, base_page_output_file, indent=4)
-
-                if os.path.getsize(base_page_path) == 0: 
-                    print(f"error: Failed to write base page metadata for {table.name}, range {i}, base {j}")
-                    return False
-            # tail pages
-            for k, tail_page in enumerate(page_range.tail_pages):
-                tail_page_metadata = {"latest_record_number": tail_page.latest_record_number}
-
-                tail_page_path = f'{self.path}/{table.name}/{i}/t{k}.json'
-
-                with open(tail_page_path, 'w') as tail_page_output_file:
-                    json.dump(tail_page_metadata, tail_page_output_file, indent=4)
+            # save the page range's metadata first, if it changed
+            if page_range_metadata != saved_metadata:
+                with open(page_range_path, 'w') as page_range_output_file:
+                    json.dump(page_range_metadata, page_range_output_file, indent=4)
 
-                if os.path.getsize(tail_page_path) == 0:
-                    print(f"error: Failed to write tail page metadata for {table.name}, range {i}, tail {k}")
+                # if 0 bytes are written then it failed
+                if os.path.getsize(page_range_path) == 0:
+                    print(f"error: Failed to write page range metadata for {table.name}, range {i}")
                     return False
+
+            # then write the pages that changed since the bufferpool's write-back (the whole range if it got
+            # new page groups). clean page ranges are left alone
+            new_groups = saved_metadata is None or [len(saved_metadata["base_records"]), len(saved_metadata["tail_records"])] != [len(page_range.base_pages), len(page_range.tail_pages)]
+            table.write_back_page_range(i, new_groups)
         return True
 
     """
     # save and load table indices
     """
-    # save index to disk using pickle
+    # the index keeps a snapshot and a log of its changes in the database directory, see lstore.indexlog
+    def attach_index_log(self, table):
+        if table.index.log is None:
+            table.index.log = IndexLog(f"{self.path}/{table.name}.index")
+
+    # append the index changes since the last save to the log
     def save_index(self, table):
-        index_path = f"{self.path}/{table.name}.index"
-        with open(index_path, "wb+") as f:
-            pickle.dump(table.index, f)
+        self.attach_index_log(table)
+        table.index.save_index()
 
-    # load index from disk using pickle
+    # load the index snapshot and replay the log onto it
     def load_index(self, table_name):
-        index_path = f"{self.path}/{table_name}.index"
-        if os.path.exists(index_path):
-            with open(index_path, "rb") as f:
-                new_index = pickle.load(f)
-                return new_index
-        else:
+        log = IndexLog(f"{self.path}/{table_name}.index")
+        new_index = log.read_snapshot()
+        if new_index is None and not os.path.exists(log.log_path):
             print(f"WARNING: Index does not exist for Table \"{table_name}\"")
             return None
+        if new_index is None:
+            new_index = Index(table_name)
+        log.replay(new_index)
+        new_index.log = log
+        return new_index
@@ -0,0 +1,197 @@
+from collections import OrderedDict, deque
+from lstore import config
+
+# REPLACEMENT POLICIES
+# A policy tracks the frames of one bufferpool by frame index and picks the victim when the pool is full.
+# The bufferpool calls:
+#   admit(frame_index, page_id)  when a page is loaded into a frame
+#   access(frame_index)          on every hit
+#   remove(frame_index)          when a frame is emptied
+#   victim(frames)               for the index of an unpinned frame to evict, or None if every frame is pinned
+class ReplacementPolicy:
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+
+    def admit(self, frame_index, page_id):
+        pass
+
+    def access(self, frame_index):
+        pass
+
+    def remove(self, frame_index):
+        pass
+
+    def victim(self, frames):
+        return None
+
+'''
+least recently used
+'''
+class LRUPolicy(ReplacementPolicy):
+
+    def __init__(self, max_size):
+        super().__init__(max_size)
+        # least recently used first
+        self.order = OrderedDict()
+
+    def admit(self, frame_index, page_id):
+        self.order[frame_index] = None
+
+    def access(self, frame_index):
+        self.order.move_to_end(frame_index)
+
+    def remove(self, frame_index):
+        self.order.pop(frame_index, None)
+
+    def victim(self, frames):
+        for frame_index in self.order:
+            if frames[frame_index].curr_pins == 0:
+                return frame_index
+        return None
+
+'''
+clock sweep: one reference bit per frame, the hand clears bits until it finds an unreferenced frame
+'''
+class ClockPolicy(ReplacementPolicy):
+
+    def __init__(self, max_size):
+        super().__init__(max_size)
+        self.referenced = [False] * max_size
+        self.resident = [False] * max_size
+        self.hand = 0
+
+    def admit(self, frame_index, page_id):
+        self.resident[frame_index] = True
+        self.referenced[frame_index] = True
+
+    def access(self, frame_index):
+        self.referenced[frame_index] = True
+
+    def remove(self, frame_index):
+        self.resident[frame_index] = False
+        self.referenced[frame_index] = False
+
+    def victim(self, frames):
+        # two full turns clear every reference bit, after that every candidate is pinned
+        for _ in range(2 * self.max_size):
+            frame_index = self.hand
+            self.hand = (self.hand + 1) % self.max_size
+            if not self.resident[frame_index] or frames[frame_index].curr_pins != 0:
+                continue
+            if self.referenced[frame_index]:
+                self.referenced[frame_index] = False
+                continue
+            return frame_index
+        return None
+
+'''
+2Q: new pages enter a FIFO (a1in). pages evicted from it are remembered by page id (a1out),
+and a page that comes back while remembered goes to the main LRU queue (am)
+so a page touched once by a scan never pushes out the pages that are used repeatedly
+'''
+class TwoQueuePolicy(ReplacementPolicy):
+
+    def __init__(self, max_size, in_ratio=0.25, out_ratio=0.5):
+        super().__init__(max_size)
+        self.max_in = max(1, int(max_size * in_ratio))
+        self.max_out = max(1, int(max_size * out_ratio))
+        self.a1in = OrderedDict()
+        self.a1out = OrderedDict()
+        self.am = OrderedDict()
+        self.page_ids = {}
+
+    def admit(self, frame_index, page_id):
+        self.page_ids[frame_index] = page_id
+        if page_id in self.a1out:
+            del self.a1out[page_id]
+            self.am[frame_index] = None
+        else:
+            self.a1in[frame_index] = None
+
+    def access(self, frame_index):
+        # hits in a1in are correlated references and do not promote the page
+        if frame_index in self.am:
+            self.am.move_to_end(frame_index)
+
+    def remove(self, frame_index):
+        page_id = self.page_ids.pop(frame_index, None)
+        if frame_index in self.a1in:
+            del self.a1in[frame_index]
+            # remember the page so a second use promotes it
+            self.a1out[page_id] = None
+            if len(self.a1out) > self.max_out:
+                self.a1out.popitem(last=False)
+        else:
+            self.am.pop(frame_index, None)
+
+    def first_unpinned(self, queue, frames):
+        for frame_index in queue:
+            if frames[frame_index].curr_pins == 0:
+                return frame_index
+        return None
+
+    def victim(self, frames):
+        if len(self.a1in) > self.max_in or not self.am:
+            queues = (self.a1in, self.am)
+        else:
+            queues = (self.am, self.a1in)
+        for queue in queues:
+            frame_index = self.first_unpinned(queue, frames)
+            if frame_index is not None:
+                return frame_index
+        return None
+
+'''
+LRU-K: evict the frame whose K-th most recent access is the oldest
+frames with fewer than K accesses have an infinite backward distance and go first, oldest access first
+'''
+class LRUKPolicy(ReplacementPolicy):
+
+    def __init__(self, max_size, k=2):
+        super().__init__(max_size)
+        self.k = k
+        self.clock = 0
+        # frame index -> the last k access times, oldest first
+        self.history = {}
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    def admit(self, frame_index, page_id):
+        self.history[frame_index] = deque([self.tick()], maxlen=self.k)
+
+    def access(self, frame_index):
+        self.history[frame_index].append(self.tick())
+
+    def remove(self, frame_index):
+        self.history.pop(frame_index, None)
+
+    def victim(self, frames):
+        best, best_key = None, None
+        for frame_index, times in self.history.items():
+            if frames[frame_index].curr_pins != 0:
+                continue
+            # (has K accesses, K-th most recent access, most recent access): the smallest is evicted
+            key = (len(times) == self.k, times[0], times[-1])
+            if best_key is None or key < best_key:
+                best, best_key = frame_index, key
+        return best
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "clock": ClockPolicy,
+    "2q": TwoQueuePolicy,
+    "lru-k": LRUKPolicy,
+}
+
+'''
+Create the replacement policy with the given name (config.EVICTION_POLICY by default)
+Raises ValueError for an unknown name, a pool without a policy could never evict
+'''
+def make_policy(name, max_size):
+    name = config.EVICTION_POLICY if name is None else name
+    if name not in POLICIES:
+        raise ValueError(f"unknown eviction policy \"{name}\", expected one of {list(POLICIES)}")
+    return POLICIES[name](max_size)
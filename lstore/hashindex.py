@@ -0,0 +1,46 @@
+import numpy as np
+from sortedcontainers import SortedList
+
+# HASH INDEX CLASS
+# A dict of key -> list of RIDs for the primary key: select, update, delete and increment only look up
+# single keys, so each lookup is one dict probe. The sorted list of keys that range lookups (irange) need
+# is built on the first range lookup and kept in sync from then on.
+class HashIndex(dict):
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.sorted_keys = None
+
+    def __setitem__(self, key, rids):
+        if self.sorted_keys is not None and key not in self:
+            self.sorted_keys.add(key)
+        super().__setitem__(key, rids)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        if self.sorted_keys is not None:
+            self.sorted_keys.remove(key)
+
+    def update(self, entries):
+        entries = dict(entries)
+        if self.sorted_keys is not None:
+            self.sorted_keys.update(key for key in entries if key not in self)
+        super().update(entries)
+
+    # the keys in [begin, end] in order, like SortedDict.irange
+    def irange(self, begin, end):
+        if self.sorted_keys is None:
+            self.sorted_keys = SortedList(self)
+        return self.sorted_keys.irange(begin, end)
+
+    # pickled as a plain dict, the sorted keys are rebuilt when needed
+    def __reduce__(self):
+        return (HashIndex, (dict(self),))
+
+    # build from the int64 arrays of a snapshot, see lstore.arrayindex.ArrayIndex
+    @classmethod
+    def from_arrays(cls, keys, offsets, rids):
+        if len(rids) == len(keys):
+            # one RID per key, as a primary key should have
+            return cls(zip(keys.tolist(), ([rid] for rid in rids.tolist())))
+        return cls(zip(keys.tolist(), (rid_list.tolist() for rid_list in np.split(np.asarray(rids), np.asarray(offsets[1:-1])))))
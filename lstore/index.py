@@ -6,16 +6,59 @@ import pickle
 import os
 from sortedcontainers import SortedDict  # better for range queries
 from lstore import config
+from lstore.btree import BTreeIndex
+from lstore.arrayindex import ArrayIndex
+from lstore.postings import PostingList, intersect
+from lstore.hashindex import HashIndex
+from lstore.indexlog import ADD, REMOVE, CREATE, DROP
 
 class Index:
     def __init__(self, table_name):
-        self.indices = defaultdict(lambda: SortedDict())  # Changed from defaultdict(list) to SortedDict
+        # column -> SortedDict of key -> PostingList of RIDs (lstore.postings), or a BTreeIndex (lstore.btree) kept on disk
+        # the primary key's HashIndex keeps one RID lists
+        self.indices = defaultdict(SortedDict)  # Changed from defaultdict(list) to SortedDict
+        if config.PRIMARY_HASH_INDEX:
+            self.indices[config.PRIMARY_KEY_COLUMN] = HashIndex()
         self.table_name = table_name
         self.index_file = f"{table_name}_index.pkl"
+        # dictionary encoded columns are indexed by their codes: key_col -> ColumnDictionary
+        self.dictionaries = {}
+        # lstore.indexlog.IndexLog the changes are appended to (set by the Database), and the changes not saved yet
+        self.log = None
+        self.changes = []
         
         # Load index from disk if it exists
         self.load_index()
 
+    # B+tree indices keep their own files and the log belongs to the database, neither is pickled
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["indices"] = defaultdict(SortedDict, {column: index for column, index in self.indices.items() if not isinstance(index, BTreeIndex)})
+        state["log"] = None
+        state["changes"] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.log = None
+        self.changes = []
+
+    # record a change for the log. B+tree indices write their own changes
+    def record(self, op, key_col, key=0, rid=0):
+        if self.log is not None and not isinstance(self.indices.get(key_col), BTreeIndex):
+            self.changes.append((op, key_col, key, rid))
+
+    # apply a change read back from the log, keys are already dictionary encoded
+    def apply(self, op, key_col, key, rid):
+        if op == ADD:
+            self.add_entry(key, rid, key_col)
+        elif op == REMOVE:
+            self.remove_entry(key, rid, key_col)
+        elif op == CREATE:
+            self.indices[key_col] = SortedDict()
+        elif op == DROP:
+            self.indices.pop(key_col, None)
+
     '''
     Add new record entry to index
     '''
@@ -23,10 +66,37 @@ class Index:
         if key_col not in self.indices:
             print(f"Warning: No index exists for column {key_col}. Skipping index update.")
             return
-        if key in self.indices[key_col]:
+        if key_col in self.dictionaries:
+            key = self.dictionaries[key_col].encode(key)
+        self.record(ADD, key_col, key, rid)
+        self.add_entry(key, rid, key_col)
+
+    def add_entry(self, key, rid, key_col):
+        if isinstance(self.indices[key_col], (BTreeIndex, ArrayIndex)):
+            self.indices[key_col].add(key, rid)
+        elif key in self.indices[key_col]:
             self.indices[key_col][key].append(rid)
-        else:
+        elif isinstance(self.indices[key_col], HashIndex):
             self.indices[key_col][key] = [rid]
+        else:
+            self.indices[key_col][key] = PostingList((rid,))
+
+    '''
+    Add many (key, rid) entries at once. Keys must not already be in the index
+    '''
+    def bulk_load(self, keys, rids, key_col=config.PRIMARY_KEY_COLUMN):
+        if key_col in self.dictionaries:
+            keys = self.dictionaries[key_col].encode_many(keys).tolist()
+        if isinstance(self.indices[key_col], BTreeIndex):
+            self.indices[key_col].bulk_load(keys, rids)
+            return
+        if self.log is not None:
+            self.changes.extend((ADD, key_col, key, rid) for key, rid in zip(keys, rids))
+        # SortedDict.update sorts the new keys once instead of bisecting per key
+        if isinstance(self.indices[key_col], HashIndex):
+            self.indices[key_col].update(zip(keys, ([rid] for rid in rids)))
+        else:
+            self.indices[key_col].update(zip(keys, (PostingList((rid,)) for rid in rids)))
 
     '''
     Remove a record entry from index
@@ -34,7 +104,17 @@ class Index:
     def removeRecord(self, key, rid, key_col=config.PRIMARY_KEY_COLUMN):
         if key_col not in self.indices:
             return
-        if key in self.indices[key_col]:
+        if key_col in self.dictionaries:
+            key = self.dictionaries[key_col].code(key)
+            if key is None:
+                return
+        self.record(REMOVE, key_col, key, rid)
+        self.remove_entry(key, rid, key_col)
+
+    def remove_entry(self, key, rid, key_col):
+        if isinstance(self.indices[key_col], (BTreeIndex, ArrayIndex)):
+            self.indices[key_col].remove(key, rid)
+        elif key in self.indices[key_col]:
             self.indices[key_col][key].remove(rid)
             if not self.indices[key_col][key]:  # Remove empty lists
                 del self.indices[key_col][key]
@@ -50,34 +130,112 @@ class Index:
     Locate RIDs with exact value
     '''
     def locate(self, key_val, key_col=config.PRIMARY_KEY_COLUMN):
+        return list(self.postings(key_val, key_col))
+
+    # the RIDs of key_val as the index stores them, not copied
+    def postings(self, key_val, key_col):
+        if key_col in self.dictionaries:
+            # compare codes, a value missing from the dictionary can't be in the index
+            key_val = self.dictionaries[key_col].code(key_val)
+            if key_val is None:
+                return []
         return self.indices[key_col].get(key_val, [])
 
+    '''
+    Locate RIDs matching every (key_val, key_col) condition, in RID order
+    the posting lists are intersected (lstore.postings.intersect), shortest first
+    '''
+    def locate_all(self, conditions):
+        for _, key_col in conditions:
+            if key_col not in self.indices:
+                print(f"error: No index exists for column {key_col}")
+                return []
+        return intersect([self.postings(key_val, key_col) for key_val, key_col in conditions]).tolist()
+
     '''
     Locate RIDs within a range
     '''
     def locate_range(self, begin, end, key_col=config.PRIMARY_KEY_COLUMN):
         if key_col not in self.indices:
             return []
+        if key_col in self.dictionaries:
+            # codes aren't ordered like the values, so pick the codes whose values fall in the range
+            dictionary = self.dictionaries[key_col]
+            codes = [dictionary.codes[value] for value in sorted(dictionary.values) if begin <= value <= end]
+            return [rid for code in codes for rid in self.indices[key_col].get(code, [])]
+        if isinstance(self.indices[key_col], BTreeIndex):
+            return self.indices[key_col].locate_range(begin, end)
         return [rid for key in self.indices[key_col].irange(begin, end) for rid in self.indices[key_col][key]]
 
     '''
     Create index on a specific column
+    disk=True keeps the index in a B+tree file whose nodes are cached by the table's bufferpool (needs the table)
+    an existing in-memory index is moved to disk
     '''
-    def create_index(self, column_number, table=None):
+    def create_index(self, column_number, table=None, disk=False):
+        if disk and table is None:
+            print("error: A disk index needs the table")
+            return False
+        if disk and table.bufferpool is None:
+            print("error: A disk index needs the table's bufferpool")
+            return False
+        if column_number in self.indices and disk and not isinstance(self.indices[column_number], BTreeIndex):
+            return self.move_to_disk(column_number, table)
         if column_number in self.indices:
             print(f"Index already exists for column {column_number}")
             return False
-        self.indices[column_number] = SortedDict()
+        self.indices[column_number] = BTreeIndex(table, column_number) if disk else SortedDict()
+        self.record(CREATE, column_number)
     
-        if table:
-            for rid in table.page_directory.keys():  # Iterates over all RIDs
-                value = table.getBufferpoolPage(rid, column_number, table)  # Fetches value
-                if value is not None:
-                    self.addRecord(value, rid, column_number)
+        if table and disk:
+            # collect every entry first so the tree is bulk loaded bottom up
+            entries = list(self.scan_column(table, column_number))
+            self.bulk_load([value for value, _ in entries], [rid for _, rid in entries], column_number)
+        elif table:
+            for value, rid in self.scan_column(table, column_number):
+                self.addRecord(value, rid, column_number)
     
         self.save_index()
         return True
 
+    # bulk load the entries of an in-memory index into a new B+tree
+    def move_to_disk(self, column_number, table):
+        entries = self.indices[column_number]
+        # the log forgets the in-memory index, the tree is reattached from its file
+        self.record(DROP, column_number)
+        self.indices[column_number] = BTreeIndex(table, column_number)
+        keys = [key for key, rids in entries.items() for rid in rids]
+        rids = [rid for rids in entries.values() for rid in rids]
+        self.indices[column_number].bulk_load(keys, rids)
+        self.save_index()
+        return True
+
+    # attach a B+tree index file that already exists, e.g. when the table is opened
+    def attach_disk_index(self, table, column_number):
+        self.indices[column_number] = BTreeIndex(table, column_number)
+
+    # yields (latest value, rid) for every record of the table
+    def scan_column(self, table, column_number):
+        # read the column one base page at a time, through a private ring of frames so the build doesn't flush the bufferpool
+        with table.pins().ring() as ring:
+            for page_range_num, page_range in enumerate(table.page_ranges):
+                for base_page_num in range(len(page_range.base_pages)):
+                    columns = (config.RID_COLUMN, config.INDIRECTION_COLUMN, column_number)
+                    if table.bufferpool is not None:
+                        table.bufferpool.read_ahead.access(table, page_range_num, base_page_num, columns, ring)
+                    page_ids = table.group_page_ids(page_range_num, base_page_num, config.BASE_PAGE, columns)
+                    with ring.pin_many(page_ids) as (rid_page, indirection_page, value_page):
+                        rids = rid_page.read_all().tolist()
+                        indirections = indirection_page.read_all().tolist()
+                        values = value_page.read_all().tolist()
+                    for rid, indirection, value in zip(rids, indirections, values):
+                        if rid == 0:
+                            continue  # deleted record
+                        if indirection != 0:
+                            # updated record, the latest value is in its tail records
+                            value = table.latest_value(indirection, column_number, value)
+                        yield value, rid
+
 
     '''
     Drop index for a column
@@ -88,17 +246,28 @@ class Index:
             return False
         if column_number not in self.indices:
             return False
+        self.record(DROP, column_number)
+        if isinstance(self.indices[column_number], BTreeIndex):
+            self.indices[column_number].destroy()
         del self.indices[column_number]
         self.save_index()
         return True
 
     '''
-    Here on uses pickle
     Save index to disk
+    with a log (see lstore.indexlog) only the changes since the last save are appended, and the log is
+    compacted into a new snapshot once it grows past its limit. without one the whole index is pickled
+    B+tree indices live in their own files, only the in-memory ones are pickled
     '''
     def save_index(self):
+        if self.log is not None:
+            changes, self.changes = self.changes, []
+            self.log.append(changes)
+            if self.log.needs_compaction(sum(len(index) for index in self.indices.values() if not isinstance(index, BTreeIndex))):
+                self.log.compact(self)
+            return
         with open(self.index_file, "wb") as f:
-            pickle.dump(self.indices, f)
+            pickle.dump(defaultdict(SortedDict, {column: index for column, index in self.indices.items() if not isinstance(index, BTreeIndex)}), f)
 
     '''
     Load index from disk
@@ -0,0 +1,173 @@
+import copy
+import os
+import pickle
+import struct
+from collections import defaultdict
+from operator import itemgetter
+import numpy as np
+from sortedcontainers import SortedDict
+from lstore import config
+from lstore.arrayindex import ArrayIndex
+from lstore.hashindex import HashIndex
+from lstore.btree import BTreeIndex
+
+# INDEX LOG
+# Index changes are appended to a log instead of rewriting the whole pickled index on every save:
+#   {path}      snapshot, see below
+#   {path}.log  header (magic, generation) followed by fixed size records
+#
+# snapshot: | header | metadata | arrays |
+# header:   magic, generation, metadata length
+# metadata: pickle of (the Index without its column indices, {column: (number of keys, number of RIDs, offset)}),
+#           padded to a multiple of 8 bytes
+# arrays:   per column the int64 keys, offsets and rids arrays of an lstore.arrayindex.ArrayIndex, back to back
+#           at the column's offset from the end of the metadata. loaded with np.fromfile, or memory mapped
+#           with config.INDEX_SNAPSHOT_MMAP
+#
+# record: | op | column | key | rid |, all int64, the key already dictionary encoded
+# CREATE and DROP records only use the column
+#
+# Index.save_index appends the changes made since the last save, so its cost follows the number of changes.
+# Once the log holds more records than config.INDEX_LOG_COMPACT_RATIO times the number of keys in the
+# index (and at least config.INDEX_LOG_MIN_RECORDS), it is compacted into a new snapshot.
+# Compaction bumps the generation and a log is only replayed onto the snapshot of its own generation,
+# so a crash between writing the snapshot and starting the new log never applies a change twice. replay
+# restarts such a stale log under the snapshot's generation.
+ADD = 0
+REMOVE = 1
+CREATE = 2
+DROP = 3
+
+LOG_MAGIC = b"LIDX"
+SNAPSHOT_MAGIC = b"LIXS"
+SNAPSHOT_HEADER_FORMAT = "<4sQQ"
+SNAPSHOT_HEADER_SIZE = struct.calcsize(SNAPSHOT_HEADER_FORMAT)
+LOG_HEADER_FORMAT = "<4sQ"
+LOG_HEADER_SIZE = struct.calcsize(LOG_HEADER_FORMAT)
+RECORD_DTYPE = np.dtype([("op", "<i8"), ("column", "<i8"), ("key", "<i8"), ("rid", "<i8")])
+
+class IndexLog:
+
+    def __init__(self, path):
+        self.snapshot_path = path
+        self.log_path = path + ".log"
+        self.generation = 0
+        # records in the log since the last compaction
+        self.records = 0
+
+    # returns the index saved in the snapshot, or None if there is no snapshot
+    # the in-memory column indices come back as ArrayIndex, the primary key's as a HashIndex with config.PRIMARY_HASH_INDEX
+    def read_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return None
+        with open(self.snapshot_path, "rb") as snapshot_file:
+            header = snapshot_file.read(SNAPSHOT_HEADER_SIZE)
+            if header[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                # a whole pickled Index from before the array snapshots
+                snapshot_file.seek(0)
+                snapshot = pickle.load(snapshot_file)
+                if isinstance(snapshot, tuple):
+                    self.generation, snapshot = snapshot
+                return snapshot
+            _, self.generation, metadata_size = struct.unpack(SNAPSHOT_HEADER_FORMAT, header)
+            index, directory = pickle.loads(snapshot_file.read(metadata_size))
+        self.load_columns(index, directory, metadata_size)
+        return index
+
+    # set index's column indices to the snapshot's arrays, directory and metadata_size as in the snapshot header
+    def load_columns(self, index, directory, metadata_size):
+        for column, (num_keys, num_rids, offset) in directory.items():
+            offset += SNAPSHOT_HEADER_SIZE + metadata_size
+            keys = self.read_array(offset, num_keys)
+            offsets = self.read_array(offset + num_keys * config.VALUE_SIZE, num_keys + 1)
+            rids = self.read_array(offset + (2 * num_keys + 1) * config.VALUE_SIZE, num_rids)
+            if column == config.PRIMARY_KEY_COLUMN and config.PRIMARY_HASH_INDEX:
+                # point lookups on the primary key stay single dict probes
+                index.indices[column] = HashIndex.from_arrays(keys, offsets, rids)
+            else:
+                index.indices[column] = ArrayIndex(keys, offsets, rids)
+
+    def read_array(self, offset, count):
+        if count == 0:
+            return np.empty(0, dtype=config.VALUE_DTYPE)
+        if config.INDEX_SNAPSHOT_MMAP:
+            return np.memmap(self.snapshot_path, dtype=config.VALUE_DTYPE, mode="r", offset=offset, shape=(count,))
+        return np.fromfile(self.snapshot_path, dtype=config.VALUE_DTYPE, count=count, offset=offset)
+
+    # apply the log's records to index, unless the log belongs to another snapshot
+    def replay(self, index):
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) < LOG_HEADER_SIZE:
+            return 0
+        with open(self.log_path, "rb") as log_file:
+            magic, generation = struct.unpack(LOG_HEADER_FORMAT, log_file.read(LOG_HEADER_SIZE))
+            if magic != LOG_MAGIC:
+                print(f"error: {self.log_path} is not an index log")
+                return 0
+        if generation != self.generation:
+            # left over from a crash between compact writing the snapshot and starting the new log: its
+            # changes are in the snapshot. it is restarted, or later appends would go under its stale header
+            self.start_log()
+            return 0
+        with open(self.log_path, "rb") as log_file:
+            log_file.seek(LOG_HEADER_SIZE)
+            records = np.fromfile(log_file, dtype=RECORD_DTYPE)
+        for op, column, key, rid in records.tolist():
+            index.apply(op, column, key, rid)
+        self.records = len(records)
+        return self.records
+
+    '''
+    Append records, a list of (op, column, key, rid)
+    '''
+    def append(self, records):
+        if not records:
+            return
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) < LOG_HEADER_SIZE:
+            self.start_log()
+        with open(self.log_path, "ab") as log_file:
+            log_file.write(np.array(records, dtype=RECORD_DTYPE).tobytes())
+        self.records += len(records)
+
+    def start_log(self):
+        with open(self.log_path, "wb") as log_file:
+            log_file.write(struct.pack(LOG_HEADER_FORMAT, LOG_MAGIC, self.generation))
+        self.records = 0
+
+    def needs_compaction(self, num_keys):
+        return self.records > max(config.INDEX_LOG_MIN_RECORDS, config.INDEX_LOG_COMPACT_RATIO * num_keys)
+
+    # write the whole index as the next generation's snapshot and start an empty log
+    # the in-memory column indices are swapped for the new snapshot's arrays, which drops the changes
+    # ArrayIndex kept next to the old ones
+    def compact(self, index):
+        # every in-memory column index as sorted arrays. B+tree indices keep their own files
+        arrays = {}
+        for column, column_index in index.indices.items():
+            if not isinstance(column_index, BTreeIndex):
+                snapshot = ArrayIndex.from_items(sorted(column_index.items(), key=itemgetter(0)))
+                arrays[column] = (snapshot.keys, snapshot.offsets, snapshot.rids)
+        metadata_index = copy.copy(index)
+        metadata_index.indices = defaultdict(SortedDict)
+
+        # offsets are from the end of the metadata, which is padded so the arrays are 8 byte aligned
+        directory = {}
+        offset = 0
+        for column, (keys, offsets, rids) in arrays.items():
+            directory[column] = (len(keys), len(rids), offset)
+            offset += (len(keys) + len(offsets) + len(rids)) * config.VALUE_SIZE
+        metadata = pickle.dumps((metadata_index, directory))
+        padding = bytes(-(SNAPSHOT_HEADER_SIZE + len(metadata)) % config.VALUE_SIZE)
+
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "wb") as snapshot_file:
+            snapshot_file.write(struct.pack(SNAPSHOT_HEADER_FORMAT, SNAPSHOT_MAGIC, self.generation + 1, len(metadata) + len(padding)))
+            snapshot_file.write(metadata + padding)
+            for keys, offsets, rids in arrays.values():
+                for array in (keys, offsets, rids):
+                    snapshot_file.write(np.asarray(array, dtype=config.VALUE_DTYPE).tobytes())
+        os.replace(temp_path, self.snapshot_path)
+        self.generation += 1
+        self.start_log()
+        # changes not appended yet are in the snapshot too
+        index.changes = []
+        self.load_columns(index, directory, len(metadata) + len(padding))
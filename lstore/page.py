@@ -1,17 +1,31 @@
 import os
+import numpy as np
 from lstore import config
 # PHYSICAL PAGE CLASS
 class Page:
 
-    def __init__(self, num_records=0):
+    def __init__(self, num_records=0, data=None, page_size=config.ARRAY_SIZE):
         self.num_records = num_records
-        self.data = bytearray(config.ARRAY_SIZE)
+        # data can be passed in when a page is read back from disk
+        self.data = bytearray(page_size) if data is None else data
+        # number of value slots in the page
+        self.capacity = int(len(self.data)/config.VALUE_SIZE)
+        # zone map: (min, max) of the written slots. None until it is first computed
+        self.zone = None
+        # slots written since the last writeback, see take_dirty
+        self.dirty_ranges = []
+        self.header_dirty = False
+
+    @property
+    def values(self):
+        # zero-copy int64 view over the page buffer. writes through the view land in self.data
+        return np.frombuffer(self.data, dtype=config.VALUE_DTYPE)
 
     def has_capacity(self):
-        if self.num_records < int(config.ARRAY_SIZE/config.VALUE_SIZE):
-            # print(f"{self.num_records}/{int(config.ARRAY_SIZE/config.VALUE_SIZE)}")
+        if self.num_records < self.capacity:
+            # print(f"{self.num_records}/{self.capacity}")
             return True
-        # print(f"page has no capacity: {self.num_records}/{int(config.ARRAY_SIZE/config.VALUE_SIZE)}")
+        # print(f"page has no capacity: {self.num_records}/{self.capacity}")
         return False
 
     def write(self, value, record_number):
@@ -19,36 +33,254 @@ class Page:
         assert self.has_capacity()
         if self.has_capacity():
             offset_number = record_number * config.VALUE_SIZE
-            self.data[offset_number:offset_number + config.VALUE_SIZE] = value.to_bytes(config.VALUE_SIZE, byteorder='little')
+            self.data[offset_number:offset_number + config.VALUE_SIZE] = value.to_bytes(config.VALUE_SIZE, byteorder='little', signed=True)
             self.num_records += 1
+            self.extend_zone_map(value, value)
+            self.mark_dirty(record_number, record_number + 1, header=True)
             # print(f"successfully wrote to page, new number is {self.num_records}")
             return True
         else:
-            print(f"failed to write: full, {self.num_records}/{int(config.ARRAY_SIZE/config.VALUE_SIZE)}")
+            print(f"failed to write: full, {self.num_records}/{self.capacity}")
+            return False
+
+
+    def write_many(self, values, record_number):
+        # Copies a block of values into consecutive slots starting at record_number
+        count = len(values)
+        if record_number + count > self.capacity:
+            print(f"failed to write: {count} values do not fit, {self.num_records}/{self.capacity}")
             return False
+        self.values[record_number:record_number + count] = values
+        self.num_records += count
+        self.mark_dirty(record_number, record_number + count, header=True)
+        if count:
+            self.extend_zone_map(int(np.min(values)), int(np.max(values)))
+        return True
 
+    def free_slots(self):
+        return self.capacity - self.num_records
 
     def read(self, record_number):
-        if record_number >= config.ARRAY_SIZE/config.VALUE_SIZE:
+        if record_number >= self.capacity:
             print("error: invalid index")
             return None
         offset = record_number * config.VALUE_SIZE
-        return int.from_bytes(self.data[offset:offset + config.VALUE_SIZE], byteorder='little')
+        return int.from_bytes(self.data[offset:offset + config.VALUE_SIZE], byteorder='little', signed=True)
+
+    def read_many(self, record_numbers):
+        # Reads several slots in one numpy gather instead of one decode per slot
+        return self.values[np.asarray(record_numbers, dtype=np.intp)]
+
+    def read_all(self):
+        # Reads every written slot of the page as an array
+        return self.values[:self.num_records]
     
     def write_column(self, record_number, value):
     # Updates a specific column value in the page.
         offset_number = record_number * config.VALUE_SIZE
-        self.data[offset_number:offset_number + config.VALUE_SIZE] = value.to_bytes(config.VALUE_SIZE, byteorder='little')
+        self.data[offset_number:offset_number + config.VALUE_SIZE] = value.to_bytes(config.VALUE_SIZE, byteorder='little', signed=True)
+        # the old value might have been the min or max, so the zone only widens until the next refresh
+        self.extend_zone_map(value, value)
+        self.mark_dirty(record_number, record_number + 1)
+
+    '''
+    slot-granular dirty tracking, so writeback only writes the slots that changed (see Segment.write_dirty)
+    '''
+    # slots [first, end) were written. header: num_records changed too
+    def mark_dirty(self, first, end, header=False):
+        self.header_dirty = self.header_dirty or header
+        # past config.MAX_DIRTY_RANGES ranges, keep one range spanning all of them
+        if len(self.dirty_ranges) >= config.MAX_DIRTY_RANGES:
+            self.dirty_ranges = [(min(first, *[low for low, _ in self.dirty_ranges]), max(end, *[high for _, high in self.dirty_ranges]))]
+        else:
+            self.dirty_ranges.append((first, end))
+
+    '''
+    Returns (header dirty, sorted disjoint [first, end) slot ranges) and starts tracking again
+    Returns None when the whole page should be written: nothing was tracked (the page was changed
+    some other way) or the ranges cover at least half the page
+    '''
+    def take_dirty(self):
+        ranges, header = sorted(self.dirty_ranges), self.header_dirty
+        self.dirty_ranges, self.header_dirty = [], False
+        if not ranges and not header:
+            return None
+        merged = []
+        for first, end in ranges:
+            if merged and first <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([first, end])
+        if 2 * sum(end - first for first, end in merged) >= self.capacity:
+            return None
+        return header, [(first, end) for first, end in merged]
+
+    # whether the page was written since the last take_dirty
+    def is_dirty(self):
+        return self.header_dirty or bool(self.dirty_ranges)
+
+    '''
+    zone map (per page min/max) used to skip pages during scans
+    '''
+    def zone_map(self):
+        # computed lazily, e.g. for pages read back from disk
+        if self.zone is None and self.num_records > 0:
+            self.refresh_zone_map()
+        return self.zone
+
+    def refresh_zone_map(self):
+        values = self.read_all()
+        self.zone = (int(values.min()), int(values.max())) if len(values) else None
+
+    def extend_zone_map(self, low, high):
+        # an unknown zone stays unknown and gets computed on the next zone_map() call
+        if self.zone is not None:
+            self.zone = (min(self.zone[0], low), max(self.zone[1], high))
+
+    # False only if no value in [low, high] can be on this page
+    def may_contain(self, low, high):
+        zone = self.zone_map()
+        return zone is not None and zone[0] <= high and low <= zone[1]
+
+    # record numbers of the slots holding value
+    def match(self, value):
+        return np.flatnonzero(self.read_all() == value)
+
+# COLUMN DICTIONARY CLASS
+# Maps the distinct values of a low-cardinality column to small integer codes.
+# One dictionary is shared by every page of the column, so codes can be compared across pages and by the Index.
+class ColumnDictionary:
+
+    def __init__(self, values=None):
+        self.values = list(values) if values else [] # code -> value
+        self.codes = {value: code for code, value in enumerate(self.values)} # value -> code
+        self.lookup = None # numpy copy of self.values, rebuilt after the dictionary grows
+
+    # returns the code of value, adding it to the dictionary if needed
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+            self.lookup = None
+        return code
+
+    # returns the code of value, or None if no page holds it
+    def code(self, value):
+        return self.codes.get(value)
+
+    def encode_many(self, values):
+        return np.fromiter((self.encode(int(value)) for value in values), dtype=np.int64, count=len(values))
+
+    def decode_many(self, codes):
+        if self.lookup is None:
+            self.lookup = np.array(self.values, dtype=np.int64)
+        return self.lookup[codes]
+
+# DICTIONARY ENCODED PHYSICAL PAGE CLASS
+# Stores one small code per slot instead of an 8 byte value. Equality matches compare codes without decoding.
+# data/values decode to the normal int64 layout, so segments and compression see a regular page.
+class DictionaryPage(Page):
+
+    def __init__(self, dictionary, num_records=0, codes=None, page_size=config.ARRAY_SIZE):
+        self.num_records = num_records
+        self.dictionary = dictionary
+        self.capacity = int(page_size/config.VALUE_SIZE)
+        self.codes = np.zeros(self.capacity, dtype=np.uint16) if codes is None else codes
+        self.zone = None
+        self.dirty_ranges = []
+        self.header_dirty = False
+
+    # re-encode a page read back from disk
+    @classmethod
+    def from_page(cls, page, dictionary):
+        new_page = cls(dictionary, page.num_records, page_size=page.capacity * config.VALUE_SIZE)
+        new_page.store_codes(dictionary.encode_many(page.read_all()), 0)
+        new_page.dirty_ranges = []
+        return new_page
+
+    # the page in the int64 layout of a Page, decoded from the codes. both are read-only copies, so a write
+    # through them raises instead of being lost: writes go through write, write_many and write_column
+    @property
+    def data(self):
+        return self.values.astype(config.VALUE_DTYPE).tobytes()
+
+    @property
+    def values(self):
+        values = np.zeros(len(self.codes), dtype=np.int64)
+        values[:self.num_records] = self.read_all()
+        values.flags.writeable = False
+        return values
+
+    def store_codes(self, codes, record_number):
+        # widen the code array once the dictionary outgrows it
+        if len(codes) and codes.max() > np.iinfo(self.codes.dtype).max:
+            self.codes = self.codes.astype(np.uint32)
+        self.codes[record_number:record_number + len(codes)] = codes
+        self.mark_dirty(record_number, record_number + len(codes))
+
+    def write(self, value, record_number):
+        assert self.has_capacity()
+        self.store_codes(np.array([self.dictionary.encode(value)]), record_number)
+        self.num_records += 1
+        self.header_dirty = True
+        self.extend_zone_map(value, value)
+        return True
+
+    def write_many(self, values, record_number):
+        count = len(values)
+        if record_number + count > len(self.codes):
+            print(f"failed to write: {count} values do not fit, {self.num_records}/{len(self.codes)}")
+            return False
+        self.store_codes(self.dictionary.encode_many(values), record_number)
+        self.num_records += count
+        self.header_dirty = True
+        if count:
+            self.extend_zone_map(int(np.min(values)), int(np.max(values)))
+        return True
+
+    def write_column(self, record_number, value):
+        self.store_codes(np.array([self.dictionary.encode(value)]), record_number)
+        self.extend_zone_map(value, value)
+
+    def read(self, record_number):
+        if record_number >= len(self.codes):
+            print("error: invalid index")
+            return None
+        return self.dictionary.values[self.codes[record_number]]
+
+    def read_many(self, record_numbers):
+        return self.dictionary.decode_many(self.codes[np.asarray(record_numbers, dtype=np.intp)])
+
+    def read_all(self):
+        return self.dictionary.decode_many(self.codes[:self.num_records])
+
+    def match(self, value):
+        code = self.dictionary.code(value)
+        if code is None:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self.codes[:self.num_records] == code)
 
 # BASE AND TAIL PAGE CLASS
 class PageGroup():
-    def __init__(self, num_columns, type=config.TAIL_PAGE, latest_record_number=0):
+    # dictionaries maps physical column number -> ColumnDictionary for dictionary encoded columns
+    def __init__(self, num_columns, type=config.TAIL_PAGE, latest_record_number=0, dictionaries=None, page_size=config.ARRAY_SIZE):
         self.pages = []
         self.type = type
         self.latest_record_number = latest_record_number
+        self.tps = 0
         # Initialize pages for each column upfront
         for _ in range(num_columns+5):
-            self.pages.append(Page())
+            self.pages.append(Page(page_size=page_size))
+        if dictionaries:
+            self.encode_dictionaries(dictionaries)
+
+    # swap the pages of dictionary encoded columns for DictionaryPages
+    def encode_dictionaries(self, dictionaries):
+        for column, dictionary in dictionaries.items():
+            if not isinstance(self.pages[column], DictionaryPage):
+                self.pages[column] = DictionaryPage.from_page(self.pages[column], dictionary)
 
     def has_capacity(self):
         # If there are no pages, we assume capacity for a new page
@@ -70,18 +302,37 @@ class PageGroup():
             page.write(value, record_number)
         return True
     
+    # like write, but only the pages listed in written_columns are touched (sparse tail records)
+    def write_columns(self, record, written_columns, record_number):
+        if not self.has_capacity():
+            print("error: No space in page group")
+            return False
+        for column in written_columns:
+            self.pages[column].write(record[column], record_number)
+        return True
+
+    def write_many(self, columns, record_number):
+        # columns holds one sequence of values per physical page, all of the same length
+        if len(columns[0]) > self.pages[0].free_slots():
+            print("error: No space in page group")
+            return False
+        for page, values in zip(self.pages, columns):
+            page.write_many(values, record_number)
+        return True
+    
     def get_tps(self):
-    # Returns the Tail-Page Sequence Number (TPS). 
-        return self.pages[config.TIMESTAMP_COLUMN].read(0)
+    # Returns the Tail-Page Sequence Number (TPS), the newest tail RID merged into the group.
+        return self.tps
 
     def set_tps(self, new_tps):
         # Updates the Tail-Page Sequence Number (TPS).
-        self.pages[config.TIMESTAMP_COLUMN].write(new_tps, 0)
+        # kept next to the pages: writing it into the timestamp page appended a record to it
+        self.tps = new_tps
 
 
 # PAGE RANGE CLASS
 class pageRange():
-    def __init__(self, num_columns, latest_bp=0, latest_tp=None, new=True):
+    def __init__(self, num_columns, latest_bp=0, latest_tp=None, new=True, dictionaries=None, page_size=config.ARRAY_SIZE, range_size=config.PAGE_RANGE_SIZE):
         # contains an array of PageGroup (base pages)
         self.base_pages = []
         # contains an array of PageGroup (tail pages)
@@ -90,16 +341,18 @@ class pageRange():
         self.latest_base_page = latest_bp
         self.latest_tail_page = latest_tp
         self.num_columns = num_columns # this is needed as metadata in order to restore the range on open
+        self.dictionaries = dictionaries
+        self.page_size = page_size
 
         if new: # you dont want to create new base pages on open.
-            for i in range(config.PAGE_RANGE_SIZE):
-                self.base_pages.append(PageGroup(num_columns, type=config.BASE_PAGE))
+            for i in range(range_size):
+                self.base_pages.append(PageGroup(num_columns, type=config.BASE_PAGE, dictionaries=dictionaries, page_size=page_size))
 
 
     def has_capacity(self):
         if self.base_pages[self.latest_base_page].has_capacity():
             return True
-        elif self.latest_base_page==15:
+        elif self.latest_base_page==len(self.base_pages)-1:
             return False
         else:
             self.latest_base_page+=1
@@ -107,7 +360,7 @@ class pageRange():
     
     def allocate_new_tail_page(self):
     # Allocates a new tail page when needed
-        new_tail_page = PageGroup(num_columns=self.num_columns, type=config.TAIL_PAGE)
+        new_tail_page = PageGroup(num_columns=self.num_columns, type=config.TAIL_PAGE, dictionaries=self.dictionaries, page_size=self.page_size)
         self.tail_pages.append(new_tail_page)
         self.latest_tail_page = len(self.tail_pages) - 1  # Update latest tail page index
 
@@ -0,0 +1,87 @@
+from array import array
+from bisect import bisect_left, insort
+import numpy as np
+
+# POSTING LIST CLASS
+# The RIDs of one key of a non-unique index, as a sorted array('q'): 8 bytes per RID instead of a
+# pointer to a Python int, found and removed by binary search instead of list.remove's linear scan.
+# RIDs are handed out in increasing order, so appending a new record's RID stays O(1).
+# intersect and union work on any sorted int64 buffers, so selects with several predicates combine
+# their posting lists in numpy instead of Python sets.
+class PostingList(array):
+
+    def __new__(cls, rids=()):
+        return super().__new__(cls, "q", sorted(rids))
+
+    # keeps the RIDs sorted, so it can stand in for list.append
+    def append(self, rid):
+        if not self or rid > self[-1]:
+            super().append(rid)
+        else:
+            insort(self, rid)
+
+    # raises ValueError if rid is missing, like list.remove
+    def remove(self, rid):
+        i = bisect_left(self, rid)
+        if i == len(self) or self[i] != rid:
+            raise ValueError(f"{rid} not in posting list")
+        del self[i]
+
+    def __contains__(self, rid):
+        i = bisect_left(self, rid)
+        return i < len(self) and self[i] == rid
+
+    def intersection(self, *others):
+        return intersect([self, *others])
+
+    def union(self, *others):
+        return union([self, *others])
+
+    # pickled as raw bytes, array's own pickling would call __new__ with a typecode
+    def __reduce_ex__(self, protocol):
+        return (from_bytes, (self.tobytes(),))
+
+    # array's copies would come back as plain arrays
+    def __copy__(self):
+        return from_bytes(self.tobytes())
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+def from_bytes(data):
+    rids = PostingList()
+    rids.frombytes(data)
+    return rids
+
+# rids as a sorted int64 numpy array. a posting list is already sorted and is viewed without a copy
+def sorted_array(rids):
+    if isinstance(rids, PostingList):
+        return np.frombuffer(rids, dtype=np.int64)
+    return np.sort(np.asarray(rids, dtype=np.int64))
+
+def from_array(rids):
+    return from_bytes(np.ascontiguousarray(rids, dtype=np.int64).tobytes())
+
+'''
+RIDs in every one of rid_lists (posting lists, or any sequences of RIDs)
+the shortest list is binary searched in each of the others, so a rare key against a frequent one
+costs the rare key's length times a log
+'''
+def intersect(rid_lists):
+    arrays = sorted((sorted_array(rids) for rids in rid_lists), key=len)
+    if not arrays:
+        return PostingList()
+    result = np.unique(arrays[0])
+    for other in arrays[1:]:
+        if len(result) == 0 or len(other) == 0:
+            return PostingList()
+        found = np.minimum(np.searchsorted(other, result), len(other) - 1)
+        result = result[other[found] == result]
+    return from_array(result)
+
+# RIDs in any of rid_lists
+def union(rid_lists):
+    arrays = [sorted_array(rids) for rids in rid_lists]
+    if not arrays:
+        return PostingList()
+    return from_array(np.unique(np.concatenate(arrays)))
@@ -2,8 +2,22 @@ from lstore.table import Table, Record
 from lstore.index import Index
 from lstore.page import Page
 from time import time
+import numpy as np
 from lstore.page import PageGroup, pageRange
 from lstore import config
+from lstore.bufferpool import BufferRing, PoolFullError
+from functools import wraps
+
+# a query that can't pin its pages because every frame is pinned fails like any other query: it returns False
+def fails_on_full_pool(query_method):
+    @wraps(query_method)
+    def run_query(*args, **kwargs):
+        try:
+            return query_method(*args, **kwargs)
+        except PoolFullError as error:
+            print(f"error: {error}")
+            return False
+    return run_query
 
 class Query:
     """
@@ -23,6 +37,7 @@ class Query:
     # Returns True upon succesful deletion
     # Return False if record doesn't exist or is locked due to 2PL
     """
+    @fails_on_full_pool
     def delete(self, primary_key):
         # Retrieve all the RIDs that match the primary key from the index
         rid_list = self.table.index.indices[config.PRIMARY_KEY_COLUMN][primary_key]
@@ -32,17 +47,15 @@ class Query:
 
         # Locate the record in the page directory using the first RID (the most up to date version)
         page_range_num, base_page_num, record_num = self.table.page_directory[rid]
-        # TODO: Loop through the columns of the base page and check if each physical page is in the bufferpool
-        # TODO: If the page is not in the bufferpool, load it into the bufferpool
-        # TODO: do we write to disk here or is this part of the bufferpool?
         base_page = self.table.page_ranges[page_range_num].base_pages[base_page_num]
 
         # Set the indirection, RID, and Timestam column of the base record to 0 to mark it as deleted
+        # the pages are pinned while they are written, which marks them dirty in the bufferpool
         zeroed = 0
-        offset_number = record_num * config.VALUE_SIZE
-        base_page.pages[config.RID_COLUMN].data[offset_number:offset_number + config.VALUE_SIZE] = zeroed.to_bytes(config.VALUE_SIZE, byteorder='little')
-        base_page.pages[config.TIMESTAMP_COLUMN].data[offset_number:offset_number + config.VALUE_SIZE] = zeroed.to_bytes(config.VALUE_SIZE, byteorder='little')
-        base_page.pages[config.INDIRECTION_COLUMN].data[offset_number:offset_number + config.VALUE_SIZE] = zeroed.to_bytes(config.VALUE_SIZE, byteorder='little')
+        page_ids = self.table.group_page_ids(page_range_num, base_page_num, config.BASE_PAGE, (config.RID_COLUMN, config.TIMESTAMP_COLUMN, config.INDIRECTION_COLUMN))
+        with self.table.pins().pin_many(page_ids, write=True) as pages:
+            for page in pages:
+                page.write_column(record_num, zeroed)
         
         '''
         # Update the index to remove all traces of this record    
@@ -62,6 +75,7 @@ class Query:
     # Return True upon succesful insertion
     # Returns False if insert fails for whatever reason
     """
+    @fails_on_full_pool
     def insert(self, *columns):
         # Validate column count and prevent insertion if column count does not match
         if len(columns) != self.table.num_columns:
@@ -88,41 +102,15 @@ class Query:
         # Convert into a full record format
         record = [indirection, rid, timestamp, schema_encoding, base_id] + user_columns
         # Find available location to write to
-        page_range_number, base_page_number, record_number = None, None, None
-        
+        page_range_number, base_page_number = self.table.open_base_page()
+        page_range = self.table.page_ranges[page_range_number]
+        record_number = page_range.base_pages[base_page_number].pages[0].num_records  # Use next available slot
 
-        # TODO: get the 0th column of the latest pagerange / pagegroup and put it into bufferpool
-        latest_page_range = self.table.latest_page_range
-
-        # Iterate over page ranges to find a base page with capacity
-        for pr_num, page_range in enumerate(self.table.page_ranges):
-            for bp_num, base_page in enumerate(page_range.base_pages):
-                if base_page.has_capacity():
-                    page_range_number, base_page_number = pr_num, bp_num
-                    record_number = base_page.pages[0].num_records  # Use next available slot
-                    break
-            if page_range_number is not None:
-                break
-
-        # TODO: find the latest page range
-            # TODO: find the latest base page
-
-        # If no available space is found, create a new page range
-        # Since base pages are created upon page range initialization, we only need to create a new page range
-        if page_range_number is None:
-            page_range_number = len(self.table.page_ranges)
-            new_page_range = pageRange(num_columns=self.table.num_columns)  # Create a new page range
-            # self.table.page_ranges.append(new_page_range)
-            self.table.save_page_range(new_page_range)
-            base_page_number = 0 # First base page in the new page range
-            record_number = 0  # First slot in the new page
-            page_range = new_page_range 
-            
-        else:
-            page_range = self.table.page_ranges[page_range_number]
         # Write the record
-        if not page_range.base_pages[base_page_number].write(*record, record_number=record_number):
-            return False  
+        page_ids = self.table.group_page_ids(page_range_number, base_page_number, config.BASE_PAGE)
+        with self.table.pins().pin_many(page_ids, write=True):
+            if not page_range.base_pages[base_page_number].write(*record, record_number=record_number):
+                return False  
 
         # Update page directory for hash table
         self.table.page_directory[rid] = (page_range_number, base_page_number, record_number)
@@ -133,8 +121,76 @@ class Query:
 
         return True
 
-   
-    
+
+    """
+    # Insert many records at once
+    # :param rows: list of records, each with the same columns that insert takes
+    # Fills base pages a whole block at a time and bulk loads the primary key index
+    # Return True upon succesful insertion
+    # Returns False (and inserts nothing) if any row is invalid or a primary key already exists
+    """
+    @fails_on_full_pool
+    def insert_many(self, rows):
+        rows = list(rows)
+        if not rows:
+            return True
+
+        # Validate every row before writing anything
+        primary_keys = []
+        for columns in rows:
+            if len(columns) != self.table.num_columns:
+                return False
+            primary_key = columns[self.table.key]
+            if primary_key==None or primary_key in self.table.index.indices[config.PRIMARY_KEY_COLUMN]:
+                return False
+            primary_keys.append(primary_key)
+        if len(set(primary_keys)) != len(primary_keys):
+            return False
+
+        # Reserve a block of RIDs for the whole batch
+        first_rid = self.rid_counter
+        self.rid_counter += len(rows)
+        rids = np.arange(first_rid, self.rid_counter, dtype=np.int64)
+        timestamp = int(time())
+
+        # Build the batch column-wise: metadata columns followed by the user columns
+        user_columns = np.array(rows, dtype=np.int64).T
+        meta_columns = np.zeros((5, len(rows)), dtype=np.int64)
+        meta_columns[config.RID_COLUMN] = rids
+        meta_columns[config.TIMESTAMP_COLUMN] = timestamp
+        meta_columns[config.BASE_ID_COLUMN] = rids
+        record_columns = np.concatenate((meta_columns, user_columns))
+
+        # Fill base pages one block at a time
+        written = 0
+        while written < len(rows):
+            page_range_number, base_page_number = self.table.open_base_page()
+            base_page = self.table.page_ranges[page_range_number].base_pages[base_page_number]
+            record_number = base_page.pages[0].num_records
+            count = min(base_page.pages[0].free_slots(), len(rows) - written)
+            page_ids = self.table.group_page_ids(page_range_number, base_page_number, config.BASE_PAGE)
+            with self.table.pins().pin_many(page_ids, write=True):
+                if not base_page.write_many(record_columns[:, written:written + count], record_number=record_number):
+                    return False
+
+            # Update page directory for hash table
+            self.table.page_directory.update(
+                (first_rid + written + i, (page_range_number, base_page_number, record_number + i)) for i in range(count)
+            )
+            written += count
+
+        # Bulk load the primary key index, then any secondary indices
+        rid_list = rids.tolist()
+        self.table.index.bulk_load(primary_keys, rid_list)
+        for key_col in list(self.table.index.indices.keys()):
+            # only user columns other than the primary key hold secondary indices
+            if key_col == config.PRIMARY_KEY_COLUMN or not 5 <= key_col < 5 + self.table.num_columns:
+                continue
+            for rid, columns in zip(rid_list, rows):
+                self.table.index.addRecord(columns[key_col - 5], rid, key_col)
+
+        return True
+
     """
     # Read matching record with specified search key
     # :param search_key: the value you want to search based on
@@ -144,6 +200,7 @@ class Query:
     # Returns False if record locked by TPL
     # Assume that select will never be called on a key that doesn't exist
     """
+    @fails_on_full_pool
     def select(self, search_key, search_key_index, projected_columns_index):
         # just call self_version with 0 to get the current version
         return self.select_version(search_key, search_key_index, projected_columns_index, 0)
@@ -159,7 +216,15 @@ class Query:
     # Returns False if record locked by TPL
     # Assume that select will never be called on a key that doesn't exist
     """
+    @fails_on_full_pool
     def select_version(self, search_key, search_key_index, projected_columns_index, relative_version):
+        return self.__select_version(search_key, search_key_index, projected_columns_index, relative_version, self.table.pins())
+
+    """
+    # internal Method
+    # select_version, pinning pages through pins: the table's pins(), or the BufferRing of a scan
+    """
+    def __select_version(self, search_key, search_key_index, projected_columns_index, relative_version, pins):
         records = []
 
         # If the search hey is the primary key, we can use the index to find the record
@@ -176,51 +241,59 @@ class Query:
             # Locate the record in the page directory using RID
             page_range_num, base_page_num, record_num = self.table.page_directory[rid]
             base_page = self.table.page_ranges[page_range_num].base_pages[base_page_num]
+            # keep the base pages this select reads pinned while its versions are read:
+            # the indirection column and the projected columns
+            columns = [config.INDIRECTION_COLUMN] + [i + 5 for i in range(self.table.num_columns) if projected_columns_index[i]]
+            with pins.pin_many(self.table.group_page_ids(page_range_num, base_page_num, config.BASE_PAGE, columns)):
+                # Follow indirection pointer to get the latest version
+                current_rid = base_page.pages[config.INDIRECTION_COLUMN].read(record_num) 
+                versions = [(base_page, record_num)]
+
+                first_traverse = True
+                # replace with a for loop that runs relative_version times
+                while current_rid != 0 and current_rid in self.table.page_directory:
+                    prev_rid = current_rid # hold the last RID, 
 
-            # Follow indirection pointer to get the latest version
-            current_rid = base_page.pages[config.INDIRECTION_COLUMN].read(record_num) 
-            versions = [(base_page, record_num)]
+                    tail_page_range, tail_base_page, tail_record_num = self.table.page_directory[current_rid]
+                    tail_page = self.table.page_ranges[tail_page_range].tail_pages[tail_base_page]
+                    # if tail_page!=base_page and tail_record_num!=record_num:
+                
+                    if first_traverse:
+                        versions.insert(0, (tail_page, tail_record_num)) # update version
+                        first_traverse = False
+                    else: 
+                        versions.insert(2, (tail_page, tail_record_num)) # update version
 
-            first_traverse = True
-            # replace with a for loop that runs relative_version times
-            while current_rid != 0 and current_rid in self.table.page_directory:
-                prev_rid = current_rid # hold the last RID, 
 
-                tail_page_range, tail_base_page, tail_record_num = self.table.page_directory[current_rid]
-                tail_page = self.table.page_ranges[tail_page_range].tail_pages[tail_base_page]
-                # if tail_page!=base_page and tail_record_num!=record_num:
+                    current_rid = tail_page.pages[config.INDIRECTION_COLUMN].read(tail_record_num)  # Move to the next older version
                 
-                if first_traverse:
-                    versions.insert(0, (tail_page, tail_record_num)) # update version
-                    first_traverse = False
-                else: 
-                    versions.insert(2, (tail_page, tail_record_num)) # update version
+                # If the relative version is out of bounds, return the latest version
+                # This was necassary to pass exam_tester_m1.py
+                if len(versions) == abs(relative_version):
+                    relative_version += 1
 
+                version_page, version_record_num = versions[relative_version]
 
-                current_rid = tail_page.pages[config.INDIRECTION_COLUMN].read(tail_record_num)  # Move to the next older version
-                
-            # If the relative version is out of bounds, return the latest version
-            # This was necassary to pass exam_tester_m1.py
-            if len(versions) == abs(relative_version):
-                relative_version += 1
-
-            version_page, version_record_num = versions[relative_version]
-            base_id = version_page.pages[config.BASE_ID_COLUMN].read(version_record_num)
-
-            # Read the final/latest version of the record
-            stored_values = [version_page.pages[i + 5].read(version_record_num) for i in range(self.table.num_columns)]
-            # Apply column projection
-            stored_primary_key = base_page.pages[config.PRIMARY_KEY_COLUMN].read(record_num)
-            projected_values =  [
-                    stored_values[i] if projected_columns_index[i] else None for i in range(self.table.num_columns)
-                ]            
-            records.append(Record(version_record_num, search_key, projected_values))
-            # records.append(Record(search_key, search_key, projected_values))
+                # Read the final/latest version of the record
+                stored_values = self.__read_version(version_page, version_record_num, base_page, record_num, projected_columns_index)
+                # Apply column projection
+                projected_values =  [
+                        stored_values[i] if projected_columns_index[i] else None for i in range(self.table.num_columns)
+                    ]            
+                records.append(Record(version_record_num, search_key, projected_values))
+                # records.append(Record(search_key, search_key, projected_values))
 
         else:
             # TODO: We will be using this a lot of this milestone. Does it work? Should we update it?
             # Use the index to find all matching RIDs instead of scanning everything
-            rid_list = self.table.index.locate(search_key_index, search_key)
+            if search_key_index + 5 in self.table.index.indices:
+                rid_list = self.table.index.locate(search_key, search_key_index + 5)
+            elif search_key_index + 5 in self.table.dictionaries and self.table.dictionaries[search_key_index + 5].code(search_key) is None:
+                # the value was never written to this dictionary encoded column
+                rid_list = []
+            else:
+                # no index on this column, scan the base pages that the zone maps can't rule out
+                rid_list = self.__scan(search_key, search_key_index)
 
             if not rid_list:
                 return False  # No records found
@@ -231,34 +304,70 @@ class Query:
 
                 page_range_num, base_page_num, record_num = self.table.page_directory[rid]
                 base_page = self.table.page_ranges[page_range_num].base_pages[base_page_num]
-
-                # Follow indirection to get the latest version
-                current_rid = base_page.pages[config.INDIRECTION_COLUMN].read(record_num)
-                latest_version = (base_page, record_num)
-
-                while current_rid != 0 and current_rid in self.table.page_directory:
-                    tail_page_range, tail_base_page, tail_record_num = self.table.page_directory[current_rid]
-                    tail_page = self.table.page_ranges[tail_page_range].tail_pages[tail_base_page]
-                    latest_version = (tail_page, tail_record_num)
-                    current_rid = tail_page.pages[config.INDIRECTION_COLUMN].read(tail_record_num)
-
-                # Read the final/latest version of the record
-                version_page, version_record_num = latest_version
-                base_id = version_page.pages[config.BASE_ID_COLUMN].read(version_record_num)  
-                stored_values = [version_page.pages[i + 5].read(version_record_num) for i in range(self.table.num_columns)]
-                stored_primary_key = base_page.pages[config.PRIMARY_KEY_COLUMN].read(record_num)
-                projected_values = [stored_primary_key] + [
-                    stored_values[i] if projected_columns_index[i + 1] else None for i in range(self.table.num_columns - 1)
-                ]
-                records.append(Record(stored_primary_key, search_key, projected_values))
+                # the indirection column and every user column are read
+                columns = [config.INDIRECTION_COLUMN] + list(range(5, 5 + self.table.num_columns))
+                with pins.pin_many(self.table.group_page_ids(page_range_num, base_page_num, config.BASE_PAGE, columns)):
+                    # Follow indirection to get the latest version
+                    current_rid = base_page.pages[config.INDIRECTION_COLUMN].read(record_num)
+                    latest_version = (base_page, record_num)
+
+                    while current_rid != 0 and current_rid in self.table.page_directory:
+                        tail_page_range, tail_base_page, tail_record_num = self.table.page_directory[current_rid]
+                        tail_page = self.table.page_ranges[tail_page_range].tail_pages[tail_base_page]
+                        latest_version = (tail_page, tail_record_num)
+                        current_rid = tail_page.pages[config.INDIRECTION_COLUMN].read(tail_record_num)
+
+                    # Read the final/latest version of the record
+                    version_page, version_record_num = latest_version
+                    stored_values = self.__read_version(version_page, version_record_num, base_page, record_num, [1] * self.table.num_columns)
+                    stored_primary_key = base_page.pages[config.PRIMARY_KEY_COLUMN].read(record_num)
+                    projected_values = [stored_primary_key] + [
+                        stored_values[i] if projected_columns_index[i + 1] else None for i in range(self.table.num_columns - 1)
+                    ]
+                    records.append(Record(stored_primary_key, search_key, projected_values))
         return records if records else False
 
+    """
+    # internal Method
+    # Returns the user column values of one version of a record (None for columns that aren't projected)
+    # Cumulative tail records hold every column. Sparse tail records only hold the columns flagged in
+    # their schema encoding, so the rest are found by walking the chain to older versions and finally the base record
+    """
+    def __read_version(self, version_page, version_record_num, base_page, record_num, projected_columns_index):
+        num_columns = self.table.num_columns
+        if not self.table.sparse_tails:
+            return [version_page.pages[i + 5].read(version_record_num) if projected_columns_index[i] else None for i in range(num_columns)]
+
+        values = [None] * num_columns
+        missing = [i for i in range(num_columns) if projected_columns_index[i]]
+        page, slot = version_page, version_record_num
+        while missing and page is not base_page:
+            schema_encoding = page.pages[config.SCHEMA_ENCODING_COLUMN].read(slot)
+            for i in missing:
+                if (schema_encoding >> (num_columns - 1 - i)) & 1:
+                    values[i] = page.pages[i + 5].read(slot)
+            missing = [i for i in missing if not (schema_encoding >> (num_columns - 1 - i)) & 1]
+
+            # move to the next older version
+            older_rid = page.pages[config.INDIRECTION_COLUMN].read(slot)
+            if older_rid == 0 or older_rid not in self.table.page_directory:
+                page, slot = base_page, record_num
+            else:
+                tail_page_range, tail_page_num, slot = self.table.page_directory[older_rid]
+                page = self.table.page_ranges[tail_page_range].tail_pages[tail_page_num]
+
+        # columns that were never updated come from the base record
+        for i in missing:
+            values[i] = base_page.pages[i + 5].read(record_num)
+        return values
+
     
     """
     # Update a record with specified key and columns
     # Returns True if update is succesful
     # Returns False if no records exist with given key or if the target record cannot be accessed due to 2PL locking
     """
+    @fails_on_full_pool
     def update(self, primary_key, *columns):
         # Check the expected number of columns
         expected_columns = self.table.num_columns  # Number of user-defined columns (excluding metadata)
@@ -273,7 +382,7 @@ class Query:
 
         record = self.select(primary_key, 0, [1] * self.table.num_columns)
 
-        if record is None: # no match -> update fails
+        if not record: # no match, or its pages couldn't be pinned -> update fails
             return False  
 
         
@@ -319,26 +428,34 @@ class Query:
         page_range = self.table.page_ranges[page_range_num]
 
         if not page_range.tail_pages:
-            new_tail_page = PageGroup(num_columns=self.table.num_columns)
+            new_tail_page = self.table.new_tail_page()
             self.table.save_tail_page(new_tail_page, page_range_num)
             # page_range.tail_pages.append(PageGroup(num_columns=self.table.num_columns))
 
         tailpage = page_range.tail_pages[-1]
-        page = tailpage.pages[-1]
+        # the indirection column is written for every tail record, sparse or not
+        page = tailpage.pages[config.INDIRECTION_COLUMN]
         # for page in tailpage.pages:
         if page.has_capacity()==False:
-            new_tail_page = PageGroup(num_columns=self.table.num_columns)
+            new_tail_page = self.table.new_tail_page()
             self.table.save_tail_page(new_tail_page, page_range_num)
             # page_range.tail_pages.append(PageGroup(num_columns=self.table.num_columns))
 
         # run this line again to ensure that you have the most up to date range, in case a new page range was created
         page_range = self.table.page_ranges[page_range_num]
         tail_page_group = page_range.tail_pages[-1]
-        tail_record_num = tail_page_group.pages[-1].num_records
+        tail_record_num = tail_page_group.pages[config.INDIRECTION_COLUMN].num_records
         # Write the new version
-        tail_page_group.write(*new_record, record_number=tail_record_num)
-
-        tail_page_group.pages[config.BASE_ID_COLUMN].write(base_id, tail_record_num)
+        page_ids = self.table.group_page_ids(page_range_num, len(page_range.tail_pages) - 1, config.TAIL_PAGE)
+        with self.table.pins().pin_many(page_ids, write=True):
+            if self.table.sparse_tails:
+                # only the metadata and the updated columns are materialized
+                written_columns = list(range(5)) + [i + 5 for i in range(self.table.num_columns) if columns[i] is not None]
+                tail_page_group.write_columns(new_record, written_columns, record_number=tail_record_num)
+            else:
+                tail_page_group.write(*new_record, record_number=tail_record_num)
+
+            tail_page_group.pages[config.BASE_ID_COLUMN].write(base_id, tail_record_num)
         # Update page directory for the new version
         self.table.page_directory[new_rid] = (page_range_num, len(page_range.tail_pages) - 1, tail_record_num)
         if rid not in self.table.page_directory:
@@ -350,13 +467,13 @@ class Query:
             self.table.page_directory[rid] = self.table.page_directory.get(rid, (None, None, None))  
             self.table.base_id[new_rid] = rid
         # Update the indirection column of the base record to point to the new version
-        offset_number = record_num * config.VALUE_SIZE
-        base_page.pages[config.INDIRECTION_COLUMN].data[offset_number:offset_number + config.VALUE_SIZE] = new_rid.to_bytes(config.VALUE_SIZE, byteorder='little')
+        with self.table.pins().pin(self.table.page_id(page_range_num, base_page_num, config.BASE_PAGE, config.INDIRECTION_COLUMN), write=True) as indirection_page:
+            indirection_page.write_column(record_num, new_rid)
 
 
         # Merge counter:
         self.table.merge_counter += 1  # Track number of updates
-        if self.table.merge_counter >= config.UPDATES_BEFORE_MERGE:  # Trigger merge after default 512 updates
+        if self.table.merge_counter >= self.table.merge_threshold:  # Trigger merge after default 512 updates
             self.table.start_merge_thread()
             self.table.merge_counter = 0  # Reset counter
 
@@ -375,6 +492,7 @@ class Query:
     # Returns the summation of the given range upon success
     # Returns False if no record exists in the given range
     """
+    @fails_on_full_pool
     def sum(self, start_range, end_range, aggregate_column_index):
         return self.sum_version(start_range, end_range, aggregate_column_index, 0)
     
@@ -387,6 +505,7 @@ class Query:
     # Returns the summation of the given range upon success
     # Returns False if no record exists in the given range
     """
+    @fails_on_full_pool
     def sum_version(self, start_range, end_range, aggregate_column_index, relative_version):
         # ensure that start range is lower than end range
         if(start_range > end_range):
@@ -395,25 +514,83 @@ class Query:
         sum = 0
         range_not_empty = False
         
-        for key in range(start_range, end_range+1):
-            # same line from the increment function
-            row = self.select_version(key, self.table.key, [1] * self.table.num_columns, relative_version=relative_version)
+        # the scan runs through a private ring of frames so it doesn't flush the bufferpool
+        with self.table.pins().ring() as ring:
+            for key in self.__scan_keys(start_range, end_range, ring):
+                # same line from the increment function
+                row = self.__select_version(key, self.table.key, [1] * self.table.num_columns, relative_version, ring)
             
-            # validate row
-            if row is False:
-                continue
-            # at least one valid row
-            range_not_empty = True
+                # validate row
+                if row is False:
+                    continue
+                # at least one valid row
+                range_not_empty = True
 
-            val = row[0].columns[aggregate_column_index]
-            # add the cell to the sum
-            if val != None:
-                sum += val
+                val = row[0].columns[aggregate_column_index]
+                # add the cell to the sum
+                if val != None:
+                    sum += val
 
         if range_not_empty==False:
             return False
         else: return sum
     
+    """
+    # internal Method
+    # Returns the sorted primary keys in [start_range, end_range] of every record that wasn't deleted
+    # Base pages whose primary key zone map doesn't overlap the range are skipped
+    """
+    def __scan_keys(self, start_range, end_range, pins):
+        keys = []
+        columns = (config.PRIMARY_KEY_COLUMN + self.table.key, config.RID_COLUMN)
+        for page_range_num, page_range in enumerate(self.table.page_ranges):
+            for base_page_num, base_page in enumerate(page_range.base_pages):
+                if not base_page.pages[columns[0]].may_contain(start_range, end_range):
+                    continue
+                # base pages are read in order, so the read-ahead can request the next ones while this one is scanned
+                if self.table.bufferpool is not None:
+                    self.table.bufferpool.read_ahead.access(self.table, page_range_num, base_page_num, columns, pins if isinstance(pins, BufferRing) else None)
+                with pins.pin_many(self.table.group_page_ids(page_range_num, base_page_num, config.BASE_PAGE, columns)) as (key_page, rid_page):
+                    key_values = key_page.read_all()
+                    # deleted records have their RID zeroed
+                    live = rid_page.read_all() != 0
+                    keys.extend(key_values[(key_values >= start_range) & (key_values <= end_range) & live].tolist())
+        return sorted(keys)
+
+    """
+    # internal Method
+    # Returns the base RIDs of every record whose latest value of column is value
+    # A base page is skipped when its zone map rules out value and none of its records have tail versions
+    """
+    def __scan(self, value, column):
+        rids = []
+        for page_range in self.table.page_ranges:
+            for base_page in page_range.base_pages:
+                indirections = base_page.pages[config.INDIRECTION_COLUMN].read_all()
+                updated = indirections.any()
+                if not updated and not base_page.pages[column + 5].may_contain(value, value):
+                    continue
+                base_rids = base_page.pages[config.RID_COLUMN].read_all()
+                if not updated:
+                    # base values are current, match them directly (dictionary pages compare codes)
+                    matches = base_rids[base_page.pages[column + 5].match(value)]
+                    rids.extend(matches[matches != 0].tolist())
+                    continue
+                values = base_page.pages[column + 5].read_all()
+                for record_num in range(len(base_rids)):
+                    if base_rids[record_num] == 0:
+                        continue  # deleted
+                    current = values[record_num]
+                    if indirections[record_num] != 0 and int(indirections[record_num]) in self.table.page_directory:
+                        # the indirection column of the base record points to the newest tail record
+                        tail_page_range, tail_page_num, tail_record_num = self.table.page_directory[int(indirections[record_num])]
+                        tail_page = self.table.page_ranges[tail_page_range].tail_pages[tail_page_num]
+                        projection = [1 if i == column else 0 for i in range(self.table.num_columns)]
+                        current = self.__read_version(tail_page, tail_record_num, base_page, record_num, projection)[column]
+                    if current == value:
+                        rids.append(int(base_rids[record_num]))
+        return rids
+
     """
     incremenets one column of the record
     this implementation should work if your select and update queries already work
@@ -422,6 +599,7 @@ class Query:
     # Returns True is increment is successful
     # Returns False if no record matches key or if target record is locked by 2PL.
     """
+    @fails_on_full_pool
     def increment(self, key, column):
         r = self.select(key, self.table.key, [1] * self.table.num_columns)
         if r is not False:
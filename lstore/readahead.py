@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from lstore import config
+
+# READ-AHEAD
+# Scans tell the read-ahead which page group they are about to read: sum_version and Index.create_index the
+# base page groups of a column, B+tree range lookups (lstore.btree) the leaves of the index file.
+# Once a stream reads config.READ_AHEAD_TRIGGER groups in a row, the next config.READ_AHEAD_PAGES groups
+# are requested ahead, so the scan's I/O overlaps with its computation:
+# - B+tree nodes are read from their file into the bufferpool on a thread pool
+# - with config.MMAP_PAGES, base and tail pages are views of the mapped segment file that the OS faults
+#   in on first access, so the OS is asked to start reading them (Segment.will_need)
+# Without MMAP_PAGES base and tail pages are loaded with their page ranges and there is nothing to read.
+# A stream is one table, page range, page type and set of columns.
+class ReadAhead:
+
+    def __init__(self, bufferpool, window=None, workers=None):
+        self.bufferpool = bufferpool
+        self.window = config.READ_AHEAD_PAGES if window is None else window
+        self.workers = config.READ_AHEAD_WORKERS if workers is None else workers
+        self.executor = None
+        self.lock = threading.Lock()
+        # stream -> [last page group read, length of the sequential run, last page group prefetched]
+        self.streams = {}
+
+    '''
+    Record that a scan is reading page group page_group_number of the page range
+    (B+tree nodes: node page_group_number of the index on columns[0], page range 0)
+    A scan running through a BufferRing passes it, so the prefetched pages go into the ring's frames
+    Returns the number of page groups scheduled for prefetching
+    '''
+    def access(self, table, page_range_number, page_group_number, columns, ring=None, page_type=config.BASE_PAGE):
+        if page_type != config.INDEX_PAGE and not config.MMAP_PAGES:
+            return 0
+        stream = (table.name, page_range_number, page_type, tuple(columns))
+        with self.lock:
+            last, run, prefetched = self.streams.get(stream, (None, 0, -1))
+            run = run + 1 if last is not None and page_group_number == last + 1 else 1
+            first = max(page_group_number + 1, prefetched + 1)
+            end = min(page_group_number + self.window, table.num_page_groups(page_range_number, page_type, columns[0]) - 1)
+            if run < config.READ_AHEAD_TRIGGER or first > end:
+                self.streams[stream] = (page_group_number, run, prefetched)
+                return 0
+            self.streams[stream] = (page_group_number, run, end)
+
+        scheduled = 0
+        for group in range(first, end + 1):
+            if self.submit(table.group_page_ids(page_range_number, group, page_type, columns), table, ring):
+                scheduled += 1
+        return scheduled
+
+    # request the pages of the table ahead: mapped table pages are advised to the OS, pages that are neither
+    # in the table's page ranges nor in the bufferpool are loaded on the thread pool
+    # returns False when there is nothing to read
+    def submit(self, page_ids, table, ring=None):
+        mapped = []
+        unloaded = []
+        for page_id in page_ids:
+            if table.resident_page(page_id) is not None:
+                if config.MMAP_PAGES:
+                    mapped.append(page_id)
+            elif page_id not in self.bufferpool.page_table:
+                unloaded.append(page_id)
+        if mapped:
+            # madvise only starts the reads, so it doesn't need a thread
+            self.bufferpool.will_need(mapped, table)
+        if unloaded:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="read-ahead")
+                self.executor.submit(self.bufferpool.prefetch, unloaded, table, ring)
+        return bool(mapped or unloaded)
+
+    # wait for the outstanding prefetches and stop the thread pool
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+            self.streams = {}
+        if executor is not None:
+            executor.shutdown(wait=True)
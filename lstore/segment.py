@@ -0,0 +1,471 @@
+from functools import wraps
+import mmap
+import os
+import struct
+import threading
+import weakref
+from lstore import config
+from lstore.page import Page
+from lstore import compression
+
+# SEGMENT FILE FORMAT
+# One file per page range: {table path}/{page range number}.seg
+#
+# | header | slot 0 | slot 1 | ... |
+#
+# header: magic, page size in bytes, physical pages per page group, number of base page groups
+# slot:   num_records (8 bytes) followed by the page data (page size bytes)
+#
+# base page group g, column c is slot g*pages_per_group + c
+# tail page group t, column c is slot (num_base_groups + t)*pages_per_group + c
+# tail page groups are appended to the end of the file as they are created
+#
+# with config.MMAP_PAGES the file is memory mapped and every Page.data is a memoryview
+# into the mapping, so pages are faulted in lazily by the OS and flushed with msync
+# the file is mapped in chunks of config.MMAP_CHUNK_BYTES worth of slots. a chunk is mapped once it is
+# complete; only the last chunk of a growing file is remapped, and the pages viewing it are pointed at
+# the new mapping so the old one can be released
+#
+# PACKED SEGMENT FILE FORMAT (cold page ranges, config.COMPRESS_COLD_PAGES)
+#
+# | packed header | directory | payload 0 | payload 1 | ... |
+#
+# packed header: magic, page size in bytes, physical pages per page group, number of base page groups, number of slots
+# directory:     num_records, codec and payload length of every slot
+# payload:       the page data encoded by lstore.compression
+#
+# a packed file is unpacked back to the fixed slot format before any slot is written or mapped
+#
+# every method that reads, writes, unpacks or maps the file holds the segment's lock, so the write-behind
+# flusher rewriting a segment never races a query reading or mapping it
+SEGMENT_MAGIC = b"LSEG"
+HEADER_FORMAT = "<4sIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SLOT_HEADER_FORMAT = "<Q"
+SLOT_HEADER_SIZE = struct.calcsize(SLOT_HEADER_FORMAT)
+
+PACKED_MAGIC = b"LSEZ"
+PACKED_HEADER_FORMAT = "<4sIIII"
+PACKED_HEADER_SIZE = struct.calcsize(PACKED_HEADER_FORMAT)
+DIRECTORY_ENTRY_FORMAT = "<QII"
+DIRECTORY_ENTRY_SIZE = struct.calcsize(DIRECTORY_ENTRY_FORMAT)
+
+# run a Segment method holding the segment's lock
+def locked(method):
+    @wraps(method)
+    def run_locked(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return run_locked
+
+# SEGMENT CLASS
+class Segment:
+
+    def __init__(self, path, pages_per_group=None, num_base_groups=config.PAGE_RANGE_SIZE, page_size=config.ARRAY_SIZE):
+        self.path = path
+        self.pages_per_group = pages_per_group
+        self.num_base_groups = num_base_groups
+        self.set_page_size(page_size)
+        # chunk number -> mmap, and chunk number -> {slot: Page viewing the chunk}
+        self.chunks = {}
+        self.views = {}
+        self.packed = None # unknown until the file is read or written
+        # reentrant since writes unpack and map_range builds page views
+        self.lock = threading.RLock()
+
+    '''
+    slot numbering
+    '''
+    def base_slot(self, base_page_number, column):
+        return base_page_number * self.pages_per_group + column
+
+    def tail_slot(self, tail_page_number, column):
+        return (self.num_base_groups + tail_page_number) * self.pages_per_group + column
+
+    def slot_offset(self, slot):
+        return HEADER_SIZE + slot * self.slot_size
+
+    # number of slots in the file, 0 if it doesn't exist yet
+    @locked
+    def num_slots(self):
+        if not os.path.exists(self.path):
+            return 0
+        if self.is_packed():
+            with open(self.path, "rb") as segment_file:
+                return struct.unpack_from(PACKED_HEADER_FORMAT, segment_file.read(PACKED_HEADER_SIZE), 0)[4]
+        return max(0, (os.path.getsize(self.path) - HEADER_SIZE) // self.slot_size)
+
+    def set_page_size(self, page_size):
+        self.page_size = page_size
+        self.slot_size = SLOT_HEADER_SIZE + page_size
+
+    '''
+    encoding helpers
+    '''
+    def encode_header(self):
+        return struct.pack(HEADER_FORMAT, SEGMENT_MAGIC, self.page_size, self.pages_per_group, self.num_base_groups)
+
+    def encode_group(self, page_group):
+        return self.encode_pages(page_group.pages)
+
+    def encode_pages(self, pages):
+        # one contiguous buffer for every physical page of the group
+        buffer = bytearray()
+        for page in pages:
+            buffer += struct.pack(SLOT_HEADER_FORMAT, page.num_records)
+            buffer += page.data
+        return buffer
+
+    def read_header(self, buffer):
+        magic, page_size, pages_per_group, num_base_groups = struct.unpack_from(HEADER_FORMAT, buffer, 0)
+        if magic != SEGMENT_MAGIC:
+            print(f"error: {self.path} is not a segment file")
+            return False
+        self.set_page_size(page_size)
+        self.pages_per_group = pages_per_group
+        self.num_base_groups = num_base_groups
+        return True
+
+    def decode_page(self, buffer, offset=0):
+        num_records, = struct.unpack_from(SLOT_HEADER_FORMAT, buffer, offset)
+        start = offset + SLOT_HEADER_SIZE
+        return Page(num_records, bytearray(buffer[start:start + self.page_size]))
+
+    '''
+    reading and writing whole page ranges
+    '''
+    # write the header and every page group of the range in one sequential write
+    # compress=True writes the packed format instead
+    @locked
+    def write_range(self, page_range, compress=False):
+        base_groups = [base_page.pages for base_page in page_range.base_pages]
+        tail_groups = [tail_page.pages for tail_page in page_range.tail_pages]
+        if compress:
+            self.write_packed(base_groups, tail_groups)
+        else:
+            self.write_groups(base_groups, tail_groups)
+
+    @locked
+    def write_groups(self, base_groups, tail_groups):
+        buffer = bytearray(self.encode_header())
+        for pages in base_groups + tail_groups:
+            buffer += self.encode_pages(pages)
+        with open(self.path, "wb") as segment_file:
+            segment_file.write(buffer)
+        self.packed = False
+
+    # read the whole file in one go and split it into physical pages
+    # returns (base groups, tail groups), each a list of lists of Page
+    @locked
+    def read_range(self):
+        with open(self.path, "rb") as segment_file:
+            buffer = segment_file.read()
+
+        if buffer[:len(PACKED_MAGIC)] == PACKED_MAGIC:
+            return self.decode_packed(buffer)
+        self.packed = False
+
+        if not self.read_header(buffer):
+            return None
+        pages_per_group = self.pages_per_group
+        num_base_groups = self.num_base_groups
+
+        num_slots = (len(buffer) - HEADER_SIZE) // self.slot_size
+        groups = []
+        for first_slot in range(0, num_slots, pages_per_group):
+            groups.append([self.decode_page(buffer, self.slot_offset(slot)) for slot in range(first_slot, first_slot + pages_per_group)])
+        return groups[:num_base_groups], groups[num_base_groups:]
+
+    '''
+    reading and writing single page groups and pages
+    '''
+    @locked
+    def write_group(self, first_slot, page_group):
+        self.unpack()
+        with open(self.path, "r+b") as segment_file:
+            segment_file.seek(self.slot_offset(first_slot))
+            segment_file.write(self.encode_group(page_group))
+
+    @locked
+    def read_page(self, slot):
+        if self.is_packed():
+            return self.read_packed_page(slot)
+        with open(self.path, "rb") as segment_file:
+            segment_file.seek(self.slot_offset(slot))
+            buffer = segment_file.read(self.slot_size)
+        if len(buffer) < self.slot_size:
+            print(f"error: slot {slot} is past the end of {self.path}")
+            return None
+        return self.decode_page(buffer)
+
+    @locked
+    def write_page(self, slot, page):
+        self.unpack()
+        with open(self.path, "r+b") as segment_file:
+            segment_file.seek(self.slot_offset(slot))
+            segment_file.write(struct.pack(SLOT_HEADER_FORMAT, page.num_records) + page.data)
+
+    # write several pages with one open of the file. slots that follow each other are joined into one write
+    # slot_pages: list of (slot, page)
+    @locked
+    def write_pages(self, slot_pages):
+        self.unpack()
+        runs = []
+        for slot, page in sorted(slot_pages, key=lambda slot_page: slot_page[0]):
+            if runs and runs[-1][1] == slot:
+                runs[-1][1] = slot + 1
+                runs[-1][2].append(page)
+            else:
+                runs.append([slot, slot + 1, [page]])
+        with open(self.path, "r+b") as segment_file:
+            for first_slot, _, pages in runs:
+                segment_file.seek(self.slot_offset(first_slot))
+                segment_file.write(self.encode_pages(pages))
+
+    '''
+    Write the parts of pages that changed with positioned writes (os.pwrite), one open of the file
+    slot_pages: list of (slot, page, dirty) with dirty from Page.take_dirty(). a dirty of None writes the whole
+    slot (adjacent whole slots are joined as in write_pages), otherwise only the num_records header if it
+    changed and the dirty slot ranges of the page data are written
+    Returns the number of bytes written
+    '''
+    @locked
+    def write_dirty(self, slot_pages):
+        self.unpack()
+        full = sorted((slot, page) for slot, page, dirty in slot_pages if dirty is None)
+        writes = [] # (file offset, bytes)
+        first_slot, pages = None, []
+        for slot, page in full + [(None, None)]:
+            if pages and slot == first_slot + len(pages):
+                pages.append(page)
+                continue
+            if pages:
+                writes.append((self.slot_offset(first_slot), self.encode_pages(pages)))
+            first_slot, pages = slot, [page]
+        for slot, page, dirty in slot_pages:
+            if dirty is None:
+                continue
+            header, ranges = dirty
+            offset = self.slot_offset(slot)
+            if header:
+                writes.append((offset, struct.pack(SLOT_HEADER_FORMAT, page.num_records)))
+            data = page.data
+            for first, end in ranges:
+                start = first * config.VALUE_SIZE
+                writes.append((offset + SLOT_HEADER_SIZE + start, bytes(data[start:end * config.VALUE_SIZE])))
+        # a header and slot 0, or ranges of neighbouring pages, become one write
+        writes.sort(key=lambda write: write[0])
+        joined = []
+        for offset, buffer in writes:
+            if joined and joined[-1][0] + len(joined[-1][1]) == offset:
+                joined[-1][1] += buffer
+            else:
+                joined.append([offset, bytearray(buffer)])
+        segment_file = os.open(self.path, os.O_RDWR)
+        try:
+            for offset, buffer in joined:
+                os.pwrite(segment_file, buffer, offset)
+        finally:
+            os.close(segment_file)
+        return sum(len(buffer) for _, buffer in joined)
+
+    '''
+    memory mapped pages (config.MMAP_PAGES)
+    '''
+    def slots_per_chunk(self):
+        return max(1, config.MMAP_CHUNK_BYTES // self.slot_size)
+
+    # returns (mapping of the chunk holding slot, file offset the mapping starts at)
+    # the mapping is None if the slot is past the end of the file
+    @locked
+    def chunk(self, slot):
+        chunk = slot // self.slots_per_chunk()
+        first_slot = chunk * self.slots_per_chunk()
+        # mmap offsets have to be aligned to the allocation granularity
+        start = self.slot_offset(first_slot) - self.slot_offset(first_slot) % mmap.ALLOCATIONGRANULARITY
+        mapping = self.chunks.get(chunk)
+        if mapping is not None and start + len(mapping) >= self.slot_offset(slot) + self.slot_size:
+            return mapping, start
+        # first use of the chunk, or the file grew past the end of its partial mapping
+        self.unpack()
+        file_size = os.path.getsize(self.path)
+        if file_size < self.slot_offset(slot) + self.slot_size:
+            return None, start
+        end = min(self.slot_offset(first_slot + self.slots_per_chunk()), file_size)
+        with open(self.path, "r+b") as segment_file:
+            new_mapping = mmap.mmap(segment_file.fileno(), end - start, offset=start)
+        self.chunks[chunk] = new_mapping
+        for view_slot, page in list(self.views.get(chunk, {}).items()):
+            page.data = self.view_data(new_mapping, start, view_slot)
+        if mapping is not None:
+            try:
+                mapping.close()
+            except BufferError:
+                # a view taken before the remap is still in use, the mapping goes when it does
+                pass
+        return new_mapping, start
+
+    def view_data(self, mapping, start, slot):
+        data_start = self.slot_offset(slot) - start + SLOT_HEADER_SIZE
+        return memoryview(mapping)[data_start:data_start + self.page_size]
+
+    # returns a Page whose data is a zero-copy view of the slot inside its chunk's mapping
+    @locked
+    def page_view(self, slot):
+        mapping, start = self.chunk(slot)
+        if mapping is None:
+            print(f"error: slot {slot} is past the end of {self.path}")
+            return None
+        num_records, = struct.unpack_from(SLOT_HEADER_FORMAT, mapping, self.slot_offset(slot) - start)
+        page = Page(num_records, self.view_data(mapping, start, slot))
+        self.views.setdefault(slot // self.slots_per_chunk(), weakref.WeakValueDictionary())[slot] = page
+        return page
+
+    # point every page of the group at its slot in the mapping, so writes go straight to the file
+    @locked
+    def attach_group(self, first_slot, page_group):
+        page_group.pages = [self.page_view(first_slot + i) for i in range(len(page_group.pages))]
+
+    @locked
+    def attach_range(self, page_range):
+        for i, base_page in enumerate(page_range.base_pages):
+            self.attach_group(self.base_slot(i, 0), base_page)
+        for i, tail_page in enumerate(page_range.tail_pages):
+            self.attach_group(self.tail_slot(i, 0), tail_page)
+
+    # map the file and split it into page views without reading any page data
+    # returns (base groups, tail groups), each a list of lists of Page
+    @locked
+    def map_range(self):
+        self.unpack()
+        with open(self.path, "rb") as segment_file:
+            if not self.read_header(segment_file.read(HEADER_SIZE)):
+                return None
+        # the header may have changed the slot size, and with it the chunks
+        self.chunks = {}
+        self.views = {}
+        pages_per_group = self.pages_per_group
+        num_base_groups = self.num_base_groups
+
+        num_slots = (os.path.getsize(self.path) - HEADER_SIZE) // self.slot_size
+        groups = []
+        for first_slot in range(0, num_slots, pages_per_group):
+            groups.append([self.page_view(slot) for slot in range(first_slot, first_slot + pages_per_group)])
+        return groups[:num_base_groups], groups[num_base_groups:]
+
+    # ask the OS to start reading the slots of mapped pages in the background (madvise MADV_WILLNEED), so a
+    # scan that reaches them later doesn't wait for the page faults. returns the number of bytes advised
+    @locked
+    def will_need(self, slots):
+        if not hasattr(mmap, "MADV_WILLNEED"):
+            return 0
+        chunks = {}
+        for slot in slots:
+            chunks.setdefault(slot // self.slots_per_chunk(), []).append(slot)
+        advised = 0
+        for chunk_slots in chunks.values():
+            mapping, start = self.chunk(max(chunk_slots))
+            if mapping is None:
+                continue
+            # madvise needs an offset aligned to the memory page size
+            first = self.slot_offset(min(chunk_slots)) - start
+            first -= first % mmap.PAGESIZE
+            end = min(self.slot_offset(max(chunk_slots)) - start + self.slot_size, len(mapping))
+            mapping.madvise(mmap.MADV_WILLNEED, first, end - first)
+            advised += end - first
+        return advised
+
+    # write the num_records header of a mapped page and msync just that slot
+    def sync_page(self, slot, page):
+        self.sync_pages([(slot, page)])
+
+    # write the num_records headers of mapped pages and msync, per chunk, the span that covers them once
+    @locked
+    def sync_pages(self, slot_pages):
+        chunks = {}
+        for slot, page in slot_pages:
+            chunks.setdefault(slot // self.slots_per_chunk(), []).append((slot, page))
+        for chunk_slot_pages in chunks.values():
+            mapping, start = self.chunk(max(slot for slot, _ in chunk_slot_pages))
+            if mapping is None:
+                print(f"error: slot {max(slot for slot, _ in chunk_slot_pages)} is past the end of {self.path}")
+                continue
+            for slot, page in chunk_slot_pages:
+                struct.pack_into(SLOT_HEADER_FORMAT, mapping, self.slot_offset(slot) - start, page.num_records)
+            # msync needs an offset aligned to the allocation granularity
+            first = self.slot_offset(min(slot for slot, _ in chunk_slot_pages)) - start
+            first -= first % mmap.ALLOCATIONGRANULARITY
+            end = self.slot_offset(max(slot for slot, _ in chunk_slot_pages)) - start + self.slot_size
+            mapping.flush(first, end - first)
+
+    # write every num_records header of the range and msync them
+    def sync_range(self, page_range):
+        slot_pages = []
+        for i, base_page in enumerate(page_range.base_pages):
+            slot_pages.extend((self.base_slot(i, j), page) for j, page in enumerate(base_page.pages))
+        for i, tail_page in enumerate(page_range.tail_pages):
+            slot_pages.extend((self.tail_slot(i, j), page) for j, page in enumerate(tail_page.pages))
+        self.sync_pages(slot_pages)
+
+    '''
+    packed (compressed) segments
+    '''
+    @locked
+    def is_packed(self):
+        if self.packed is None:
+            with open(self.path, "rb") as segment_file:
+                self.packed = segment_file.read(len(PACKED_MAGIC)) == PACKED_MAGIC
+        return self.packed
+
+    # encode every page with its smallest codec and write header, directory and payloads in one write
+    @locked
+    def write_packed(self, base_groups, tail_groups):
+        pages = [page for group in base_groups + tail_groups for page in group]
+        directory = bytearray(struct.pack(PACKED_HEADER_FORMAT, PACKED_MAGIC, self.page_size, self.pages_per_group, self.num_base_groups, len(pages)))
+        payloads = bytearray()
+        for page in pages:
+            codec, payload = compression.encode_page(page.data)
+            directory += struct.pack(DIRECTORY_ENTRY_FORMAT, page.num_records, codec, len(payload))
+            payloads += payload
+        with open(self.path, "wb") as segment_file:
+            segment_file.write(directory + payloads)
+        self.packed = True
+
+    def read_directory(self, buffer):
+        magic, page_size, pages_per_group, num_base_groups, num_slots = struct.unpack_from(PACKED_HEADER_FORMAT, buffer, 0)
+        self.set_page_size(page_size)
+        self.pages_per_group = pages_per_group
+        self.num_base_groups = num_base_groups
+        entries = [struct.unpack_from(DIRECTORY_ENTRY_FORMAT, buffer, PACKED_HEADER_SIZE + i * DIRECTORY_ENTRY_SIZE) for i in range(num_slots)]
+        return entries, PACKED_HEADER_SIZE + num_slots * DIRECTORY_ENTRY_SIZE
+
+    def decode_packed(self, buffer):
+        self.packed = True
+        entries, offset = self.read_directory(buffer)
+        pages = []
+        for num_records, codec, length in entries:
+            pages.append(Page(num_records, compression.decode_page(codec, buffer[offset:offset + length], self.page_size)))
+            offset += length
+        groups = [pages[i:i + self.pages_per_group] for i in range(0, len(pages), self.pages_per_group)]
+        return groups[:self.num_base_groups], groups[self.num_base_groups:]
+
+    # reads the directory, then just the payload of the slot
+    @locked
+    def read_packed_page(self, slot):
+        with open(self.path, "rb") as segment_file:
+            header = segment_file.read(PACKED_HEADER_SIZE)
+            num_slots = struct.unpack_from(PACKED_HEADER_FORMAT, header, 0)[4]
+            if slot >= num_slots:
+                print(f"error: slot {slot} is past the end of {self.path}")
+                return None
+            entries, offset = self.read_directory(header + segment_file.read(num_slots * DIRECTORY_ENTRY_SIZE))
+            num_records, codec, length = entries[slot]
+            segment_file.seek(offset + sum(entry[2] for entry in entries[:slot]))
+            return Page(num_records, compression.decode_page(codec, segment_file.read(length), self.page_size))
+
+    # rewrite a packed file in the fixed slot format so single slots can be written in place
+    @locked
+    def unpack(self):
+        if self.is_packed():
+            base_groups, tail_groups = self.read_range()
+            self.write_groups(base_groups, tail_groups)
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from lstore import config
+
+# BUFFERPOOL STATISTICS
+# The bufferpool records every hit, miss, eviction, dirty write-back, byte read or written, latch wait
+# and the time each page spent in its frame, once for the whole pool and once for the page's table.
+# stats() returns a JSON-ready snapshot, and start_dumper writes one to a file every few seconds
+# so BUFFERPOOL_MAX_BYTES can be sized from a real workload.
+# Every thread counts into its own counters, so recording a fix takes no lock. snapshot() sums them.
+# With config.STATS_ENABLED off nothing is counted, stats() then only reports the pool's occupancy.
+COUNTERS = ("hits", "misses", "evictions", "writebacks", "bytes_read", "bytes_written", "pin_waits")
+
+class Counters:
+
+    # plain slots, so the hot path (hit, miss) is a direct attribute increment
+    __slots__ = COUNTERS + ("residency_total", "residency_count")
+
+    def __init__(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        # seconds pages spent in the pool, over the pages that left it
+        self.residency_total = 0.0
+        self.residency_count = 0
+
+    # add the counts of other
+    def add(self, other):
+        for name in COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.residency_total += other.residency_total
+        self.residency_count += other.residency_count
+
+    def to_dict(self):
+        counters = {name: getattr(self, name) for name in COUNTERS}
+        lookups = self.hits + self.misses
+        counters["hit_ratio"] = self.hits / lookups if lookups else 0.0
+        counters["average_residency"] = self.residency_total / self.residency_count if self.residency_count else 0.0
+        return counters
+
+# the counters of one thread, only ever changed by that thread
+class ThreadCounters:
+
+    def __init__(self):
+        self.pool = Counters()
+        # table name -> Counters
+        self.tables = defaultdict(Counters)
+
+class BufferpoolStats:
+
+    """
+    :param enabled: bool    #Count anything at all. Defaults to config.STATS_ENABLED
+    """
+    def __init__(self, enabled=None):
+        self.enabled = config.STATS_ENABLED if enabled is None else enabled
+        # only taken to register a thread's counters, to reset and to take a snapshot
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.threads = []
+        self.dumper = None
+        self.stop_dumping = threading.Event()
+
+    # the calling thread's counters, registered on its first record
+    def thread_counters(self):
+        try:
+            return self.local.counters
+        except AttributeError:
+            counters = ThreadCounters()
+            with self.lock:
+                self.threads.append(counters)
+                self.local.counters = counters
+            return counters
+
+    # a fix found its page in the pool, or had to load it. called on every fix, so kept to two increments
+    def record_hit(self, table_name):
+        if self.enabled:
+            counters = self.thread_counters()
+            counters.pool.hits += 1
+            counters.tables[table_name].hits += 1
+
+    def record_miss(self, table_name):
+        if self.enabled:
+            counters = self.thread_counters()
+            counters.pool.misses += 1
+            counters.tables[table_name].misses += 1
+
+    # add amount to a counter of the pool and of the table, for the less frequent events
+    def record(self, table_name, name, amount=1):
+        if not self.enabled:
+            return
+        counters = self.thread_counters()
+        setattr(counters.pool, name, getattr(counters.pool, name) + amount)
+        table_counters = counters.tables[table_name]
+        setattr(table_counters, name, getattr(table_counters, name) + amount)
+
+    # a page of the table left the pool after seconds in its frame
+    def record_residency(self, table_name, seconds):
+        if not self.enabled:
+            return
+        counters = self.thread_counters()
+        for table_counters in (counters.pool, counters.tables[table_name]):
+            table_counters.residency_total += seconds
+            table_counters.residency_count += 1
+
+    # threads register new counters on their next record
+    def reset(self):
+        with self.lock:
+            self.threads = []
+            self.local = threading.local()
+
+    '''
+    {"pool": {counter: value, ..., "hit_ratio": float, "average_residency": seconds},
+     "tables": {table name: {...same counters...}}}
+    '''
+    def snapshot(self):
+        with self.lock:
+            threads = list(self.threads)
+        pool = Counters()
+        tables = defaultdict(Counters)
+        for counters in threads:
+            pool.add(counters.pool)
+            # copied first, the thread may be adding a table
+            for name, table_counters in dict(counters.tables).items():
+                tables[name].add(table_counters)
+        return {
+            "pool": pool.to_dict(),
+            "tables": {name: counters.to_dict() for name, counters in tables.items()},
+        }
+
+    '''
+    periodic JSON dump
+    '''
+    # written to a temporary file and renamed, so a reader never sees half a dump
+    def dump(self, path, snapshot):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(snapshot, file, indent=2)
+        os.replace(temp_path, path)
+
+    # snapshot is a function returning the dict to write (the bufferpool's stats method)
+    def start_dumper(self, path, snapshot, interval=None):
+        if self.dumper is not None and self.dumper.is_alive():
+            return False
+        interval = config.STATS_DUMP_INTERVAL if interval is None else interval
+        self.stop_dumping.clear()
+        self.dumper = threading.Thread(target=self.run_dumper, args=(path, snapshot, interval), daemon=True)
+        self.dumper.start()
+        return True
+
+    # stops the thread and writes one last dump
+    def stop_dumper(self):
+        if self.dumper is None:
+            return False
+        self.stop_dumping.set()
+        self.dumper.join()
+        self.dumper = None
+        return True
+
+    def run_dumper(self, path, snapshot, interval):
+        while not self.stop_dumping.wait(interval):
+            self.dump(path, snapshot())
+        self.dump(path, snapshot())
@@ -1,9 +1,11 @@
 import os
 import json
 from time import time
-from lstore.page import pageRange, PageGroup
+from lstore.page import pageRange, PageGroup, ColumnDictionary
 from lstore.index import Index
 from lstore.page import Page
+from lstore.segment import Segment
+from lstore.bufferpool import ResidentPages
 from lstore import config
 import threading
 from time import sleep
@@ -30,79 +32,81 @@ class Table:
     :param page_directory: dict #Dictionary of pages, returns page location of record given rid
     :param index: Index         #Index object for the table
     :param pages: list          #List of pages in the table
+    :param dictionaries: dict   #Dictionary encoded columns, column index -> list of the column's distinct values
+    :param sparse_tails: bool   #Tail records only store the updated columns. Defaults to config.SPARSE_TAIL_RECORDS
+    :param page_size: int       #Bytes per physical page. Defaults to config.ARRAY_SIZE
+    :param page_range_size: int #Base page groups per page range. Defaults to config.PAGE_RANGE_SIZE
+    :param merge_threshold: int #Updates before a merge is started. Defaults to config.UPDATES_BEFORE_MERGE
+    :param bufferpool: Bufferpool #Pool the pages are pinned through. A Database passes its own, a standalone table passes one to opt in
     """
-    def __init__(self, name, path, num_columns, key, page_directory, latest_page_range, index=None):
+    def __init__(self, name, path, num_columns, key, page_directory, latest_page_range, index=None, dictionaries=None, sparse_tails=None, page_size=None, page_range_size=None, merge_threshold=None, bufferpool=None):
         self.name = name 
         self.path = path
         self.key = key
         self.num_columns = num_columns
         self.page_directory = page_directory # RID - > {page_range_number, base_page_number, record_number} 
-        self.index = Index(self.name) if Index is None else index
+        self.index = Index(self.name) if index is None else index
         self.page_ranges = []
         self.latest_page_range = latest_page_range if latest_page_range is not None else 0
         self.base_id = {}
+        self.segments = {} # page range number -> Segment, kept so mapped files stay mapped
+        self.index_segments = {} # physical column number -> Segment of its B+tree index (lstore.btree)
+        # physical column number -> ColumnDictionary, shared by the pages and the index of the column
+        self.dictionaries = {column + 5: ColumnDictionary(values) for column, values in (dictionaries or {}).items()}
+        self.index.dictionaries.update(self.dictionaries)
+        self.sparse_tails = config.SPARSE_TAIL_RECORDS if sparse_tails is None else sparse_tails
+        # storage parameters
+        self.page_size = config.ARRAY_SIZE if page_size is None else page_size
+        self.page_range_size = config.PAGE_RANGE_SIZE if page_range_size is None else page_range_size
+        self.merge_threshold = config.UPDATES_BEFORE_MERGE if merge_threshold is None else merge_threshold
+        # no pool of its own: one is given here or through attach_bufferpool, without one the
+        # queries use the pages of the page ranges directly (see pins)
+        self.bufferpool = None
+        self.resident_pages = ResidentPages(self)
+        if bufferpool is not None:
+            self.attach_bufferpool(bufferpool)
         # Background merge thread setup
         self.lock = threading.Lock()
         self.merge_counter = 0  # Track number of merges
 
     def __merge(self):
         """ Merges tail records into base pages periodically to optimize queries. """
-        for base_id in self.base_id.values():
-            if base_id not in self.page_directory:
-                continue  
-        committed_records = {} 
-        
-        # Identify the latest committed tail records
-        for page_range in self.page_ranges:  
-            for tail_page in reversed(page_range.tail_pages):  
-                for record_num in range(tail_page.pages[0].num_records):  
-                    base_id = tail_page.pages[config.BASE_ID_COLUMN].read(record_num) # Get BaseID
-                    if base_id not in self.page_directory:
-                        continue  
-                
-                    if base_id in committed_records:
-                        continue  
-
-                    committed_records[base_id] = {
-                        "record_num": record_num,
-                        "tail_page": tail_page
-                    }
-
-        outdated_pages = {} 
-        # Load outdated base pages into bufferpool
-        for base_id in committed_records.keys():
-            page_range_num, base_page_num, record_num = self.page_directory[base_id]
-            # TODO: retrieve basepage from bufferpool instead of self.page_ranges
-            # base_page = self.bufferpool.getBufferpoolPage(base_id, 0, self)  
-            base_page = self.page_ranges[page_range_num].base_pages[base_page_num]  # Directly fetch base page
-            outdated_pages[base_id] = {
-                "base_page": base_page,
-                "record_num": record_num
-            }
-
-        #  Apply updates from tail pages to base pages (without? thread lock)  
-        for base_id, update_info in committed_records.items():
-            base_page = outdated_pages[base_id]["base_page"]
-            base_record_num = outdated_pages[base_id]["record_num"]
-            tail_page = update_info["tail_page"]
-            tail_record_num = update_info["record_num"]
-            for col_idx in range(self.num_columns):
-                # new_value = tail_page.pages[col_idx].read(tail_record_num)              
-                new_value = tail_page.pages[col_idx].read(tail_record_num)  
-                base_page.pages[col_idx+5].write_column(base_record_num, new_value)
-            
-            base_page.set_tps(tail_record_num)
-            if base_id in self.bufferpool.frames:
-                self.bufferpool.frames[base_id].dirty = True
-        # ONLY LOCK PAGE DIRECTORY UPDATES
-        with self.lock:         
-            for base_id in committed_records.keys():
-                page_range_num, base_page_num, record_num = self.page_directory[base_id]
-                self.page_directory[base_id] = (page_range_num, base_page_num, record_num)
-        # Mark old base pages as inactive instead of removing immediately
-        for base_id in outdated_pages.keys():            
-            if base_id in self.bufferpool.frames:
-                self.bufferpool.frames[base_id].valid = False  # Mark as inactive instead of removing
+        # every updated base record gets the newest value of each column from its whole tail chain: a sparse
+        # tail record only holds the columns it updated, so the latest tail record alone is not enough
+        # the merge runs through a private ring of frames so it doesn't flush the bufferpool
+        merged_ranges = set()
+        with self.pins().ring() as ring:
+            for page_range_num, page_range in enumerate(self.page_ranges):
+                if not page_range.tail_pages:
+                    continue
+                for base_page_num, base_page in enumerate(page_range.base_pages):
+                    columns = (config.INDIRECTION_COLUMN, config.RID_COLUMN)
+                    with ring.pin_many(self.group_page_ids(page_range_num, base_page_num, config.BASE_PAGE, columns)) as (indirection_page, rid_page):
+                        indirections = indirection_page.read_all().tolist()
+                        rids = rid_page.read_all().tolist()
+                    # skip records without tail records, and deleted ones
+                    updated = [(record_num, indirection) for record_num, (indirection, rid) in enumerate(zip(indirections, rids)) if indirection != 0 and rid != 0]
+                    if not updated:
+                        continue
+                    # the group stays pinned (and is marked dirty) while it is rewritten
+                    with ring.pin_many(self.group_page_ids(page_range_num, base_page_num, config.BASE_PAGE), write=True):
+                        for record_num, indirection in updated:
+                            for column, value in self.chain_values(indirection, ring).items():
+                                base_page.pages[column].write_column(record_num, value)
+                        base_page.set_tps(max(base_page.get_tps(), max(indirection for _, indirection in updated)))
+                    # the merged values replaced older ones, so recompute the zone maps of the merged base pages
+                    for page in base_page.pages:
+                        page.refresh_zone_map()
+                    merged_ranges.add(page_range_num)
+
+        # cold page ranges the merge rewrote go back to disk compressed (see flush_page_range). their frames
+        # are marked clean first, or write-back would unpack the segment again for the pages merge dirtied
+        if config.COMPRESS_COLD_PAGES and not config.MMAP_PAGES:
+            for page_range_num in sorted(merged_ranges):
+                if page_range_num != self.latest_page_range - 1:
+                    if self.bufferpool is not None:
+                        self.bufferpool.mark_range_clean(self.name, page_range_num)
+                    self.flush_page_range(page_range_num)
 
     def start_merge_thread(self):
         """Starts the background merge thread if not already running."""
@@ -116,80 +120,226 @@ class Table:
             self.__merge()
 
 
+    '''
+    Free-space map: returns (page_range_number, base_page_number) of the base page that has capacity
+    Records are only ever appended, so the only page range with free space is the latest one
+    (latest_page_range, saved in the table metadata) and inside it the open base page is
+    latest_base_page (saved in the page range metadata). Both lookups are constant time.
+    '''
+    def open_base_page(self):
+        page_range_number = self.latest_page_range - 1
+        if page_range_number >= 0 and self.page_ranges[page_range_number].has_capacity():
+            return page_range_number, self.page_ranges[page_range_number].latest_base_page
+
+        # every base page is full, so create a new page range
+        # since base pages are created upon page range initialization, we only need to create a new page range
+        page_range_number = len(self.page_ranges)
+        self.save_page_range(self.new_page_range())
+        return page_range_number, 0
+
+    def attach_bufferpool(self, bufferpool):
+        self.bufferpool = bufferpool
+        bufferpool.register_table(self)
+
+    # what the table's pages are pinned through: its bufferpool, or ResidentPages if it has none
+    def pins(self):
+        return self.resident_pages if self.bufferpool is None else self.bufferpool
+
+    '''
+    Bufferpool page ids: (table name, page range number, page group number, config.BASE_PAGE/TAIL_PAGE, column)
+    '''
+    def page_id(self, page_range_number, page_group_number, page_type, column):
+        return (self.name, page_range_number, page_group_number, page_type, column)
+
+    # page ids of the given columns of a page group (every column by default)
+    def group_page_ids(self, page_range_number, page_group_number, page_type, columns=None):
+        if columns is None:
+            columns = range(self.num_columns + 5)
+        return [(self.name, page_range_number, page_group_number, page_type, column) for column in columns]
+
+    # number of page groups of the type in the page range. B+tree nodes are one per slot of the column's index file
+    def num_page_groups(self, page_range_number, page_type, column=None):
+        if page_type == config.INDEX_PAGE:
+            return self.index_segment(column).num_slots()
+        if page_range_number >= len(self.page_ranges):
+            return 0
+        page_range = self.page_ranges[page_range_number]
+        return len(page_range.base_pages if page_type == config.BASE_PAGE else page_range.tail_pages)
+
+    # the page of a page id if its page group is loaded, otherwise None
+    def resident_page(self, page_id):
+        _, page_range_number, page_group_number, page_type, column = page_id
+        if page_type == config.INDEX_PAGE:
+            return None
+        if page_range_number >= len(self.page_ranges):
+            return None
+        page_range = self.page_ranges[page_range_number]
+        page_groups = page_range.base_pages if page_type == config.BASE_PAGE else page_range.tail_pages
+        if page_group_number >= len(page_groups):
+            return None
+        return page_groups[page_group_number].pages[column]
+
+    # value of a physical column in the newest version of a record, given the RID of its newest tail record
+    # sparse tail records may not hold the column, then older versions and finally the base value are used
+    def latest_value(self, tail_rid, column, base_value):
+        while tail_rid != 0 and tail_rid in self.page_directory:
+            page_range_num, tail_page_num, record_num = self.page_directory[tail_rid]
+            tail_page = self.page_ranges[page_range_num].tail_pages[tail_page_num]
+            schema_encoding = tail_page.pages[config.SCHEMA_ENCODING_COLUMN].read(record_num)
+            if not self.sparse_tails or (schema_encoding >> (self.num_columns - 1 - (column - 5))) & 1:
+                with self.pins().pin(self.page_id(page_range_num, tail_page_num, config.TAIL_PAGE, column)) as page:
+                    return page.read(record_num)
+            tail_rid = tail_page.pages[config.INDIRECTION_COLUMN].read(record_num)
+        return base_value
+
+    # newest value of every user column found in the tail chain starting at tail_rid: physical column -> value
+    # columns that no tail record of the chain holds are left out, their newest value is the base value
+    def chain_values(self, tail_rid, pins=None):
+        pins = self.pins() if pins is None else pins
+        values = {}
+        missing = list(range(5, 5 + self.num_columns))
+        while missing and tail_rid != 0 and tail_rid in self.page_directory:
+            page_range_num, tail_page_num, record_num = self.page_directory[tail_rid]
+            tail_page = self.page_ranges[page_range_num].tail_pages[tail_page_num]
+            with pins.pin_many(self.group_page_ids(page_range_num, tail_page_num, config.TAIL_PAGE)):
+                schema_encoding = tail_page.pages[config.SCHEMA_ENCODING_COLUMN].read(record_num)
+                for column in missing:
+                    if not self.sparse_tails or (schema_encoding >> (self.num_columns - 1 - (column - 5))) & 1:
+                        values[column] = tail_page.pages[column].read(record_num)
+                tail_rid = tail_page.pages[config.INDIRECTION_COLUMN].read(record_num)
+            missing = [column for column in missing if column not in values]
+        return values
+
+    def new_page_range(self):
+        return pageRange(num_columns=self.num_columns, dictionaries=self.page_dictionaries(), page_size=self.page_size, range_size=self.page_range_size)
+
+    def new_tail_page(self):
+        return PageGroup(num_columns=self.num_columns, type=config.TAIL_PAGE, dictionaries=self.page_dictionaries(), page_size=self.page_size)
+
+    # mapped pages have to keep the raw layout of the file, so dictionary encoding is only used without mmap
+    def page_dictionaries(self):
+        return {} if config.MMAP_PAGES else self.dictionaries
+
     def save_page_range(self, page_range):
         page_range_number = len(self.page_ranges)
         #0 index so the len gives the next number since we havent appended yet
 
         if not os.path.exists(self.path):
             os.makedirs(self.path)
-        # check if table directory already exists
-        if os.path.isdir(f"{self.path}/{page_range_number}"):
+        # check if the page range already exists
+        if os.path.isfile(self.segment_path(page_range_number)):
             print(f"error: A page range #{page_range_number} already exists")
             return None
 
-        # create page range directory
-        os.mkdir(f"{self.path}/{page_range_number}")
-
-        # make folder with page_range name in db/table/
-        for i in range(len(page_range.base_pages)):
-            # make folder with base page number (page_range.base_pages[i] is the i'th file)
-            os.mkdir(f"{self.path}/{page_range_number}/b{i}")
-            # TAIL PAGES: os.mkdir(f"{self.path}/{page_range_number}/t{i}")
-
-            for j in range(len(page_range.base_pages[i].pages)):
-                # make file with column num (page_range.base_pages[i].pages[j] is the j'th file)
-                path = f"{self.path}/{page_range_number}/b{i}"
-                self.save_column(path=path, path_column=j, page=page_range.base_pages[i].pages[j])
-                # TAIL PAGES: t{i}/col{j}
+        # write every base page of the range into a new segment file in one write
+        segment = self.segment(page_range_number, page_range)
+        segment.write_range(page_range)
+        if config.MMAP_PAGES:
+            segment.attach_range(page_range)
         self.page_ranges.append(page_range)
         self.latest_page_range+=1
 
     def save_tail_page(self, tail_page, page_range_number):
         # ensure that page range exists
-        if os.path.isdir(f"{self.path}/{page_range_number}")==False:
+        if os.path.isfile(self.segment_path(page_range_number))==False:
             print(f"error: Page range #{page_range_number} does not exist")
             return False
-        
-        num_folders = 0
-        # count the number of tail pages that already exist by getting every folder inside the page range and subtracting the 16 base pages
-        for dir in os.listdir(f"{self.path}/{page_range_number}"):
-            if os.path.isdir(dir):
-                num_folders += 1
-        tail_page_number = num_folders-16 # remove 16 base pages
-
-        os.mkdir(f"{self.path}/{page_range_number}/t{tail_page_number}")
-
-        # create columns
-        for i in range(len(tail_page.pages)):
-                path = f"{self.path}/{page_range_number}/t{tail_page_number}"
-                self.save_column(path=path, path_column=i, page=tail_page.pages[i])
-        # add the tail page to the page range in memory
-        self.page_ranges[page_range_number].tail_pages.append(tail_page)
-        if self.page_ranges[page_range_number].latest_tail_page==None:
-            self.page_ranges[page_range_number].latest_tail_page = 0
-        else: self.page_ranges[page_range_number].latest_tail_page += 1
 
-        # make sure to replace the `page_range.tail_pages.append()` with a call to this function. you can get page_range_number with `len(self.table.page_ranges)` before calling this func
-        return True
+        page_range = self.page_ranges[page_range_number]
+        tail_page_number = len(page_range.tail_pages)
 
-    def save_column(self, path, path_column, page):
-        file_path = f"{path}/col{path_column}.bin" 
-        metadata_path = f"{path}/col{path_column}.json"
+        # the tail page goes in the slots right after the last tail page of the segment
+        segment = self.segment(page_range_number)
+        segment.write_group(segment.tail_slot(tail_page_number, 0), tail_page)
+        if config.MMAP_PAGES:
+            segment.attach_group(segment.tail_slot(tail_page_number, 0), tail_page)
 
-        # write page.data to data file
-        with open(file_path, 'wb+') as data_file:
-            data_file.write(page.data)
-            # data_file.close()
+        # add the tail page to the page range in memory
+        page_range.tail_pages.append(tail_page)
+        if page_range.latest_tail_page==None:
+            page_range.latest_tail_page = 0
+        else: page_range.latest_tail_page += 1
 
-        # turn metadata to json
-        phys_page_metadata = {
-            "num_records" : page.num_records
-        }
+        # make sure to replace the `page_range.tail_pages.append()` with a call to this function. you can get page_range_number with `len(self.table.page_ranges)` before calling this func
+        return True
 
-        # write to metadata file
-        with open(metadata_path, 'w') as metadata_file:
-            json.dump(phys_page_metadata, metadata_file) 
-            # metadara_file.close()
+    # write the whole page range back to its segment file
+    def flush_page_range(self, page_range_number):
+        page_range = self.page_ranges[page_range_number]
+        if config.MMAP_PAGES:
+            # the pages already live in the mapping, only the headers need writing before msync
+            self.segment(page_range_number, page_range).sync_range(page_range)
+        else:
+            # page ranges that no longer take inserts are cold, compress them
+            cold = config.COMPRESS_COLD_PAGES and page_range_number != self.latest_page_range - 1
+            self.segment(page_range_number, page_range).write_range(page_range, compress=cold)
+        for _, page in self.range_pages(page_range_number):
+            page.take_dirty()
+
+    # every page of the page range with its segment slot: [(slot, page)]
+    def range_pages(self, page_range_number):
+        page_range = self.page_ranges[page_range_number]
+        segment = self.segment(page_range_number, page_range)
+        slot_pages = []
+        for i, base_page in enumerate(page_range.base_pages):
+            slot_pages.extend((segment.base_slot(i, column), page) for column, page in enumerate(base_page.pages))
+        for i, tail_page in enumerate(page_range.tail_pages):
+            slot_pages.extend((segment.tail_slot(i, column), page) for column, page in enumerate(tail_page.pages))
+        return slot_pages
+
+    '''
+    Write the pages of the page range that changed since they were last written (inserts and tail records
+    go straight to the page ranges, the bufferpool writes back the pages it dirtied), see Database.close
+    Only their changed slots are written, unless the range got new page groups or its segment is packed:
+    then the range is written whole by flush_page_range, in one write and packed again if it is cold
+    Returns the number of pages written, 0 for a clean range, whose file isn't touched
+    '''
+    def write_back_page_range(self, page_range_number, new_groups=False):
+        segment = self.segment(page_range_number)
+        dirty = [(slot, page) for slot, page in self.range_pages(page_range_number) if page.is_dirty()]
+        if new_groups or not os.path.exists(segment.path):
+            self.flush_page_range(page_range_number)
+            return len(self.range_pages(page_range_number))
+        if not dirty:
+            return 0
+        if config.MMAP_PAGES:
+            segment.sync_pages(dirty)
+            for _, page in dirty:
+                page.take_dirty()
+        elif segment.is_packed():
+            self.flush_page_range(page_range_number)
+        else:
+            segment.write_dirty([(slot, page, page.take_dirty()) for slot, page in dirty])
+        return len(dirty)
+
+    '''
+    B+tree index files: {path}/{column}.btree, one node per slot
+    '''
+    def index_segment(self, column):
+        if column not in self.index_segments:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            self.index_segments[column] = Segment(f"{self.path}/{column}.btree", pages_per_group=1, num_base_groups=0, page_size=config.ARRAY_SIZE)
+        return self.index_segments[column]
+
+    def close_index_segment(self, column):
+        self.index_segments.pop(column, None)
+
+    # attach the B+tree indices found in the table directory
+    def open_disk_indices(self):
+        for file_name in os.listdir(self.path):
+            if file_name.endswith(".btree") and file_name[:-6].isdigit():
+                self.index.attach_disk_index(self, int(file_name[:-6]))
+
+    def segment_path(self, page_range_number):
+        return f"{self.path}/{page_range_number}.seg"
+
+    def segment(self, page_range_number, page_range=None):
+        if page_range_number not in self.segments:
+            if page_range is None:
+                page_range = self.page_ranges[page_range_number]
+            self.segments[page_range_number] = Segment(self.segment_path(page_range_number), pages_per_group=page_range.num_columns+5, num_base_groups=self.page_range_size, page_size=self.page_size)
+        return self.segments[page_range_number]
 
     def open_page_ranges(self):
         
@@ -197,116 +347,50 @@ class Table:
         currdir = self.path
         range_pairs = []
         for dir in os.listdir(currdir):
-            if dir.isdigit():  # Check if the entry is a number (folder name)
-                folder_path = os.path.join(currdir, dir)
-                json_path = os.path.join(currdir, f"{dir}.json")
-
-                if os.path.isdir(folder_path) and os.path.isfile(json_path):
-                    range_pairs.append((folder_path, json_path))
-
-                # order pairs numerically
-                range_pairs.sort(key=lambda x: int(os.path.basename(x[0])))
-
-                # iterate through the pairs
-                for path_folder, path_json in range_pairs:
-                    # inside each page range, read the metadata
-                    with open(path_json, "r") as range_metadata:
-                        data = json.load(range_metadata)
-                    
-                    # get data from json
-                    num_columns = data["num_columns"]
-                    latest_bp = data["latest_base_page"]
-                    latest_tp = data["latest_tail_page"]
-
-                    # use the data to create a page range object
-                    new_range = pageRange(num_columns=num_columns, latest_bp=latest_bp, latest_tp=latest_tp, new=False)
-                    # then go into the page range folder and use os to see all base and tail pages
-                    self.open_page_groups(new_range, path_folder)
-                    # add page range to table
-                    self.page_ranges.append(new_range)
-
-    def open_page_groups(self, page_range, path_folder):
-        base_pairs = []
-        tail_pairs = []
-
-        for dir in os.listdir(path_folder):
-            if dir.startswith("b") and dir[1:].isdigit():  # Check if base
-                num = int(dir[1:])  # get number
-                folder_path = os.path.join(path_folder, dir)
-                json_path = os.path.join(path_folder, f"b{num}.json")
-                if os.path.isdir(folder_path) and os.path.isfile(json_path):
-                    base_pairs.append((folder_path, json_path))
-
-            elif dir.startswith("t") and dir[1:].isdigit():  # Check if tail
-                num = int(dir[1:])  # get number
-                folder_path = os.path.join(path_folder, dir)
-                json_path = os.path.join(path_folder, f"t{num}.json")
-                if os.path.isdir(folder_path) and os.path.isfile(json_path):
-                    tail_pairs.append((folder_path, json_path))
+            if dir.endswith(".seg") and dir[:-4].isdigit():  # Check if the entry is a segment file
+                segment_path = os.path.join(currdir, dir)
+                json_path = os.path.join(currdir, f"{dir[:-4]}.json")
 
-        # order pairs numerically
-        base_pairs.sort(key=lambda x: int(os.path.basename(x[0])[1:]))
-        tail_pairs.sort(key=lambda x: int(os.path.basename(x[0])[1:]))
-        
-        # iterate through the base pairs
-        for path_folder, path_json in base_pairs:
-            # read the metadata, use it to create page group objects
-            with open(path_json, "r") as base_page_metadata:
-                data = json.load(base_page_metadata)
-            
-            # get data from json
-            latest_record_number = data["latest_record_number"]
+                if os.path.isfile(json_path):
+                    range_pairs.append((segment_path, json_path))
 
-            # use the data to create a page group object
-            new_base_page = PageGroup(num_columns=page_range.num_columns, type=config.BASE_PAGE, latest_record_number=latest_record_number)
-            # then go into base page folder and use os to see all phys pages
-            self.open_phys_pages(new_base_page, path_folder)
-            # add base page to table
-            page_range.base_pages.append(new_base_page)
+        # order pairs numerically
+        range_pairs.sort(key=lambda x: int(os.path.basename(x[0])[:-4]))
 
-        for path_folder, path_json in tail_pairs:
-            # read the metadata, use it to create page group objects
-            with open(path_json, "r") as tail_page_metadata:
-                data = json.load(tail_page_metadata)
+        # iterate through the pairs
+        for path_segment, path_json in range_pairs:
+            # inside each page range, read the metadata
+            with open(path_json, "r") as range_metadata:
+                data = json.load(range_metadata)
             
             # get data from json
-            latest_record_number = data["latest_record_number"]
+            num_columns = data["num_columns"]
+            latest_bp = data["latest_base_page"]
+            latest_tp = data["latest_tail_page"]
+
+            # use the data to create a page range object
+            new_range = pageRange(num_columns=num_columns, latest_bp=latest_bp, latest_tp=latest_tp, new=False, dictionaries=self.page_dictionaries(), page_size=self.page_size, range_size=self.page_range_size)
+            # then read the segment file and rebuild the base and tail pages
+            self.open_page_groups(new_range, int(os.path.basename(path_segment)[:-4]), data)
+            # add page range to table
+            self.page_ranges.append(new_range)
+
+    def open_page_groups(self, page_range, page_range_number, range_metadata):
+        # the whole segment is read with a single read, or mapped when using mmap pages
+        segment = self.segment(page_range_number, page_range)
+        if config.MMAP_PAGES:
+            base_groups, tail_groups = segment.map_range()
+        else:
+            base_groups, tail_groups = segment.read_range()
+
+        for i, pages in enumerate(base_groups):
+            new_base_page = PageGroup(num_columns=page_range.num_columns, type=config.BASE_PAGE, latest_record_number=range_metadata["base_records"][i], page_size=self.page_size)
+            new_base_page.pages = pages
+            new_base_page.encode_dictionaries(self.page_dictionaries())
+            page_range.base_pages.append(new_base_page)
 
-            # use the data to create a page group object
-            new_tail_page = PageGroup(num_columns=page_range.num_columns, type=config.TAIL_PAGE, latest_record_number=latest_record_number)
-            
-            # TODO: i think bringing the phys pages to memory goes against the entire point of the buffer pool. the metadata that the page has isnt needed either, as the page groups already track what their next open page is.
-            # # then go into tail page folder and use os to see all phys pages
-            # self.open_phys_pages(new_tail_page, path_folder)
-            
-            # add base page to table
+        for i, pages in enumerate(tail_groups):
+            new_tail_page = PageGroup(num_columns=page_range.num_columns, type=config.TAIL_PAGE, latest_record_number=range_metadata["tail_records"][i], page_size=self.page_size)
+            new_tail_page.pages = pages
+            new_tail_page.encode_dictionaries(self.page_dictionaries())
             page_range.tail_pages.append(new_tail_page)
-
-    # def open_phys_pages(self, page_group, path_folder):
-    #     # use os to see all phys page in dir
-    #     page_pairs = []
-    #     for dir in os.listdir(path_folder):
-    #         if dir.startswith("col") and dir[3:].isdigit():  # Check if column file
-    #             bin_path = os.path.join(path_folder, f"col{dir}.bin")
-    #             json_path = os.path.join(path_folder, f"col{dir}.json")
-
-    #             if os.path.isfile(bin_path) and os.path.isfile(json_path):
-    #                 page_pairs.append((bin_path, json_path))
-
-    #             # order pairs numerically
-    #             page_pairs.sort(key=lambda x: int(os.path.basename(x[0])))
-
-    #             # iterate through the pairs
-    #             for path_folder, path_json in page_pairs:
-    #                 # inside each page range, read the metadata
-    #                 with open(path_json, "r") as page_metadata:
-    #                     data = json.load(page_metadata)
-                    
-    #                 # get data from json
-    #                 num_records = data["num_records"]
-
-    #                 # use the data to create a page range object
-    #                 new_page = Page(num_records=num_records)
-    #                 # add page to page group
-    #                 page_group.append(new_page)
-
@@ -0,0 +1,77 @@
+def test_btree_operations():
+    import random
+    import tempfile
+    from collections import defaultdict
+    from lstore.table import Table
+    from lstore.index import Index
+    from lstore.bufferpool import Bufferpool
+    from lstore.btree import BTreeIndex
+
+    path = tempfile.mkdtemp()
+    table = Table("Tree", f"{path}/Tree", 2, 0, {}, None, index=Index("Tree"))
+    # a pool much smaller than the tree, so nodes are evicted and read back
+    table.attach_bufferpool(Bufferpool(8))
+    tree = BTreeIndex(table, 6)
+
+    # Random inserts and removes with duplicate keys, checked against a dict of lists
+    rng = random.Random(21)
+    model = defaultdict(list)
+    for i in range(8000):
+        key = rng.randint(0, 300)
+        if rng.random() < 0.7 or not model[key]:
+            rid = rng.randint(1, 10**6)
+            tree.add(key, rid)
+            model[key].append(rid)
+        else:
+            rid = rng.choice(model[key])
+            assert tree.remove(key, rid), "Remove of an existing entry failed"
+            model[key].remove(rid)
+    for key in range(301):
+        assert sorted(tree.get(key, [])) == sorted(model[key]), f"Lookup mismatch for key {key}"
+    assert len(tree) == sum(len(rids) for rids in model.values()), "Entry count mismatch"
+    assert tree.remove(1000, 1) is False, "Removing a missing entry should fail"
+    assert sorted(tree.locate_range(10, 20)) == sorted(rid for key in range(10, 21) for rid in model[key]), "Range mismatch"
+    assert list(tree.irange(10, 12)) == [key for key in range(10, 13) if model[key]], "Distinct keys mismatch"
+
+    # The tree survives being written back and opened again through another pool
+    table.bufferpool.flush()
+    table.attach_bufferpool(Bufferpool(4))
+    reopened = BTreeIndex(table, 6)
+    assert sorted(reopened[5]) == sorted(model[5]), "Reopened tree mismatch"
+
+test_btree_operations()
+
+
+def test_btree_bulk_load_and_index():
+    import os
+    import tempfile
+    from lstore.table import Table
+    from lstore.index import Index
+    from lstore.query import Query
+    from lstore.bufferpool import Bufferpool
+    from lstore.btree import BTreeIndex, ORDER
+    from lstore import config
+
+    path = tempfile.mkdtemp()
+    table = Table("Bulk", f"{path}/Bulk", 3, 0, {}, None, index=Index("Bulk"))
+    table.index.save_index = lambda: None
+    table.attach_bufferpool(Bufferpool(16))
+    query = Query(table)
+    query.insert_many([(i, i % 7, i) for i in range(1, 20001)])
+
+    # The primary key index moves to disk and a secondary index is bulk loaded from a scan
+    assert table.index.create_index(config.PRIMARY_KEY_COLUMN, table, disk=True), "Primary key index should move to disk"
+    assert table.index.create_index(6, table, disk=True), "Disk index creation failed"
+    tree = table.index.indices[6]
+    assert isinstance(tree, BTreeIndex) and len(tree) == 20000, "Bulk loaded entry count mismatch"
+    leaves = -(-20000 // int(ORDER * config.BTREE_FILL_FACTOR))
+    assert tree.meta()[1] == 1 + leaves + 1, "Bulk load should fill leaves and build one root"
+    assert sorted(table.index.locate(3, 6)) == [i for i in range(1, 20001) if i % 7 == 3], "Secondary lookup mismatch"
+    assert table.index.locate_range(100, 120) == list(range(100, 121)), "Primary key range mismatch"
+    assert query.select(555, 0, [1, 1, 1])[0].columns == [555, 2, 555], "Select through the disk index mismatch"
+
+    # Dropping the index deletes its file
+    assert table.index.drop_index(6)
+    assert not os.path.exists(f"{path}/Bulk/6.btree"), "Index file should be removed"
+
+test_btree_bulk_load_and_index()
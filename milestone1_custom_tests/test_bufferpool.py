@@ -0,0 +1,533 @@
+'''
+Standalone table in a temporary directory holding rows, with a Query on it
+rows are inserted through bufferpool. with flushed=True they go through a throwaway pool instead, every page
+range is written to its segment and only then is bufferpool attached, so it starts out empty
+'''
+def make_table(name, rows, bufferpool=None, flushed=False, **table_args):
+    import tempfile
+    from lstore.table import Table
+    from lstore.index import Index
+    from lstore.query import Query
+    from lstore.bufferpool import Bufferpool
+
+    path = tempfile.mkdtemp()
+    # the index pickle goes to the temporary directory too
+    table = Table(name, f"{path}/{name}", len(rows[0]), 0, {}, None, index=Index(f"{path}/{name}"), **table_args)
+    table.attach_bufferpool(Bufferpool() if flushed or bufferpool is None else bufferpool)
+    query = Query(table)
+    query.insert_many(rows)
+    if flushed:
+        for page_range_number in range(len(table.page_ranges)):
+            table.flush_page_range(page_range_number)
+        if bufferpool is not None:
+            table.attach_bufferpool(bufferpool)
+    return table, query
+
+
+def test_bufferpool_page_table():
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    bufferpool = Bufferpool(2)
+    table, query = make_table("Grades", [(i, i * 2, 7) for i in range(1, 601)], bufferpool, flushed=True)
+
+    # A miss reads the page from its segment slot and registers it in the page table
+    page = bufferpool.getBufferpoolPage(550, config.PRIMARY_KEY_COLUMN + 1, table)
+    page_id = ("Grades", 0, 1, config.BASE_PAGE, config.PRIMARY_KEY_COLUMN + 1)
+    assert page_id in bufferpool.page_table, "Page id missing from the page table"
+    assert page.read(550 - 513) == 1100, "Page read from disk mismatch"
+
+    # A hit is served from the same frame
+    assert bufferpool.getBufferpoolPage(513, config.PRIMARY_KEY_COLUMN + 1, table) is page, "Hit should return the cached page"
+    assert bufferpool.size == 1 and len(bufferpool.free_frames) == 1, "Hit should not take a frame"
+
+    # Filling the pool evicts a page and hands its frame back out
+    bufferpool.getBufferpoolPage(1, config.PRIMARY_KEY_COLUMN, table)
+    bufferpool.getBufferpoolPage(1, config.PRIMARY_KEY_COLUMN + 2, table)
+    assert bufferpool.size == 2 and len(bufferpool.page_table) == 2, "Pool should stay at max size"
+    assert not bufferpool.free_frames, "Every frame should be in use"
+
+test_bufferpool_page_table()
+
+
+def test_eviction_policies():
+    from lstore.bufferpool import Frame
+    from lstore.eviction import make_policy
+
+    expected = {"lru": 2, "clock": 0, "2q": 0, "lru-k": 2}
+    for name, victim in expected.items():
+        frames = [Frame() for _ in range(3)]
+        policy = make_policy(name, 3)
+        for i in range(3):
+            policy.admit(i, ("T", 0, i, 0, 5))
+        policy.access(0)
+        frames[1].curr_pins = 1
+        assert policy.victim(frames) == victim, f"{name} picked the wrong victim"
+
+        # a fully pinned pool has no victim
+        for frame in frames:
+            frame.curr_pins = 1
+        assert policy.victim(frames) is None, f"{name} should not evict pinned frames"
+
+    # 2Q promotes a page that comes back while it is remembered
+    policy = make_policy("2q", 3)
+    policy.admit(0, "page")
+    policy.remove(0)
+    policy.admit(1, "page")
+    assert 1 in policy.am, "Returning page should enter the main queue"
+
+    try:
+        make_policy("random", 3)
+        assert False, "Unknown policy should be rejected"
+    except ValueError:
+        pass
+
+test_eviction_policies()
+
+
+def test_eviction_zipf_workload():
+    import numpy as np
+    from lstore.bufferpool import Bufferpool
+    from lstore.eviction import POLICIES
+    from lstore import config
+
+    table, query = make_table("Zipf", [(i, i * 3) for i in range(1, 8001)], flushed=True)
+
+    rids = np.minimum(np.random.default_rng(0).zipf(1.3, 500), 8000)
+    for name in POLICIES:
+        bufferpool = Bufferpool(4, name)
+        for rid in rids.tolist():
+            _, base_page_num, record_num = table.page_directory[rid]
+            page = bufferpool.getBufferpoolPage(rid, config.PRIMARY_KEY_COLUMN + 1, table)
+            assert page.read(record_num) == rid * 3, f"{name} returned the wrong page"
+        assert bufferpool.size == 4 and len(bufferpool.page_table) == 4, f"{name} overfilled the pool"
+
+test_eviction_zipf_workload()
+
+
+def test_bufferpool_pin():
+    from lstore.bufferpool import Bufferpool, PoolFullError
+    from lstore import config
+
+    bufferpool = Bufferpool(8)
+    table, query = make_table("Pins", [(i, i * 4) for i in range(1, 11)], bufferpool)
+
+    # Writes through a query pin the page group and leave it dirty
+    page_id = table.page_id(0, 0, config.BASE_PAGE, config.PRIMARY_KEY_COLUMN + 1)
+    frame = bufferpool.frames[bufferpool.page_table[page_id]]
+    assert frame.dirty and frame.curr_pins == 0, "Written pages should be dirty and unpinned"
+
+    # The pinned page is the table's own page, and a pinned frame is never evicted
+    with bufferpool.pin(page_id) as page:
+        assert page is table.page_ranges[0].base_pages[0].pages[config.PRIMARY_KEY_COLUMN + 1], "Frame should share the table's page"
+        assert frame.curr_pins == 1, "Pin count mismatch"
+        for _ in range(8):
+            bufferpool.purge()
+        assert page_id in bufferpool.page_table, "Pinned page was evicted"
+    assert frame.curr_pins == 0, "Page should be unpinned on exit"
+
+    # When every frame is pinned a pin fails instead of evicting
+    page_ids = table.group_page_ids(0, 0, config.BASE_PAGE) + [table.page_id(0, 1, config.BASE_PAGE, 0)]
+    with bufferpool.pin_many(page_ids):
+        try:
+            with bufferpool.pin(table.page_id(0, 1, config.BASE_PAGE, 1)):
+                assert False, "Pin should fail on a fully pinned pool"
+        except PoolFullError:
+            pass
+    assert all(frame.curr_pins == 0 for frame in bufferpool.frames), "Failed pin should release its frames"
+
+    # Queries that can't pin their pages return False instead of raising
+    page_ids = table.group_page_ids(0, 1, config.BASE_PAGE) + [table.page_id(0, 2, config.BASE_PAGE, 0)]
+    with bufferpool.pin_many(page_ids):
+        assert query.select(5, 0, [1, 1]) is False, "Select on a fully pinned pool should fail"
+        assert query.sum(1, 10, 1) is False, "Sum on a fully pinned pool should fail"
+        assert query.update(5, None, 0) is False, "Update on a fully pinned pool should fail"
+        assert query.increment(5, 1) is False, "Increment on a fully pinned pool should fail"
+    assert query.select(5, 0, [1, 1])[0].columns == [5, 20], "Select should work again once pages are unpinned"
+
+    # Index builds read the column through the bufferpool
+    table.index.save_index = lambda: None
+    assert table.index.create_index(config.PRIMARY_KEY_COLUMN + 1, table), "Index build failed"
+    assert table.index.locate(12, config.PRIMARY_KEY_COLUMN + 1) == [3], "Built index mismatch"
+
+test_bufferpool_pin()
+
+
+def test_bufferpool_select_pins():
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    bufferpool = Bufferpool(64)
+    table, query = make_table("Projection", [(i, i * 2, i * 3) for i in range(1, 11)], bufferpool, flushed=True)
+
+    # A select only pins the indirection column and the projected columns of the base record
+    assert query.select(5, 0, [1, 0, 1])[0].columns == [5, None, 15], "Select mismatch"
+    expected = table.group_page_ids(0, 0, config.BASE_PAGE, (config.INDIRECTION_COLUMN, 5, 7))
+    assert set(bufferpool.page_table) == set(expected), "Select pinned pages it doesn't read"
+
+test_bufferpool_select_pins()
+
+
+def test_table_without_bufferpool():
+    import tempfile
+    from lstore.table import Table
+    from lstore.index import Index
+    from lstore.query import Query
+    from lstore import config
+
+    # A standalone table that never attached a bufferpool reads and writes its page ranges directly
+    path = tempfile.mkdtemp()
+    table = Table("Unpooled", f"{path}/Unpooled", 3, 0, {}, None, index=Index(f"{path}/Unpooled"))
+    query = Query(table)
+    assert query.insert_many([(i, i % 5, i * 2) for i in range(1, 1001)]), "Insert without a bufferpool failed"
+    assert query.select(7, 0, [1, 1, 1])[0].columns == [7, 2, 14], "Select without a bufferpool mismatch"
+    assert query.sum(1, 1000, 2) == sum(i * 2 for i in range(1, 1001)), "Sum without a bufferpool mismatch"
+    assert table.index.create_index(6, table) and len(table.index.locate(2, 6)) == 200, "Index build without a bufferpool failed"
+    assert table.index.create_index(7, table, disk=True) is False, "A disk index needs a bufferpool"
+    assert table.bufferpool is None, "No bufferpool should be created"
+    table.flush_page_range(0)
+
+test_table_without_bufferpool()
+
+
+def test_bufferpool_write_behind():
+    import time
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    bufferpool = Bufferpool(16)
+    table, query = make_table("Flush", [(i, i * 5) for i in range(1, 601)], bufferpool)
+    assert bufferpool.dirty_ratio() == 14 / 16, "Both base page groups should be dirty"
+
+    # One flush writes every dirty page, one write per run of adjacent slots
+    assert bufferpool.flush() == 14, "Every dirty page should be written"
+    assert bufferpool.dirty_ratio() == 0, "Flushed frames should be clean"
+    segment = table.segment(0)
+    page = segment.read_page(segment.base_slot(1, config.PRIMARY_KEY_COLUMN + 1))
+    assert page.num_records == 88 and page.read(87) == 3000, "Flushed page mismatch"
+
+    # The background flusher drains the pool once the high watermark is passed
+    bufferpool.start_flusher()
+    query.insert_many([(i, i * 5) for i in range(601, 701)])
+    deadline = time.time() + 5
+    while bufferpool.dirty_ratio() >= config.DIRTY_HIGH_WATERMARK and time.time() < deadline:
+        time.sleep(config.FLUSH_INTERVAL)
+    bufferpool.stop_flusher()
+    assert bufferpool.dirty_ratio() < config.DIRTY_HIGH_WATERMARK, "Flusher should bring the dirty ratio down"
+    flushed = [frame for frame in bufferpool.frames if not frame.empty and not frame.dirty]
+    assert len(flushed) >= 5, "Flusher should write down to the low watermark"
+    for frame in flushed:
+        assert bytes(segment.read_page(frame.slot).data) == bytes(frame.page.data), "Page written by the flusher mismatch"
+
+test_bufferpool_write_behind()
+
+
+def test_bufferpool_read_ahead():
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    bufferpool = Bufferpool(64)
+    table, query = make_table("Scan", [(i, i) for i in range(1, 4001)], bufferpool, flushed=True)
+    read_ahead = bufferpool.read_ahead
+
+    # Without mmap, base pages stay loaded in the page ranges, so there is nothing to read ahead
+    columns = (config.PRIMARY_KEY_COLUMN, config.RID_COLUMN)
+    assert read_ahead.access(table, 0, 0, columns) == 0 and read_ahead.access(table, 0, 1, columns) == 0, "In-memory pages need no read-ahead"
+    assert read_ahead.submit(table.group_page_ids(0, 1, config.BASE_PAGE), table) is False, "Resident pages should not be prefetched"
+    assert read_ahead.executor is None, "No read-ahead thread should start for resident pages"
+
+    # A bulk loaded B+tree has its leaves in node order: 1, 2, 3, ...
+    assert table.index.create_index(6, table, disk=True), "Disk index creation failed"
+    bufferpool.flush()
+    for frame_index in list(bufferpool.page_table.values()):
+        bufferpool.evict(frame_index)
+
+    # A single access is not a sequential run
+    assert read_ahead.access(table, 0, 1, [6], page_type=config.INDEX_PAGE) == 0, "Read-ahead should wait for a sequential run"
+    # The second leaf in a row prefetches the next window
+    assert read_ahead.access(table, 0, 2, [6], page_type=config.INDEX_PAGE) == config.READ_AHEAD_PAGES, "Read-ahead window mismatch"
+    # Nodes that were already prefetched are not scheduled again
+    assert read_ahead.access(table, 0, 3, [6], page_type=config.INDEX_PAGE) == 1, "Read-ahead should only extend the window"
+    read_ahead.shutdown()
+    for node in range(3, 3 + config.READ_AHEAD_PAGES + 1):
+        assert (table.name, 0, node, config.INDEX_PAGE, 6) in bufferpool.page_table, "Prefetched node missing from the bufferpool"
+
+    # A range lookup walking the leaves finds most of them already loaded
+    for frame_index in list(bufferpool.page_table.values()):
+        bufferpool.evict(frame_index)
+    hits = bufferpool.stats()["pool"]["hits"]
+    assert table.index.locate_range(1, 4000, 6) == list(range(1, 4001)), "Range lookup mismatch"
+    read_ahead.shutdown()
+    assert bufferpool.stats()["pool"]["hits"] > hits, "Leaf scan should hit prefetched nodes"
+
+    # With mmap, base pages are views the OS faults in, so a sequential base scan asks the OS to read ahead
+    mmap_pages = config.MMAP_PAGES
+    config.MMAP_PAGES = True
+    try:
+        bufferpool = Bufferpool(64)
+        table, query = make_table("MappedScan", [(i, i) for i in range(1, 4001)], bufferpool)
+        segment = table.segment(0)
+        advised = []
+        will_need = segment.will_need
+        def record_will_need(slots):
+            advised.extend(slots)
+            return will_need(slots)
+        segment.will_need = record_will_need
+
+        read_ahead = bufferpool.read_ahead
+        assert read_ahead.access(table, 0, 0, columns) == 0, "Read-ahead should wait for a sequential run"
+        assert read_ahead.access(table, 0, 1, columns) == config.READ_AHEAD_PAGES, "Read-ahead window mismatch"
+        expected = [segment.base_slot(group, column) for group in range(2, 2 + config.READ_AHEAD_PAGES) for column in columns]
+        assert sorted(advised) == sorted(expected), "Advised slots mismatch"
+        assert read_ahead.executor is None, "Mapped pages are advised without a thread"
+
+        # A sum scans the base pages through the read-ahead
+        read_ahead.shutdown()
+        advised.clear()
+        assert query.sum(1, 4000, 1) == sum(range(1, 4001)), "Sum mismatch"
+        assert len(advised) > 0, "Sum should read ahead"
+    finally:
+        config.MMAP_PAGES = mmap_pages
+
+test_bufferpool_read_ahead()
+
+
+def test_bufferpool_scan_ring():
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    # with several partitions the ring has to make room in the partition each page hashes to
+    for partitions in (config.BUFFERPOOL_PARTITIONS, 1):
+        bufferpool = Bufferpool(64, partitions=partitions)
+        table, query = make_table("Ring", [(i, 1) for i in range(1, 8001)], bufferpool, flushed=True)
+
+        # The point query working set: the pages selects read in the first 8 base page groups
+        for key in range(1, 8 * 512, 512):
+            query.select(key, 0, [1, 1])
+        hot = list(bufferpool.page_table)
+
+        # A full scan loads every base page group but only recycles its own ring of frames
+        assert query.sum(1, 8000, 1) == 8000, "Sum mismatch"
+        bufferpool.read_ahead.shutdown()
+        assert all(page_id in bufferpool.page_table for page_id in hot), f"Scan evicted the point query pages ({partitions} partitions)"
+        assert bufferpool.size <= len(hot) + config.SCAN_RING_SIZE, f"Scan used more than its ring ({partitions} partitions)"
+
+    # The ring recycles its oldest page once it is full
+    for i in list(bufferpool.page_table.values()):
+        bufferpool.evict(i)
+    with bufferpool.ring(2) as ring:
+        page_ids = [table.page_id(0, group, config.BASE_PAGE, config.TIMESTAMP_COLUMN) for group in range(3)]
+        for page_id in page_ids:
+            with ring.pin(page_id):
+                pass
+        assert page_ids[0] not in bufferpool.page_table and page_ids[2] in bufferpool.page_table, "Ring should reuse its oldest frame"
+
+test_bufferpool_scan_ring()
+
+
+def test_bufferpool_partitions():
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    # The frames and the byte budget are split over the partitions
+    bufferpool = Bufferpool(10, partitions=4)
+    assert [len(partition.frames) for partition in bufferpool.partitions] == [3, 3, 2, 2], "Frames should be split evenly"
+    assert sum(partition.max_bytes for partition in bufferpool.partitions) == 10 * config.ARRAY_SIZE, "Byte budget mismatch"
+    assert Bufferpool(max_bytes=4 * config.ARRAY_SIZE).max_size == 4, "Frame count should follow the byte budget"
+
+    # Pages of a table with 4x bigger pages take 4x the budget, so the pool holds a quarter as many
+    bufferpool = Bufferpool(16, max_bytes=8 * config.ARRAY_SIZE, partitions=2)
+    table, query = make_table("Wide", [(i, i) for i in range(1, 6001)], bufferpool, flushed=True, page_size=4 * config.ARRAY_SIZE, page_range_size=4)
+    for page_id in table.group_page_ids(0, 0, config.BASE_PAGE):
+        with bufferpool.pin(page_id):
+            pass
+    assert bufferpool.bytes_used <= bufferpool.max_bytes, "Pool went over its byte budget"
+    assert bufferpool.size == 2, "Every partition should hold a single wide page"
+
+    # Every page lands in the partition its page id hashes to
+    for page_id, frame_index in bufferpool.page_table.items():
+        assert bufferpool.frames[frame_index].partition is bufferpool.partition(page_id), "Page in the wrong partition"
+        assert bufferpool.frames[frame_index].page is table.resident_page(page_id), "Frame should share the table's page"
+
+test_bufferpool_partitions()
+
+
+def test_bufferpool_stats():
+    import json
+    import os
+    import threading
+    from lstore.bufferpool import Bufferpool
+    from lstore.stats import BufferpoolStats
+    from lstore import config
+
+    bufferpool = Bufferpool(4)
+    table, query = make_table("Stats", [(i, i) for i in range(1, 2001)], bufferpool, flushed=True)
+
+    page_ids = [table.page_id(0, group, config.BASE_PAGE, config.RID_COLUMN) for group in range(6)]
+    for page_id in page_ids:
+        bufferpool.get_page(page_id)
+    bufferpool.get_page(page_ids[-1])
+    with bufferpool.pin(page_ids[-1], write=True) as page:
+        page.write_column(0, page.read(0))
+    bufferpool.flush()
+
+    stats = bufferpool.stats()
+    pool = stats["pool"]
+    assert pool["misses"] == 6 and pool["hits"] == 2, "Hit and miss counts mismatch"
+    assert pool["hit_ratio"] == 2 / 8, "Hit ratio mismatch"
+    assert pool["evictions"] == 2 and pool["average_residency"] > 0, "Evictions and residency should be counted"
+    assert pool["writebacks"] == 1 and pool["bytes_written"] == config.VALUE_SIZE, "Write-back counts mismatch"
+    assert pool["size"] == 4 and pool["max_size"] == 4, "Occupancy missing from the stats"
+    assert stats["tables"]["Stats"]["misses"] == 6, "Per table counters mismatch"
+
+    # The dumper writes the stats as JSON, with a final dump on stop
+    dump_path = os.path.join(table.path, "stats.json")
+    assert bufferpool.start_stats_dump(dump_path, interval=60)
+    bufferpool.get_page(page_ids[-1])
+    assert bufferpool.stop_stats_dump()
+    with open(dump_path) as file:
+        assert json.load(file)["pool"]["hits"] == 3, "Dumped stats mismatch"
+
+    # Every thread counts into its own counters and the snapshot sums them
+    stats = BufferpoolStats()
+    def record_hits():
+        for _ in range(1000):
+            stats.record_hit("T")
+    threads = [threading.Thread(target=record_hits) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshot = stats.snapshot()
+    assert snapshot["pool"]["hits"] == 4000 and snapshot["tables"]["T"]["hits"] == 4000, "Per thread counters should add up"
+
+    # Once a thread is registered, recording doesn't wait on the stats lock
+    registered, locked, recorded = threading.Event(), threading.Event(), threading.Event()
+    def record_miss():
+        stats.record("T", "misses")
+        registered.set()
+        locked.wait()
+        stats.record("T", "misses")
+        recorded.set()
+    thread = threading.Thread(target=record_miss)
+    thread.start()
+    registered.wait()
+    with stats.lock:
+        locked.set()
+        assert recorded.wait(5), "Recording should not take the stats lock"
+    thread.join()
+    assert stats.snapshot()["pool"]["misses"] == 2, "Miss count mismatch"
+
+    # Disabled stats count nothing, neither for the pool nor per table
+    stats = BufferpoolStats(enabled=False)
+    stats.record_hit("T")
+    stats.record_miss("T")
+    stats.record("T", "evictions")
+    assert stats.snapshot() == {"pool": BufferpoolStats().snapshot()["pool"], "tables": {}}, "Disabled stats should count nothing"
+
+test_bufferpool_stats()
+
+
+def test_bufferpool_warm_start():
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    bufferpool = Bufferpool(8)
+    table, query = make_table("Warm", [(i, i) for i in range(1, 4001)], bufferpool, flushed=True)
+    assert table.index.create_index(6, table, disk=True), "Disk index creation failed"
+    bufferpool.flush()
+    for frame_index in list(bufferpool.page_table.values()):
+        bufferpool.evict(frame_index)
+
+    base_page_id = table.page_id(0, 0, config.BASE_PAGE, config.RID_COLUMN)
+    node_ids = [(table.name, 0, node, config.INDEX_PAGE, 6) for node in range(1, 7)]
+    bufferpool.get_page(base_page_id)
+    for page_id in node_ids:
+        bufferpool.get_page(page_id)
+    bufferpool.get_page(node_ids[0])
+    saved = bufferpool.resident_page_ids()
+    assert saved[0] == node_ids[0] and saved[1] == node_ids[-1], "Resident pages should be most recent first"
+
+    # A new pool prefetches the saved B+tree nodes, skipping the table's own pages (always loaded) and nodes
+    # that no longer exist, and keeps their recency order
+    warm = Bufferpool(4)
+    table.attach_bufferpool(warm)
+    gone = [("Dropped", 0, 1, config.INDEX_PAGE, 6), (table.name, 0, 1, config.INDEX_PAGE, 7), (table.name, 0, 10000, config.INDEX_PAGE, 6)]
+    assert warm.warm_start(gone + saved) == 4, "Warm start should fill the pool"
+    warm.read_ahead.shutdown()
+    assert set(warm.page_table) == set(saved[:4]), "Warm start loaded the wrong pages"
+    assert base_page_id not in warm.page_table, "Resident pages need no warm start"
+    assert warm.stats()["pool"]["bytes_read"] == 4 * config.ARRAY_SIZE, "Warm start should read the nodes from disk"
+    warm.get_page(node_ids[1])
+    assert node_ids[0] in warm.page_table, "Most recent page should survive the first eviction"
+
+test_bufferpool_warm_start()
+
+
+def test_database_warm_start_file():
+    import json
+    import os
+    import tempfile
+    from lstore import config
+    from lstore.db import Database
+    from lstore.query import Query
+
+    def open_database(path):
+        db = Database()
+        db.run_merge = lambda: None
+        db.open(path)
+        return db
+
+    def saved_page_ids(path):
+        with open(os.path.join(path, config.WARM_START_FILE)) as warm_start_file:
+            return [tuple(page_id) for page_id in json.load(warm_start_file)]
+
+    # Without a disk index or mapped pages there is nothing to warm, so close writes no file
+    path = os.path.join(tempfile.mkdtemp(), "db")
+    db = open_database(path)
+    table = db.create_table("WarmFile", 2, 0)
+    query = Query(table)
+    query.insert_many([(i, i) for i in range(1, 2001)])
+    assert query.sum(1, 2000, 1) == sum(range(1, 2001)), "Sum mismatch"
+    db.close()
+    assert not os.path.exists(os.path.join(path, config.WARM_START_FILE)), "Nothing to warm should write no file"
+
+    # A disk index: only its B+tree nodes are saved, and the next open loads them
+    db = open_database(path)
+    table = db.get_table("WarmFile")
+    assert table.index.create_index(6, table, disk=True), "Disk index creation failed"
+    assert Query(table).sum(1, 2000, 1) == sum(range(1, 2001)), "Sum mismatch"
+    assert table.index.locate_range(1, 500, 6), "Range lookup on the disk index failed"
+    db.close()
+    saved = saved_page_ids(path)
+    assert saved and all(page_id[3] == config.INDEX_PAGE for page_id in saved), "Only B+tree nodes should be saved"
+    db = open_database(path)
+    db.bufferpool.read_ahead.shutdown()
+    assert set(saved) <= set(db.bufferpool.page_table), "Warm start should load the saved nodes"
+    db.close()
+
+    # With mapped pages the table's pages take part, and the next open asks the OS to read them
+    config.MMAP_PAGES = True
+    try:
+        path = os.path.join(tempfile.mkdtemp(), "db")
+        db = open_database(path)
+        query = Query(db.create_table("WarmMapped", 2, 0))
+        query.insert_many([(i, i) for i in range(1, 2001)])
+        assert query.sum(1, 2000, 1) == sum(range(1, 2001)), "Sum mismatch"
+        db.close()
+        saved = saved_page_ids(path)
+        assert saved and all(page_id[3] == config.BASE_PAGE for page_id in saved), "Mapped base pages should be saved"
+
+        db = open_database(path)
+        assert db.warm_start() == len(saved), "Warm start should request every saved page"
+        assert db.bufferpool.stats()["pool"]["bytes_read"] == 0, "Mapped pages are advised, not read into the pool"
+        db.close()
+    finally:
+        config.MMAP_PAGES = False
+
+    # Nothing left to warm: a stale file from an earlier close is removed
+    db = open_database(path)
+    db.close()
+    assert not os.path.exists(os.path.join(path, config.WARM_START_FILE)), "A stale warm start file should be removed"
+
+test_database_warm_start_file()
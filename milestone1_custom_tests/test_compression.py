@@ -0,0 +1,91 @@
+def test_page_codecs():
+    import numpy as np
+    from lstore import compression
+    from lstore.page import Page
+
+    # low range values -> frame of reference, sorted values -> delta, repeats -> run length
+    cases = [
+        (np.arange(512) % 7, compression.FRAME_OF_REFERENCE),
+        (np.arange(512) * 1000 + 10**12, compression.DELTA),
+        (np.repeat([5, 10**15], 256), compression.RLE),
+    ]
+    for values, expected_codec in cases:
+        page = Page(512)
+        page.values[:] = values
+        codec, payload = compression.encode_page(page.data)
+        assert codec == expected_codec, f"Expected codec {expected_codec}, got {codec}"
+        assert len(payload) < len(page.data), "Encoded page should be smaller"
+        assert compression.decode_page(codec, payload) == page.data, "Round trip mismatch"
+
+test_page_codecs()
+
+
+def test_packed_segment():
+    import os
+    import tempfile
+    from lstore.page import pageRange, PageGroup
+    from lstore.segment import Segment
+
+    path = os.path.join(tempfile.mkdtemp(), "0.seg")
+    page_range = pageRange(num_columns=3)
+    for i in range(512):
+        page_range.base_pages[0].write(0, i, 0, 0, i, i, i % 3, 7, record_number=i)
+
+    segment = Segment(path, pages_per_group=8)
+    segment.write_range(page_range, compress=True)
+    assert segment.is_packed(), "Segment should be packed"
+    assert os.path.getsize(path) < 8 * 16 * 4096 / 10, "Packed segment should be much smaller"
+
+    # reads decode transparently
+    assert segment.read_page(segment.base_slot(0, 6)).read(100) == 1, "Packed read mismatch"
+    base_groups, tail_groups = Segment(path).read_range()
+    assert base_groups[0][5].read(511) == 511, "Packed range read mismatch"
+
+    # writing a slot unpacks the file first
+    segment.write_group(segment.tail_slot(0, 0), PageGroup(num_columns=3))
+    assert not segment.is_packed(), "Segment should be unpacked after a write"
+    assert segment.read_page(segment.base_slot(0, 5)).read(511) == 511, "Unpacked read mismatch"
+
+test_packed_segment()
+
+
+def test_cold_page_range_write_back():
+    import os
+    import tempfile
+    from lstore.db import Database
+    from lstore.query import Query
+    from lstore import config
+
+    def open_database(path):
+        db = Database()
+        db.run_merge = lambda: None
+        db.open(path)
+        return db
+
+    config.COMPRESS_COLD_PAGES = True
+    try:
+        # 40 records fill 3 page ranges, the first two are cold and packed on close
+        path = os.path.join(tempfile.mkdtemp(), "db")
+        db = open_database(path)
+        Query(db.create_table("Cold", 2, 0, page_size=64, page_range_size=2)).insert_many([(i, i) for i in range(1, 41)])
+        db.close()
+
+        # Writing back a page of a cold page range packs it again instead of unpacking the file
+        db = open_database(path)
+        table = db.get_table("Cold")
+        assert table.segment(0).is_packed(), "Cold page range should be packed"
+        with db.bufferpool.pin(table.page_id(0, 0, config.BASE_PAGE, 6), write=True) as page:
+            page.write_column(3, 99)
+        assert db.bufferpool.flush() == 1, "The dirty page should be written back"
+        assert table.segment(0).is_packed(), "Write-back should keep the page range packed"
+        db.close()
+
+        db = open_database(path)
+        table = db.get_table("Cold")
+        assert table.segment(0).is_packed(), "Close should keep the page range packed"
+        assert Query(table).sum(1, 40, 1) == sum(range(1, 41)) - 4 + 99, "Written back value lost"
+        db.close()
+    finally:
+        config.COMPRESS_COLD_PAGES = False
+
+test_cold_page_range_write_back()
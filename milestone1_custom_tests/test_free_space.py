@@ -0,0 +1,42 @@
+def test_open_base_page():
+    import os
+    import tempfile
+    from lstore.db import Database
+    from lstore.query import Query
+
+    def open_database(path):
+        db = Database()
+        db.run_merge = lambda: None
+        db.open(path)
+        return db
+
+    # 8 records per 64 byte page, 2 base page groups per page range
+    path = os.path.join(tempfile.mkdtemp(), "db")
+    db = open_database(path)
+    table = db.create_table("Space", 2, 0, page_size=64, page_range_size=2)
+    query = Query(table)
+    query.insert_many([(i, i) for i in range(1, 9)])
+    assert table.page_directory[8][:2] == (0, 0), "First group should take the first 8 records"
+    assert table.open_base_page() == (0, 1), "A full group should move placement to the next group"
+
+    # The next records fill the second group, then placement moves on to a new page range
+    query.insert_many([(i, i) for i in range(9, 17)])
+    assert table.page_directory[9][:2] == (0, 1) and table.page_directory[16] == (0, 1, 7), "Second group placement mismatch"
+    assert table.open_base_page() == (1, 0) and len(table.page_ranges) == 2, "A full range should open a new page range"
+    query.insert_many([(i, i) for i in range(17, 20)])
+    assert table.page_directory[17] == (1, 0, 0), "Placement in the new range mismatch"
+    db.close()
+
+    # The open page survives a reopen, so inserts continue where they stopped
+    db = open_database(path)
+    table = db.get_table("Space")
+    assert table.open_base_page() == (1, 0), "Open base page lost on reopen"
+    assert table.page_ranges[1].base_pages[0].pages[1].num_records == 3, "Record count lost on reopen"
+    assert table.page_ranges[0].base_pages[1].pages[1].num_records == 8, "Full group lost on reopen"
+    Query(table).insert_many([(i, i) for i in range(20, 27)])
+    base_pages = table.page_ranges[1].base_pages
+    assert [base_page.pages[1].num_records for base_page in base_pages] == [8, 2], "Placement after reopen mismatch"
+    assert table.open_base_page() == (1, 1) and len(table.page_ranges) == 2, "Open base page after reopen mismatch"
+    db.close()
+
+test_open_base_page()
@@ -0,0 +1,34 @@
+def test_primary_hash_index():
+    import pickle
+    import tempfile
+    from lstore.table import Table
+    from lstore.index import Index, HashIndex
+    from lstore.query import Query
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    path = tempfile.mkdtemp()
+    table = Table("Hash", f"{path}/Hash", 2, 0, {}, None, index=Index("Hash"), bufferpool=Bufferpool())
+    query = Query(table)
+    query.insert_many([(i, i * 3) for i in range(1, 1001)])
+
+    # Point lookups go to a plain dict, no sorted keys are built for them
+    primary = table.index.indices[config.PRIMARY_KEY_COLUMN]
+    assert isinstance(primary, HashIndex), "Primary key should use the hash index"
+    assert 500 in primary and primary[500] == table.index.locate(500), "Point lookup mismatch"
+    assert query.select(500, 0, [1, 1])[0].columns == [500, 1500], "Select through the hash index mismatch"
+    assert primary.sorted_keys is None, "Point lookups should not build the sorted keys"
+
+    # The first range lookup builds the sorted keys, later changes keep them in sync
+    assert len(table.index.locate_range(10, 19)) == 10, "Range lookup mismatch"
+    table.index.addRecord(5000, 5000)
+    table.index.removeRecord(15, primary[15][0])
+    primary.update([(6000, [6000])])
+    assert list(primary.irange(14, 16)) == [14, 16], "Removed key still in the sorted keys"
+    assert list(primary.irange(4000, 7000)) == [5000, 6000], "Added keys missing from the sorted keys"
+
+    # Pickles as a dict and rebuilds the sorted keys lazily
+    restored = pickle.loads(pickle.dumps(primary))
+    assert isinstance(restored, HashIndex) and restored.sorted_keys is None and restored == primary, "Pickle round trip mismatch"
+
+test_primary_hash_index()
@@ -0,0 +1,163 @@
+def test_index_log_round_trip():
+    import os
+    import tempfile
+    from lstore.db import Database
+    from lstore.query import Query
+    from lstore.indexlog import LOG_HEADER_SIZE, RECORD_DTYPE
+    from lstore import config
+
+    def open_database(path):
+        db = Database()
+        db.run_merge = lambda: None
+        db.open(path)
+        return db
+
+    path = os.path.join(tempfile.mkdtemp(), "db")
+    db = open_database(path)
+    table = db.create_table("Log", 2, 0)
+    Query(table).insert_many([(i, i % 10) for i in range(1, 1001)])
+    table.index.create_index(6, table)
+    db.close()
+
+    # Only the changes were appended, no snapshot was written
+    log_path = f"{path}/Log.index.log"
+    assert not os.path.exists(f"{path}/Log.index"), "Small changes should not write a snapshot"
+    assert os.path.getsize(log_path) == LOG_HEADER_SIZE + 2001 * RECORD_DTYPE.itemsize, "Log size mismatch"
+
+    # Replaying the log restores both indices, and the next close only appends the new changes
+    db = open_database(path)
+    table = db.get_table("Log")
+    assert table.index.locate(500) == [500] and len(table.index.locate(3, 6)) == 100, "Replayed index mismatch"
+    table.index.removeRecord(3, 3, 6)
+    db.close()
+    assert os.path.getsize(log_path) == LOG_HEADER_SIZE + 2002 * RECORD_DTYPE.itemsize, "Close should append one record"
+
+    # A long log is compacted into a snapshot of the next generation and a new empty log
+    min_records = config.INDEX_LOG_MIN_RECORDS
+    config.INDEX_LOG_MIN_RECORDS = 0
+    try:
+        db = open_database(path)
+        table = db.get_table("Log")
+        table.index.drop_index(6)
+        db.close()
+    finally:
+        config.INDEX_LOG_MIN_RECORDS = min_records
+    assert os.path.exists(f"{path}/Log.index") and os.path.getsize(log_path) == LOG_HEADER_SIZE, "Log should be compacted"
+
+    db = open_database(path)
+    table = db.get_table("Log")
+    assert 6 not in table.index.indices and table.index.locate(999) == [999], "Snapshot mismatch"
+    db.close()
+
+test_index_log_round_trip()
+
+
+def test_index_array_snapshot():
+    import os
+    import tempfile
+    import numpy as np
+    from lstore.db import Database
+    from lstore.query import Query
+    from lstore.arrayindex import ArrayIndex
+    from lstore.hashindex import HashIndex
+    from lstore import config
+
+    def open_database(path):
+        db = Database()
+        db.run_merge = lambda: None
+        db.open(path)
+        return db
+
+    path = os.path.join(tempfile.mkdtemp(), "db")
+    min_records = config.INDEX_LOG_MIN_RECORDS
+    config.INDEX_LOG_MIN_RECORDS = 0
+    try:
+        db = open_database(path)
+        table = db.create_table("Arrays", 2, 0)
+        Query(table).insert_many([(i, i % 10) for i in range(1, 1001)])
+        table.index.removeRecord(500, 500)
+        # create_index saves the index, compacting the log
+        table.index.create_index(6, table)
+        db.close()
+    finally:
+        config.INDEX_LOG_MIN_RECORDS = min_records
+
+    # The snapshot loads secondary columns as int64 arrays, with duplicate keys sharing one key slot,
+    # and the primary key back into a hash index
+    db = open_database(path)
+    table = db.get_table("Arrays")
+    primary, secondary = table.index.indices[config.PRIMARY_KEY_COLUMN], table.index.indices[6]
+    assert isinstance(primary, HashIndex) and isinstance(secondary, ArrayIndex), "Snapshot should load a hash index and arrays"
+    assert len(primary) == 999 and 500 not in primary and primary[501] == [501], "Primary key lookup mismatch"
+    assert secondary.keys.dtype == np.int64 and secondary.keys.tolist() == list(range(10)), "Secondary key array mismatch"
+    assert secondary.offsets[-1] == 1000 and secondary[3][:2] == [3, 13], "Binary search lookup mismatch"
+    assert len(table.index.locate(3, 6)) == 100, "Duplicate key lookup mismatch"
+
+    # Changes after loading sit next to the arrays and are logged as usual
+    table.index.addRecord(500, 500)
+    table.index.removeRecord(3, 3, 6)
+    assert table.index.locate_range(499, 501) == [499, 500, 501], "Range over added key mismatch"
+    assert 3 not in table.index.locate(3, 6) and len(table.index.locate(3, 6)) == 99, "Removed RID still found"
+
+    # Compaction swaps in the new snapshot's arrays, which hold those changes
+    table.index.addRecord(2000, 2000)
+    table.index.log.compact(table.index)
+    secondary = table.index.indices[6]
+    assert isinstance(secondary, ArrayIndex) and not secondary.added and not secondary.removed, "Compaction should swap in fresh arrays"
+    assert len(secondary.keys) == 10 and len(table.index.locate(3, 6)) == 99, "Compacted index mismatch"
+    assert isinstance(table.index.indices[config.PRIMARY_KEY_COLUMN], HashIndex), "Compaction should keep the hash index"
+    assert table.index.locate_range(999, 2000) == [999, 1000, 2000] and table.index.locate(500) == [500], "Compacted primary mismatch"
+    db.close()
+
+    db = open_database(path)
+    table = db.get_table("Arrays")
+    assert table.index.locate(500) == [500] and len(table.index.locate(3, 6)) == 99, "Replay onto the arrays mismatch"
+    db.close()
+
+test_index_array_snapshot()
+
+
+def test_index_log_crash_after_compaction():
+    import os
+    import tempfile
+    from lstore.db import Database
+    from lstore.query import Query
+    from lstore.indexlog import LOG_HEADER_SIZE
+
+    def open_database(path):
+        db = Database()
+        db.run_merge = lambda: None
+        db.open(path)
+        return db
+
+    path = os.path.join(tempfile.mkdtemp(), "db")
+    db = open_database(path)
+    table = db.create_table("Crash", 2, 0)
+    Query(table).insert_many([(i, i) for i in range(1, 101)])
+    db.close()
+
+    # Crash between compact replacing the snapshot and starting the new log: the old generation's log is left behind
+    log_path = f"{path}/Crash.index.log"
+    with open(log_path, "rb") as log_file:
+        stale_log = log_file.read()
+    db = open_database(path)
+    table = db.get_table("Crash")
+    table.index.log.compact(table.index)
+    with open(log_path, "wb") as log_file:
+        log_file.write(stale_log)
+    db.close()
+
+    # Replay skips the stale records and restarts the log, so changes made after reopening are kept
+    db = open_database(path)
+    table = db.get_table("Crash")
+    assert os.path.getsize(log_path) == LOG_HEADER_SIZE, "Stale log should be restarted"
+    table.index.addRecord(5000, 5000)
+    db.close()
+
+    db = open_database(path)
+    table = db.get_table("Crash")
+    assert table.index.locate(5000) == [5000], "Change logged after the crash was lost"
+    assert table.index.locate(50) == [50] and len(table.index.locate_range(1, 5000)) == 101, "Snapshot mismatch"
+    db.close()
+
+test_index_log_crash_after_compaction()
@@ -0,0 +1,55 @@
+def test_insert_many():
+    import tempfile
+    from lstore.table import Table
+    from lstore.index import Index
+    from lstore.query import Query
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    path = tempfile.mkdtemp()
+    table = Table("Students", f"{path}/Students", 5, 0, {}, None, index=Index("Students"), bufferpool=Bufferpool())
+    query = Query(table)
+
+    # Insert enough rows to spill over several base pages
+    rows = [(i, i * 10, 20, 30, 40) for i in range(1, 1201)]
+    assert query.insert_many(rows) == True, "insert_many should return True"
+
+    # RIDs are handed out as one block
+    assert query.rid_counter == 1201, "RID block was not reserved"
+    assert len(table.page_directory) == 1200, "Every row should be in the page directory"
+
+    # Spot check a record on the third base page
+    page_range_num, base_page_num, record_num = table.page_directory[1100]
+    base_page = table.page_ranges[page_range_num].base_pages[base_page_num]
+    assert base_page_num == 2, "Record should be on the third base page"
+    assert base_page.pages[config.RID_COLUMN].read(record_num) == 1100, "RID mismatch"
+    assert base_page.pages[config.PRIMARY_KEY_COLUMN + 1].read(record_num) == 11000, "Column value mismatch"
+
+    # Primary key index was bulk loaded
+    assert table.index.indices[config.PRIMARY_KEY_COLUMN][1100] == [1100], "Primary key index mismatch"
+
+    # A batch with a duplicate key is rejected without writing anything
+    assert query.insert_many([(1201, 0, 0, 0, 0), (1, 0, 0, 0, 0)]) == False, "Duplicate key should fail"
+    assert len(table.page_directory) == 1200, "Failed batch should not write"
+
+test_insert_many()
+
+
+def test_insert_many_negative_values():
+    import tempfile
+    from lstore.table import Table
+    from lstore.index import Index
+    from lstore.query import Query
+    from lstore.bufferpool import Bufferpool
+
+    path = tempfile.mkdtemp()
+    table = Table("Signed", f"{path}/Signed", 3, 0, {}, None, index=Index(f"{path}/Signed"), bufferpool=Bufferpool())
+    query = Query(table)
+
+    # Negative values round-trip through select and sum
+    rows = [(i, -i, i - 2 ** 62) for i in range(1, 101)]
+    assert query.insert_many(rows) == True, "insert_many should return True"
+    assert query.select(7, 0, [1, 1, 1])[0].columns == [7, -7, 7 - 2 ** 62], "Negative values should round-trip"
+    assert query.sum(1, 100, 1) == -sum(range(1, 101)), "Sum of negative values mismatch"
+
+test_insert_many_negative_values()
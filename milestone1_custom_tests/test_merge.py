@@ -0,0 +1,85 @@
+def test_merge_sparse_tails():
+    import tempfile
+    from lstore.table import Table
+    from lstore.index import Index
+    from lstore.query import Query
+    from lstore.bufferpool import Bufferpool
+    from lstore import config
+
+    path = tempfile.mkdtemp()
+    table = Table("Sparse", f"{path}/Sparse", 4, 0, {}, None, index=Index("Sparse"), sparse_tails=True, bufferpool=Bufferpool())
+    query = Query(table)
+    query.insert_many([(i, 10, 20, 30) for i in range(1, 11)])
+
+    # append a sparse tail record holding only the given columns, the way Query.update writes one
+    def update(rid, tail_rid, columns):
+        page_range_num, base_page_num, record_num = table.page_directory[rid]
+        page_range = table.page_ranges[page_range_num]
+        if not page_range.tail_pages:
+            table.save_tail_page(table.new_tail_page(), page_range_num)
+        tail_page = page_range.tail_pages[-1]
+        base_page = page_range.base_pages[base_page_num]
+        schema_encoding = int("".join("0" if value is None else "1" for value in columns), 2)
+        record = [base_page.pages[config.INDIRECTION_COLUMN].read(record_num), tail_rid, 0, schema_encoding, rid] + [value or 0 for value in columns]
+        written_columns = list(range(5)) + [i + 5 for i, value in enumerate(columns) if value is not None]
+        tail_record_num = tail_page.pages[config.INDIRECTION_COLUMN].num_records
+        tail_page.write_columns(record, written_columns, tail_record_num)
+        table.page_directory[tail_rid] = (page_range_num, len(page_range.tail_pages) - 1, tail_record_num)
+        base_page.pages[config.INDIRECTION_COLUMN].write_column(record_num, tail_rid)
+
+    # Each update of record 3 writes a different column, so its latest tail record alone holds one new value
+    update(3, 1001, [None, 11, None, None])
+    update(3, 1002, [None, None, 21, None])
+    update(3, 1003, [None, None, None, 31])
+    update(5, 1004, [None, 12, None, None])
+    assert query.select(3, 0, [1, 1, 1, 1])[0].columns == [3, 11, 21, 31], "Sparse read mismatch"
+
+    # The merge takes every column's newest value from the whole chain
+    table._Table__merge()
+    base_page = table.page_ranges[0].base_pages[0]
+    assert [base_page.pages[column].read(2) for column in range(5, 9)] == [3, 11, 21, 31], "Merged base record mismatch"
+    assert [base_page.pages[column].read(4) for column in range(5, 9)] == [5, 12, 20, 30], "Merged base record mismatch"
+    assert base_page.get_tps() == 1004 and base_page.pages[config.TIMESTAMP_COLUMN].num_records == 10, "TPS mismatch"
+    assert query.select(3, 0, [1, 1, 1, 1])[0].columns == [3, 11, 21, 31], "Read after merge mismatch"
+    assert query.select(7, 0, [1, 1, 1, 1])[0].columns == [7, 10, 20, 30], "Record without updates changed"
+
+test_merge_sparse_tails()
+
+
+def test_merge_compresses_cold_ranges():
+    import tempfile
+    from lstore.table import Table
+    from lstore.index import Index
+    from lstore.query import Query
+    from lstore.bufferpool import Bufferpool
+    from lstore.segment import Segment
+    from lstore import config
+
+    compress = config.COMPRESS_COLD_PAGES
+    config.COMPRESS_COLD_PAGES = True
+    try:
+        path = tempfile.mkdtemp()
+        bufferpool = Bufferpool()
+        table = Table("Cold", f"{path}/Cold", 2, 0, {}, None, index=Index("Cold"), page_range_size=1, bufferpool=bufferpool)
+        # one base page group per range, so the first range is full and cold
+        Query(table).insert_many([(i, i) for i in range(1, 601)])
+        assert len(table.page_ranges) == 2 and not table.segment(0).is_packed(), "Setup mismatch"
+
+        # a tail record for record 3: an update of its second column
+        page_range = table.page_ranges[0]
+        table.save_tail_page(table.new_tail_page(), 0)
+        page_range.tail_pages[0].write(0, 5000, 0, 0b01, 3, 3, 33, record_number=0)
+        table.page_directory[5000] = (0, 0, 0)
+        with bufferpool.pin(table.page_id(0, 0, config.BASE_PAGE, config.INDIRECTION_COLUMN), write=True) as page:
+            page.write_column(2, 5000)
+
+        # The merge writes the cold range it rewrote back compressed, and write-back leaves it packed
+        table._Table__merge()
+        assert table.segment(0).is_packed(), "Merged cold range should be compressed"
+        bufferpool.flush()
+        base_groups, _ = Segment(table.segment_path(0)).read_range()
+        assert table.segment(0).is_packed() and base_groups[0][6].read(2) == 33, "Compressed merged range mismatch"
+    finally:
+        config.COMPRESS_COLD_PAGES = compress
+
+test_merge_compresses_cold_ranges()
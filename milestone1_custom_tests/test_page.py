@@ -13,6 +13,23 @@ def test_page_write_read():
 
 test_page_write_read()
 
+def test_page_signed_values():
+    from lstore.page import Page
+
+    # read, read_many and read_all decode the same signed int64 values whichever write stored them
+    page = Page()
+    page.write(-1, 0)
+    page.write_many([-2, -(2 ** 63)], 1)
+    page.write(2 ** 63 - 1, 3)
+    expected = [-1, -2, -(2 ** 63), 2 ** 63 - 1]
+    assert [page.read(i) for i in range(4)] == expected, "read should decode signed values"
+    assert page.read_many([0, 1, 2, 3]).tolist() == expected, "read_many mismatch"
+    assert page.read_all().tolist() == expected, "read_all mismatch"
+    page.write_column(1, -7)
+    assert page.read(1) == -7 and page.values[1] == -7, "write_column should store signed values"
+
+test_page_signed_values()
+
 def test_page_capacity():
     from lstore.page import Page
 
@@ -25,4 +42,76 @@ def test_page_capacity():
     # Should return False since the page is full
     assert page.has_capacity() == False, "Page capacity check failed"
 
-test_page_capacity()
\ No newline at end of file
+test_page_capacity()
+
+def test_page_read_many():
+    from lstore.page import Page
+
+    page = Page()
+    for i in range(10):
+        page.write(i * 3, i)
+
+    # read_all only returns written slots
+    assert page.read_all().tolist() == [i * 3 for i in range(10)], "read_all mismatch"
+    assert page.read_many([1, 4, 9]).tolist() == [3, 12, 27], "read_many mismatch"
+
+    # the numpy view shares the page buffer
+    page.values[2] = 100
+    assert page.read(2) == 100, "values view should write through to page data"
+
+test_page_read_many()
+
+
+def test_page_zone_map():
+    from lstore.page import Page
+
+    page = Page()
+    assert page.zone_map() is None, "Empty page should have no zone"
+    for i, value in enumerate([40, 10, 30]):
+        page.write(value, i)
+
+    assert page.zone_map() == (10, 40), "Zone map mismatch"
+    assert page.may_contain(35, 50), "Overlapping range should match"
+    assert not page.may_contain(41, 100), "Range above the zone should be skipped"
+
+    # overwriting widens the zone, refreshing shrinks it back to the real values
+    page.write_column(0, 5)
+    assert page.zone_map() == (5, 40), "write_column should widen the zone"
+    page.refresh_zone_map()
+    assert page.zone_map() == (5, 30), "refresh should recompute the zone"
+
+test_page_zone_map()
+
+
+def test_dictionary_page():
+    from lstore.page import Page, DictionaryPage, ColumnDictionary
+
+    dictionary = ColumnDictionary()
+    page = DictionaryPage(dictionary)
+    page.write_many([7, 9, 7, 7], 0)
+    page.write(11, 4)
+
+    # one small code per slot, values shared through the dictionary
+    assert dictionary.values == [7, 9, 11], "Dictionary mismatch"
+    assert page.codes.itemsize == 2, "Codes should be 2 bytes"
+    assert page.read(1) == 9 and page.read_all().tolist() == [7, 9, 7, 7, 11], "Decode mismatch"
+
+    # equality matches compare codes, values missing from the dictionary match nothing
+    assert page.match(7).tolist() == [0, 2, 3], "Code match mismatch"
+    assert page.match(8).tolist() == [], "Missing value should not match"
+
+    # data decodes to the regular page layout, so it can be written to disk and read back
+    reread = DictionaryPage.from_page(Page(page.num_records, page.data), dictionary)
+    assert reread.read_all().tolist() == [7, 9, 7, 7, 11], "Round trip mismatch"
+
+    # data and values are decoded copies, a write through them raises instead of being lost
+    for copy in (page.data, page.values):
+        try:
+            copy[0] = 1
+            assert False, "Write through a decoded copy should raise"
+        except (TypeError, ValueError):
+            pass
+    page.write_column(0, 9)
+    assert page.read(0) == 9 and page.values[0] == 9, "write_column mismatch"
+
+test_dictionary_page()
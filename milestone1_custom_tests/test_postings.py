@@ -0,0 +1,46 @@
+def test_posting_lists():
+    import pickle
+    import tempfile
+    from lstore.table import Table
+    from lstore.index import Index
+    from lstore.query import Query
+    from lstore.bufferpool import Bufferpool
+    from lstore.postings import PostingList, intersect, union
+
+    # Sorted whatever order the RIDs arrive in, removal by binary search
+    rids = PostingList([9, 3])
+    rids.append(5)
+    rids.append(12)
+    rids.remove(9)
+    assert list(rids) == [3, 5, 12] and 5 in rids and 9 not in rids, "Posting list order mismatch"
+    try:
+        rids.remove(9)
+        assert False, "Removing a missing RID should raise"
+    except ValueError:
+        pass
+    restored = pickle.loads(pickle.dumps(rids))
+    assert isinstance(restored, PostingList) and restored == rids, "Pickle round trip mismatch"
+
+    # Intersection and union take posting lists and plain RID lists alike
+    assert intersect([rids, [12, 4, 3], PostingList(range(20))]).tolist() == [3, 12], "Intersection mismatch"
+    assert union([rids, [4, 3]]).tolist() == [3, 4, 5, 12], "Union mismatch"
+    assert len(intersect([rids, []])) == 0 and len(union([])) == 0, "Empty input mismatch"
+
+    # Secondary indices hold posting lists, lookups still return lists
+    path = tempfile.mkdtemp()
+    # the index pickle goes to the temporary directory too
+    table = Table("Postings", f"{path}/Postings", 3, 0, {}, None, index=Index(f"{path}/Postings"), bufferpool=Bufferpool())
+    Query(table).insert_many([(i, i % 4, i % 10) for i in range(1, 1001)])
+    table.index.create_index(6, table)
+    table.index.create_index(7, table)
+    assert isinstance(table.index.indices[6][2], PostingList), "Secondary index should hold posting lists"
+    assert table.index.locate(2, 6) == list(range(2, 1001, 4)), "Secondary lookup mismatch"
+    table.index.removeRecord(2, 10, 6)
+    assert 10 not in table.index.locate(2, 6) and len(table.index.locate(2, 6)) == 249, "Removed RID still found"
+
+    # Both predicates: i % 4 == 2 and i % 10 == 6
+    expected = [i for i in range(1, 1001) if i % 4 == 2 and i % 10 == 6 and i != 10]
+    assert table.index.locate_all([(2, 6), (6, 7)]) == expected, "Multi-predicate lookup mismatch"
+    assert table.index.locate_all([(2, 6), (99, 7)]) == [], "Missing key should match nothing"
+
+test_posting_lists()
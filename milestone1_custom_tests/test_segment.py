@@ -0,0 +1,264 @@
+def test_segment_round_trip():
+    import os
+    import tempfile
+    from lstore.page import pageRange, PageGroup
+    from lstore.segment import Segment
+    from lstore import config
+
+    path = os.path.join(tempfile.mkdtemp(), "0.seg")
+    page_range = pageRange(num_columns=3)
+    page_range.base_pages[2].pages[6].write(42, 0)
+    page_range.tail_pages.append(PageGroup(num_columns=3))
+    page_range.tail_pages[0].pages[7].write(7, 0)
+
+    # Write the whole range as one file
+    segment = Segment(path, pages_per_group=8)
+    segment.write_range(page_range)
+    assert os.listdir(os.path.dirname(path)) == ["0.seg"], "Range should be stored in a single file"
+
+    # Read it back with one read
+    base_groups, tail_groups = Segment(path).read_range()
+    assert len(base_groups) == config.PAGE_RANGE_SIZE, "Base page count mismatch"
+    assert len(tail_groups) == 1, "Tail page count mismatch"
+    assert base_groups[2][6].read(0) == 42 and base_groups[2][6].num_records == 1, "Base page mismatch"
+    assert tail_groups[0][7].read(0) == 7, "Tail page mismatch"
+
+    # Single pages can be read and written through their slot
+    page = segment.read_page(segment.base_slot(2, 6))
+    page.write(43, 1)
+    segment.write_page(segment.base_slot(2, 6), page)
+    assert segment.read_page(segment.base_slot(2, 6)).num_records == 2, "num_records header mismatch"
+    assert segment.read_page(segment.tail_slot(0, 7)).read(0) == 7, "Tail slot mismatch"
+
+test_segment_round_trip()
+
+
+def test_segment_mmap_views():
+    import os
+    import tempfile
+    from lstore.page import pageRange
+    from lstore.segment import Segment
+
+    path = os.path.join(tempfile.mkdtemp(), "0.seg")
+    page_range = pageRange(num_columns=3)
+    segment = Segment(path, pages_per_group=8)
+    segment.write_range(page_range)
+
+    # Pages become views into the mapping, so writes land in the file without a copy
+    segment.attach_range(page_range)
+    page = page_range.base_pages[1].pages[5]
+    assert isinstance(page.data, memoryview), "Mapped page should be a memoryview"
+    page.write(99, 0)
+    segment.sync_page(segment.base_slot(1, 5), page)
+
+    # A plain read of the file sees the write and the num_records header
+    reread = Segment(path).read_page(segment.base_slot(1, 5))
+    assert reread.read(0) == 99 and reread.num_records == 1, "mmap write was not flushed"
+
+    base_groups, tail_groups = Segment(path).map_range()
+    assert base_groups[1][5].read_all().tolist() == [99], "map_range view mismatch"
+
+test_segment_mmap_views()
+
+
+def test_segment_mmap_chunks():
+    import os
+    import tempfile
+    from lstore.page import pageRange, PageGroup
+    from lstore.segment import Segment
+    from lstore import config
+
+    path = os.path.join(tempfile.mkdtemp(), "0.seg")
+    page_range = pageRange(num_columns=3, range_size=4)
+    segment = Segment(path, pages_per_group=8, num_base_groups=4)
+    segment.write_range(page_range)
+    chunk_bytes = config.MMAP_CHUNK_BYTES
+    config.MMAP_CHUNK_BYTES = 3 * segment.slot_size
+    try:
+        # 32 base slots in chunks of 3 slots, the last one partial
+        segment.attach_range(page_range)
+        assert sorted(segment.chunks) == list(range(11)), "Chunk count mismatch"
+        complete = dict(segment.chunks)
+        partial = complete.pop(10)
+        page = page_range.base_pages[3].pages[7]
+
+        # A new tail page group grows the file: only the partial chunk is remapped and its views follow
+        tail_page = PageGroup(num_columns=3)
+        segment.write_group(segment.tail_slot(0, 0), tail_page)
+        segment.attach_group(segment.tail_slot(0, 0), tail_page)
+        assert all(segment.chunks[chunk] is mapping for chunk, mapping in complete.items()), "Complete chunks should not be remapped"
+        assert segment.chunks[10] is not partial and partial.closed, "Old mapping of the partial chunk should be released"
+        page.write(5, 0)
+        tail_page.pages[7].write(6, 0)
+        segment.sync_pages([(segment.base_slot(3, 7), page), (segment.tail_slot(0, 7), tail_page.pages[7])])
+    finally:
+        config.MMAP_CHUNK_BYTES = chunk_bytes
+
+    reread = Segment(path)
+    assert reread.read_page(segment.base_slot(3, 7)).read(0) == 5, "Write through a remapped view was lost"
+    assert reread.read_page(segment.tail_slot(0, 7)).read(0) == 6, "Write through a new chunk was lost"
+
+test_segment_mmap_chunks()
+
+
+def test_segment_page_size():
+    import os
+    import tempfile
+    from lstore.page import pageRange
+    from lstore.segment import Segment
+
+    path = os.path.join(tempfile.mkdtemp(), "0.seg")
+    page_range = pageRange(num_columns=3, page_size=65536, range_size=4)
+    assert page_range.base_pages[0].pages[0].capacity == 8192, "Page capacity should follow the page size"
+    page_range.base_pages[3].pages[5].write(99, 8191)
+    Segment(path, pages_per_group=8, num_base_groups=4, page_size=65536).write_range(page_range)
+
+    # The page size and range size are read back from the segment header
+    base_groups, tail_groups = Segment(path).read_range()
+    assert len(base_groups) == 4, "Base page count mismatch"
+    assert base_groups[3][5].read(8191) == 99, "Last slot of a large page mismatch"
+
+test_segment_page_size()
+
+
+def test_segment_write_dirty():
+    import os
+    import tempfile
+    from lstore.page import pageRange
+    from lstore.segment import Segment
+    from lstore import config
+
+    path = os.path.join(tempfile.mkdtemp(), "0.seg")
+    page_range = pageRange(num_columns=3)
+    segment = Segment(path, pages_per_group=8)
+    segment.write_range(page_range)
+
+    # Rewriting one slot only writes that slot
+    page = segment.read_page(segment.base_slot(1, 5))
+    page.write_column(100, 9)
+    assert page.take_dirty() == (False, [(100, 101)]), "Dirty range mismatch"
+    page.write_column(100, 9)
+    assert segment.write_dirty([(segment.base_slot(1, 5), page, page.take_dirty())]) == config.VALUE_SIZE, "Only the changed slot should be written"
+    assert segment.read_page(segment.base_slot(1, 5)).read(100) == 9, "Slot write mismatch"
+
+    # An append also writes the num_records header, joined with slot 0 into one write
+    page = segment.read_page(segment.base_slot(0, 5))
+    page.write(5, 0)
+    page.write(6, 1)
+    next_page = segment.read_page(segment.base_slot(0, 6))
+    next_page.write_column(0, 3)
+    slot_pages = [(segment.base_slot(0, 5), page, page.take_dirty()), (segment.base_slot(0, 6), next_page, next_page.take_dirty())]
+    assert segment.write_dirty(slot_pages) == 4 * config.VALUE_SIZE, "Header and slots should be written"
+    written = segment.read_page(segment.base_slot(0, 5))
+    assert written.num_records == 2 and written.read(1) == 6, "Header write mismatch"
+    assert segment.read_page(segment.base_slot(0, 6)).read(0) == 3, "Neighbouring page write mismatch"
+
+    # Untracked changes or a mostly rewritten page fall back to writing the whole slot
+    page.data[0:8] = (7).to_bytes(8, "little")
+    assert page.take_dirty() is None, "Untracked page should be written whole"
+    page.write_many(list(range(page.capacity)), 0)
+    assert page.take_dirty() is None, "Mostly dirty page should be written whole"
+    assert segment.write_dirty([(segment.base_slot(0, 5), page, None)]) == segment.slot_size, "Whole slot write mismatch"
+    assert segment.read_page(segment.base_slot(0, 5)).read(0) == 0, "Whole slot write mismatch"
+
+test_segment_write_dirty()
+
+
+def test_segment_lock():
+    import os
+    import tempfile
+    import threading
+    from lstore.page import pageRange
+    from lstore.segment import Segment
+
+    path = os.path.join(tempfile.mkdtemp(), "0.seg")
+    page_range = pageRange(num_columns=3)
+    page_range.base_pages[0].pages[6].write(42, 0)
+    segment = Segment(path, pages_per_group=8)
+    segment.write_range(page_range, compress=True)
+
+    # A write that has to unpack the file waits while another thread holds the segment
+    page = segment.read_page(segment.base_slot(0, 6))
+    page.write(43, 1)
+    writer = threading.Thread(target=segment.write_page, args=(segment.base_slot(0, 6), page))
+    with segment.lock:
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive() and segment.is_packed(), "Write should wait for the segment lock"
+    writer.join()
+    assert not segment.is_packed() and segment.read_page(segment.base_slot(0, 6)).read(1) == 43, "Write after the lock mismatch"
+
+test_segment_lock()
+
+
+def test_close_writes_dirty_pages():
+    import os
+    import tempfile
+    import time
+    from lstore.db import Database
+    from lstore.query import Query
+    from lstore.segment import SLOT_HEADER_SIZE
+    from lstore import config
+
+    def open_database(path):
+        db = Database()
+        db.run_merge = lambda: None
+        db.open(path)
+        return db
+
+    def snapshot(table_path):
+        files = {}
+        for file_name in sorted(os.listdir(table_path)):
+            file_path = os.path.join(table_path, file_name)
+            with open(file_path, "rb") as table_file:
+                files[file_name] = (table_file.read(), os.stat(file_path).st_mtime_ns)
+        return files
+
+    # 8 records per 64 byte page and 2 base page groups per page range, so 40 records fill 3 page ranges
+    path = os.path.join(tempfile.mkdtemp(), "db")
+    db = open_database(path)
+    query = Query(db.create_table("Close", 2, 0, page_size=64, page_range_size=2))
+    query.insert_many([(i, i) for i in range(1, 41)])
+    db.close()
+    table_path = os.path.join(path, "Close")
+    before = snapshot(table_path)
+    # mtime has to be able to tell a rewrite apart
+    time.sleep(0.05)
+
+    # Reopening and closing leaves every file alone
+    db = open_database(path)
+    db.close()
+    assert snapshot(table_path) == before, "Closing without changes should not write the page ranges"
+
+    # One value written through the bufferpool: only its bytes change, the other page ranges are untouched
+    db = open_database(path)
+    table = db.get_table("Close")
+    page_id = table.page_id(1, 0, config.BASE_PAGE, 6)
+    with db.bufferpool.pin(page_id, write=True) as page:
+        page.write_column(3, 99)
+    db.close()
+    after = snapshot(table_path)
+    assert after.keys() == before.keys(), "Close should not add or remove files"
+    for file_name in before:
+        if file_name != "1.seg":
+            assert after[file_name] == before[file_name], f"{file_name} is clean and should be untouched"
+    segment = table.segment(1)
+    offset = segment.slot_offset(segment.base_slot(0, 6)) + SLOT_HEADER_SIZE + 3 * config.VALUE_SIZE
+    old, new = before["1.seg"][0], after["1.seg"][0]
+    assert len(new) == len(old), "A slot write should keep the file size"
+    assert new[:offset] == old[:offset] and new[offset + config.VALUE_SIZE:] == old[offset + config.VALUE_SIZE:], "Bytes outside the dirty slot changed"
+    assert new[offset:offset + config.VALUE_SIZE] == (99).to_bytes(config.VALUE_SIZE, "little"), "Dirty slot was not written"
+
+    # Records appended to a page range write its new slots and metadata
+    db = open_database(path)
+    Query(db.get_table("Close")).insert_many([(i, i) for i in range(41, 44)])
+    db.close()
+    appended = snapshot(table_path)
+    assert appended["0.seg"] == after["0.seg"] and appended["1.seg"] == after["1.seg"], "Full page ranges should be untouched"
+    assert appended["2.seg"] != after["2.seg"] and appended["2.json"] != after["2.json"], "Appended page range was not written"
+    db = open_database(path)
+    values = db.get_table("Close").page_ranges[2].base_pages[1].pages[6].read_all().tolist()
+    assert values == [41, 42, 43], "Appended records lost on reopen"
+    db.close()
+
+test_close_writes_dirty_pages()